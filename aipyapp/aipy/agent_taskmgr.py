@@ -42,6 +42,7 @@ class AgentTask:
 
 class AgentTaskManager(TaskManager):
     """Agent模式任务管理器"""
+    MAX_WORKERS = 32
     
     def __init__(self, settings, /, display_manager=None):
         # 强制使用agent显示模式和headless设置
@@ -49,7 +50,9 @@ class AgentTaskManager(TaskManager):
         
         # Agent特有属性
         self.agent_tasks: Dict[str, AgentTask] = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)  # 支持并发
+        # 任务本身仍是同步执行，每个运行中的任务占用一个线程；LLM 请求可通过 ClientManager.acall 在事件循环中并发
+        max_workers = (settings.get('agent') or {}).get('max_workers', self.MAX_WORKERS)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.log = logger.bind(src='agent_taskmgr')
         
     async def submit_task(self, instruction: str, metadata: Dict[str, Any] = None) -> str:
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""任务归档：zip 容器，task.json 中的大字符串按内容哈希单独保存
+
+归档结构::
+
+    manifest.json       格式版本和 blob 列表
+    task.json           任务数据，大字符串替换为 {"$blob": "<sha256>"}
+    blobs/<sha256>      blob 内容，相同内容只保存一份
+
+data URL 图片解码为原始字节保存，读取时重新编码为 data URL。
+"""
+
+import io
+import re
+import json
+import base64
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Union
+
+from loguru import logger
+
+from .utils import atomic_write
+from .blobs import BLOB_KEY, BlobStore, is_blob_ref
+
+ARCHIVE_SUFFIX = '.zip'
+ARCHIVE_FORMAT = 'aipy-task'
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+TASK_NAME = 'task.json'
+BLOB_DIR = 'blobs/'
+MIME_KEY = '$mime'
+# 超过该长度的字符串单独保存
+BLOB_THRESHOLD = 4096
+
+DATA_URL_PATTERN = re.compile(r'data:([\w.+-]+/[\w.+-]+);base64,([A-Za-z0-9+/=]+)\Z')
+
+def is_archive(path: Union[str, Path]) -> bool:
+    """判断文件是否为任务归档"""
+    path = Path(path)
+    return path.suffix == ARCHIVE_SUFFIX and zipfile.is_zipfile(path)
+
+class _BlobWriter:
+    def __init__(self, threshold: int, blob_store: BlobStore | None = None):
+        self.threshold = threshold
+        self.blob_store = blob_store
+        self.blobs: Dict[str, bytes] = {}
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+
+    def _add(self, data: bytes, mime: str | None = None) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.blobs:
+            self.blobs[digest] = data
+            info = {'size': len(data)}
+            if mime:
+                info['mime'] = mime
+            self.manifest[digest] = info
+        return digest
+
+    def _encode_str(self, value: str) -> Any:
+        match = DATA_URL_PATTERN.match(value)
+        if match:
+            mime, encoded = match.groups()
+            raw = base64.b64decode(encoded)
+            # 只有能原样还原的 data URL 才解码保存
+            if base64.b64encode(raw).decode('ascii') == encoded:
+                return {BLOB_KEY: self._add(raw, mime), MIME_KEY: mime}
+        return {BLOB_KEY: self._add(value.encode('utf-8'))}
+
+    def encode(self, value: Any) -> Any:
+        if isinstance(value, str):
+            if len(value) >= self.threshold:
+                return self._encode_str(value)
+            return value
+        if isinstance(value, dict):
+            # 任务 blob 存储中的内容写入归档
+            if self.blob_store is not None and is_blob_ref(value):
+                return self._encode_str(self.blob_store.get(value[BLOB_KEY]))
+            return {k: self.encode(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        return value
+
+def _decode(value: Any, zf: zipfile.ZipFile, cache: Dict[str, str]) -> Any:
+    if isinstance(value, dict):
+        digest = value.get(BLOB_KEY)
+        if isinstance(digest, str) and len(value) <= 2:
+            if digest not in cache:
+                raw = zf.read(BLOB_DIR + digest)
+                if hashlib.sha256(raw).hexdigest() != digest:
+                    raise ValueError(f'Corrupted blob: {digest}')
+                mime = value.get(MIME_KEY)
+                if mime:
+                    cache[digest] = f'data:{mime};base64,{base64.b64encode(raw).decode("ascii")}'
+                else:
+                    cache[digest] = raw.decode('utf-8')
+            return cache[digest]
+        return {k: _decode(v, zf, cache) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v, zf, cache) for v in value]
+    return value
+
+def write_archive(path: Union[str, Path], data: Dict[str, Any], threshold: int = BLOB_THRESHOLD,
+                  blob_store: BlobStore | None = None) -> None:
+    """
+    将任务数据写入归档
+
+    Args:
+        path: 归档文件路径
+        data: 可 JSON 序列化的任务数据
+        threshold: 单独保存的字符串最小长度
+        blob_store: 数据中 blob 引用所在的存储
+    """
+    writer = _BlobWriter(threshold, blob_store)
+    task_data = writer.encode(data)
+    manifest = {
+        'format': ARCHIVE_FORMAT,
+        'version': ARCHIVE_VERSION,
+        'task': TASK_NAME,
+        'blobs': writer.manifest,
+    }
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+        zf.writestr(TASK_NAME, json.dumps(task_data, ensure_ascii=False, separators=(',', ':')))
+        for digest, blob in writer.blobs.items():
+            # 图片等二进制数据已压缩，直接存储
+            mime = writer.manifest[digest].get('mime')
+            compress_type = zipfile.ZIP_STORED if mime else zipfile.ZIP_DEFLATED
+            zf.writestr(BLOB_DIR + digest, blob, compress_type=compress_type)
+    atomic_write(path, buffer.getvalue())
+    logger.bind(src='archive').info('Wrote task archive', path=str(path), blobs=len(writer.blobs))
+
+def read_archive(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    读取归档中的任务数据
+
+    Args:
+        path: 归档文件路径
+
+    Returns:
+        还原 blob 后的任务数据
+    """
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+        if manifest.get('format') != ARCHIVE_FORMAT:
+            raise ValueError(f'Not a task archive: {path}')
+        if manifest.get('version', 0) > ARCHIVE_VERSION:
+            raise ValueError(f'Unsupported task archive version: {manifest.get("version")}')
+        data = json.loads(zf.read(manifest.get('task', TASK_NAME)))
+        return _decode(data, zf, {})
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""按内容哈希保存的 blob 存储
+
+大字符串保存为 blobs/<sha256前两位>/<sha256>，JSON 中替换为 {"$blob": "<sha256>"}。
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, List, Union
+
+from loguru import logger
+
+from .utils import atomic_write
+
+BLOB_KEY = '$blob'
+# 超过该长度的字符串保存为 blob
+BLOB_THRESHOLD = 64 * 1024
+# 计算哈希时每次编码的字符数，避免一次复制整个字符串
+HASH_CHUNK_SIZE = 64 * 1024
+# 读取缓存大小
+CACHE_BYTES = 8 * 1024 * 1024
+
+def update_hash(hasher, text: str) -> None:
+    """分块编码字符串并更新哈希"""
+    for i in range(0, len(text), HASH_CHUNK_SIZE):
+        hasher.update(text[i:i + HASH_CHUNK_SIZE].encode('utf-8'))
+
+def hash_text(text: str) -> str:
+    """字符串 UTF-8 编码的 sha256"""
+    hasher = hashlib.sha256()
+    update_hash(hasher, text)
+    return hasher.hexdigest()
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(BLOB_KEY), str)
+
+def has_blob_refs(value: Any) -> bool:
+    """判断数据中是否包含 blob 引用"""
+    if isinstance(value, dict):
+        return is_blob_ref(value) or any(has_blob_refs(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_blob_refs(v) for v in value)
+    return False
+
+def has_large_strings(value: Any, threshold: int = BLOB_THRESHOLD) -> bool:
+    """判断数据中是否包含超过阈值的字符串"""
+    if isinstance(value, str):
+        return len(value) >= threshold
+    if isinstance(value, dict):
+        return any(has_large_strings(v, threshold) for v in value.values())
+    if isinstance(value, list):
+        return any(has_large_strings(v, threshold) for v in value)
+    return False
+
+class BlobStore:
+    """任务目录下的 blob 存储
+
+    put() 只把内容放入内存中的待写队列，由 flush() 在后台保存线程写入磁盘。
+    sources 是只读的备用目录，恢复的任务从原任务目录读取 blob，flush() 时复制到当前目录。
+    """
+
+    def __init__(self, root: Union[str, Path], cache_bytes: int = CACHE_BYTES):
+        self.root = Path(root)
+        self.sources: List[Path] = []
+        self.cache_bytes = cache_bytes
+        self.log = logger.bind(src='BlobStore')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cached_bytes = 0
+        self._unsynced: List[Path] = []
+
+    def _path(self, root: Path, digest: str) -> Path:
+        return root / digest[:2] / digest
+
+    def add_source(self, path: Union[str, Path]) -> None:
+        """添加只读的备用目录"""
+        path = Path(path)
+        if path.resolve() == self.root.resolve() or path in self.sources:
+            return
+        self.sources.append(path)
+        self._unsynced.append(path)
+
+    def put(self, text: str) -> str:
+        """保存字符串，返回其 sha256"""
+        digest = hash_text(text)
+        with self._lock:
+            self._pending.setdefault(digest, text)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """读取 blob，不存在时抛出 KeyError"""
+        with self._lock:
+            text = self._pending.get(digest)
+            if text is None:
+                text = self._cache.get(digest)
+                if text is not None:
+                    self._cache.move_to_end(digest)
+        if text is not None:
+            return text
+
+        for root in [self.root, *self.sources]:
+            path = self._path(root, digest)
+            try:
+                text = path.read_bytes().decode('utf-8')
+            except FileNotFoundError:
+                continue
+            self._remember(digest, text)
+            return text
+        raise KeyError(digest)
+
+    def _remember(self, digest: str, text: str) -> None:
+        size = len(text)
+        if size > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._cache:
+                return
+            self._cache[digest] = text
+            self._cached_bytes += size
+            while self._cached_bytes > self.cache_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cached_bytes -= len(old)
+
+    def flush(self) -> None:
+        """写入待写的 blob，并把备用目录中的 blob 复制到当前目录"""
+        with self._lock:
+            pending = list(self._pending.items())
+            sources, self._unsynced = self._unsynced, []
+
+        for source in sources:
+            self._copy_from(source)
+
+        for digest, text in pending:
+            path = self._path(self.root, digest)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(path, text.encode('utf-8'))
+        if pending:
+            self.log.info('Wrote blobs', root=str(self.root), count=len(pending))
+
+        # 写入后不再常驻内存，需要时从磁盘读取
+        with self._lock:
+            for digest, _ in pending:
+                self._pending.pop(digest, None)
+
+    def _copy_from(self, source: Path) -> None:
+        if not source.is_dir():
+            return
+        count = 0
+        for path in source.glob('*/*'):
+            target = self._path(self.root, path.name)
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copyfile(path, target)
+            count += 1
+        self.log.info('Copied blobs', source=str(source), root=str(self.root), count=count)
+
+def extract_blobs(value: Any, store: BlobStore, threshold: int = BLOB_THRESHOLD) -> Any:
+    """把超过阈值的字符串保存到 store，返回替换为引用后的数据"""
+    if isinstance(value, str):
+        if len(value) >= threshold:
+            return {BLOB_KEY: store.put(value)}
+        return value
+    if isinstance(value, dict):
+        return {k: extract_blobs(v, store, threshold) for k, v in value.items()}
+    if isinstance(value, list):
+        return [extract_blobs(v, store, threshold) for v in value]
+    return value
+
+def resolve_blobs(value: Any, store: BlobStore) -> Any:
+    """把 blob 引用还原为字符串"""
+    if is_blob_ref(value):
+        return store.get(value[BLOB_KEY])
+    if isinstance(value, dict):
+        return {k: resolve_blobs(v, store) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_blobs(v, store) for v in value]
+    return value
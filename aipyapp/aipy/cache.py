@@ -1,47 +1,505 @@
 import sqlite3
 import time
 import json
+import pickle
+import zlib
 import threading
 import hashlib
+import weakref
 import functools
-from typing import Any, Optional, Callable, Union
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional, Callable, Union, Iterable, Dict
 from pathlib import Path
 from .config import CONFIG_DIR
 
 CACHE_FILE = CONFIG_DIR / "cache.db"
 
+# SQL 语句保持为常量：常驻连接上 sqlite3 的语句缓存会复用预编译结果
+SQL_SET = (
+    'INSERT OR REPLACE INTO cache (key, value, expire_time, created_time, access_time, access_count, size, codec) '
+    'VALUES (?, ?, ?, ?, ?, 0, ?, ?)'
+)
+SQL_GET = 'SELECT value, expire_time, codec FROM cache WHERE key = ?'
+SQL_DELETE = 'DELETE FROM cache WHERE key = ?'
+SQL_EXPIRE = 'UPDATE cache SET expire_time = ? WHERE key = ?'
+SQL_TTL = 'SELECT expire_time FROM cache WHERE key = ?'
+SQL_CLEANUP = 'DELETE FROM cache WHERE expire_time < ?'
+SQL_KEYS = 'SELECT key FROM cache WHERE expire_time > ?'
+SQL_TOUCH = 'UPDATE cache SET access_time = ?, access_count = access_count + ? WHERE key = ?'
+SQL_GET_MANY = 'SELECT key, value, expire_time, codec FROM cache WHERE key IN ({})'
+SQL_USAGE = 'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+
+# 批量查询时每条语句的最大参数个数（SQLite 旧版本上限为 999）
+BATCH_SIZE = 500
+
+# 淘汰策略：按顺序优先淘汰排在前面的条目
+EVICTION_ORDER = {
+    'lru': 'access_time ASC',
+    'lfu': 'access_count ASC, access_time ASC',
+}
+
+# 新增列及其回填语句（兼容旧版本数据库）
+MIGRATIONS = {
+    'access_time': 'UPDATE cache SET access_time = created_time',
+    'access_count': 'UPDATE cache SET access_count = 0',
+    'size': 'UPDATE cache SET size = length(CAST(value AS BLOB))',
+    'codec': "UPDATE cache SET codec = 'json'",
+}
+
+
+@dataclass(frozen=True)
+class Codec:
+    """缓存值编解码器，名称记录在每一行中，读取时按行选择编解码器"""
+
+    name: str
+    dumps: Callable[[Any], Union[str, bytes]]
+    loads: Callable[[Union[str, bytes]], Any]
+
+
+# 解码失败时可能抛出的异常
+DECODE_ERRORS = (ValueError, TypeError, EOFError, pickle.UnpicklingError, zlib.error)
+
+
+def _json_codec() -> Codec:
+    return Codec('json', lambda v: json.dumps(v, ensure_ascii=False), json.loads)
+
+
+def _pickle_codec() -> Codec:
+    # 仅用于本机缓存文件，不要加载来源不可信的数据库
+    return Codec('pickle', lambda v: pickle.dumps(v, protocol=5), pickle.loads)
+
+
+def _msgpack_codec() -> Codec:
+    import msgpack
+
+    return Codec(
+        'msgpack',
+        lambda v: msgpack.packb(v, use_bin_type=True),
+        lambda d: msgpack.unpackb(d, raw=False),
+    )
+
+
+def _zlib_compressor():
+    return zlib.compress, zlib.decompress
+
+
+def _zstd_compressor():
+    import zstandard
+
+    return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+
+
+SERIALIZERS = {'json': _json_codec, 'pickle': _pickle_codec, 'msgpack': _msgpack_codec}
+COMPRESSORS = {'zlib': _zlib_compressor, 'zstd': _zstd_compressor}
+
+
+@functools.lru_cache(maxsize=None)
+def get_codec(name: str) -> Codec:
+    """
+    获取编解码器
+
+    Args:
+        name: 序列化方式，可附加压缩方式，如 'json'、'pickle+zlib'、'msgpack+zstd'
+
+    Returns:
+        编解码器实例
+    """
+    serializer, _, compressor = name.partition('+')
+    try:
+        codec = SERIALIZERS[serializer]()
+        if not compressor:
+            return codec
+        compress, decompress = COMPRESSORS[compressor]()
+    except KeyError:
+        raise ValueError(f"不支持的编解码器: {name}")
+    except ImportError as e:
+        raise ValueError(f"编解码器 {name} 不可用: {e}")
+
+    def dumps(value):
+        data = codec.dumps(value)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return compress(data)
+
+    return Codec(name, dumps, lambda data: codec.loads(decompress(data)))
+
+
+class MemoryTier:
+    """进程内 LRU 缓存层，按条目数和字节数限制容量
+
+    值以序列化后的数据保存，每次命中时重新反序列化，调用者修改返回的对象不会影响缓存。
+    字节数按序列化后的字节长度计算。
+    """
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0):
+        """
+        Args:
+            max_entries: 最大条目数，0表示不限制
+            max_bytes: 最大字节数，0表示不限制
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> (data, codec, expire_time, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key: str, current_time: float):
+        """返回 (data, codec, expire_time)，未命中或已过期时返回 None"""
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if current_time > item[2]:
+            self.discard(key)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[:3]
+
+    def put(self, key: str, data: Union[str, bytes], codec: str, expire_time: float, size: int) -> None:
+        self.discard(key)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        self._items[key] = (data, codec, expire_time, size)
+        self._bytes += size
+        while self._items and (
+            (self.max_entries and len(self._items) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, _, evicted_size) = self._items.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._bytes -= item[3]
+
+    def set_expire(self, key: str, expire_time: float) -> None:
+        item = self._items.get(key)
+        if item is not None:
+            self._items[key] = (item[0], item[1], expire_time, item[3])
+
+    def cleanup(self, current_time: float) -> None:
+        for key in [k for k, v in self._items.items() if current_time > v[2]]:
+            self.discard(key)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._items),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def _byte_size(data: Union[str, bytes]) -> int:
+    """序列化数据的字节长度，文本按 UTF-8 编码计算"""
+    return len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+
+
+class _PooledConnection:
+    """保存在 threading.local 中的常驻连接，被回收时关闭连接"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+def _release_pooled(pool: set, lock: threading.RLock, conn: sqlite3.Connection) -> None:
+    with lock:
+        pool.discard(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
 
 class KVCache:
     """基于SQLite的KV缓存类"""
 
-    def __init__(self, db_path: str = "cache.db", default_ttl: int = 3600):
+    def __init__(
+        self,
+        db_path: str = "cache.db",
+        default_ttl: int = 3600,
+        pooled: bool = False,
+        memory_entries: int = 0,
+        memory_bytes: int = 0,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        eviction: str = 'lru',
+        maintenance_interval: float = 300,
+        maintenance_writes: int = 256,
+        codec: str = 'json',
+    ):
         """
         初始化缓存
 
         Args:
             db_path: SQLite数据库文件路径
             default_ttl: 默认过期时间（秒）
+            pooled: 是否为每个线程保持常驻连接（WAL 模式，synchronous=NORMAL）
+            memory_entries: 内存 LRU 层最大条目数，与 memory_bytes 均为0时不启用
+            memory_bytes: 内存 LRU 层最大字节数
+            max_entries: 磁盘最大条目数，0表示不限制
+            max_bytes: 磁盘最大字节数（按序列化后的字节数计），0表示不限制
+            eviction: 超出限制时的淘汰策略，'lru' 或 'lfu'
+            maintenance_interval: 两次维护之间的最长间隔（秒）
+            maintenance_writes: 累计写入多少次后触发一次维护
+            codec: 新写入值使用的编解码器，见 get_codec()
         """
+        if eviction not in EVICTION_ORDER:
+            raise ValueError(f"不支持的淘汰策略: {eviction}")
         self.db_path = db_path
         self.default_ttl = default_ttl
+        self.codec = get_codec(codec)
+        self.pooled = pooled
         self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pool = set()
+        self._memory = None
+        if memory_entries or memory_bytes:
+            self._memory = MemoryTier(memory_entries, memory_bytes)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.maintenance_interval = maintenance_interval
+        self.maintenance_writes = maintenance_writes
+        self._touched = {}  # key -> [access_time, count]，在维护时批量写回
+        self._writes = 0
+        self._last_maintenance = time.time()
+        self._maintenance_thread = None
         self._init_db()
 
+    def _open_pooled(self) -> sqlite3.Connection:
+        """为当前线程创建常驻连接"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # auto_vacuum 必须在切换 WAL 之前设置，否则新数据库会以 auto_vacuum=NONE 创建
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # 线程结束时它的 threading.local 数据被释放，连接随之关闭，短生命周期的线程不会泄漏连接
+        holder = _PooledConnection(conn)
+        weakref.finalize(holder, _release_pooled, self._pool, self._lock, conn)
+        self._local.holder = holder
+        with self._lock:
+            self._pool.add(conn)
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """获取数据库连接，退出时提交事务（异常时回滚）"""
+        if self.pooled:
+            holder = getattr(self._local, 'holder', None)
+            conn = holder.conn if holder else self._open_pooled()
+            with conn:
+                yield conn
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        """等待后台维护结束并关闭所有常驻连接"""
+        self.wait_maintenance()
+        with self._lock:
+            pool = list(self._pool)
+            self._pool.clear()
+        for conn in pool:
+            conn.close()
+        self._local = threading.local()
+
     def _init_db(self):
         """初始化数据库表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
+            # auto_vacuum 只能在建表前设置，旧数据库在 maintain() 中通过 VACUUM 转换
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cache'"
+            ).fetchone():
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS cache (
                     key TEXT PRIMARY KEY,
                     value TEXT,
                     expire_time REAL,
-                    created_time REAL
+                    created_time REAL,
+                    access_time REAL,
+                    access_count INTEGER DEFAULT 0,
+                    size INTEGER DEFAULT 0,
+                    codec TEXT DEFAULT 'json'
                 )
             ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(cache)')}
+            for column, backfill in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE cache ADD COLUMN {column}')
+                    conn.execute(backfill)
             conn.execute(
                 'CREATE INDEX IF NOT EXISTS idx_expire_time ON cache(expire_time)'
             )
-            conn.commit()
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_access_time ON cache(access_time)'
+            )
+
+    def _touch(self, key: str, current_time: float) -> None:
+        """记录访问，维护时批量写回 access_time/access_count"""
+        touched = self._touched.get(key)
+        if touched is None:
+            self._touched[key] = [current_time, 1]
+        else:
+            touched[0] = current_time
+            touched[1] += 1
+
+    def _after_write(self, count: int = 1) -> None:
+        """写入后按次数或时间间隔安排后台维护，不在写入线程上执行"""
+        self._writes += count
+        if self._maintenance_due():
+            self.schedule_maintenance()
+
+    def _maintenance_due(self) -> bool:
+        return (
+            self._writes >= self.maintenance_writes
+            or time.time() - self._last_maintenance > self.maintenance_interval
+        )
+
+    def schedule_maintenance(self) -> threading.Thread:
+        """
+        在后台线程中执行维护，已有维护线程在运行时不重复启动
+
+        Returns:
+            维护线程
+        """
+        with self._lock:
+            thread = self._maintenance_thread
+            if thread is None:
+                thread = threading.Thread(
+                    target=self._maintenance_loop, name='KVCacheMaintain', daemon=True
+                )
+                self._maintenance_thread = thread
+                thread.start()
+            return thread
+
+    def _maintenance_loop(self) -> None:
+        """执行维护，维护期间写入又达到阈值时再执行一次"""
+        while True:
+            try:
+                self.maintain()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                if self._writes < self.maintenance_writes:
+                    self._maintenance_thread = None
+                    return
+
+    def wait_maintenance(self, timeout: Optional[float] = None) -> None:
+        """等待正在进行的后台维护结束"""
+        thread = self._maintenance_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def maintain(self) -> dict:
+        """
+        执行一次维护：写回访问统计、清理过期项、按容量淘汰并回收空闲页
+
+        只在取快照时持有实例锁，数据库操作在当前线程自己的连接上执行，
+        不阻塞其它线程的读写。
+
+        Returns:
+            维护结果统计
+        """
+        with self._lock:
+            current_time = time.time()
+            self._writes = 0
+            self._last_maintenance = current_time
+            touched, self._touched = self._touched, {}
+            if self._memory is not None:
+                self._memory.cleanup(current_time)
+
+        with self._connection() as conn:
+            if touched:
+                conn.executemany(
+                    SQL_TOUCH,
+                    [(t, n, key) for key, (t, n) in touched.items()],
+                )
+            expired = conn.execute(SQL_CLEANUP, (current_time,)).rowcount
+            victims = self._evict(conn)
+
+        if victims and self._memory is not None:
+            with self._lock:
+                for (key,) in victims:
+                    self._memory.discard(key)
+
+        with self._connection() as conn:
+            self._vacuum(conn)
+
+        return {'expired': expired, 'evicted': len(victims)}
+
+    def _evict(self, conn: sqlite3.Connection) -> list:
+        """超出容量时淘汰到限制的 90%，避免频繁触发，返回被淘汰的键"""
+        if not self.max_entries and not self.max_bytes:
+            return []
+
+        entries, total_bytes = conn.execute(SQL_USAGE).fetchone()
+        if (not self.max_entries or entries <= self.max_entries) and (
+            not self.max_bytes or total_bytes <= self.max_bytes
+        ):
+            return []
+
+        target_entries = int(self.max_entries * 0.9) if self.max_entries else entries
+        target_bytes = int(self.max_bytes * 0.9) if self.max_bytes else total_bytes
+        order = EVICTION_ORDER[self.eviction]
+
+        victims = []
+        for key, size in conn.execute(f'SELECT key, size FROM cache ORDER BY {order}'):
+            if entries <= target_entries and total_bytes <= target_bytes:
+                break
+            victims.append((key,))
+            entries -= 1
+            total_bytes -= size or 0
+
+        conn.executemany(SQL_DELETE, victims)
+        return victims
+
+    def _vacuum(self, conn: sqlite3.Connection) -> None:
+        """回收空闲页，必要时将旧数据库转换为增量 auto_vacuum 模式"""
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not freelist:
+            return
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        if auto_vacuum == 2:  # INCREMENTAL
+            # execute() 只执行一步，只释放一页；executescript() 会执行到结束
+            conn.executescript('PRAGMA incremental_vacuum;')
+        else:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+
+    def _encode(self, value: Any) -> Union[str, bytes]:
+        """按实例编解码器序列化值"""
+        try:
+            return self.codec.dumps(value)
+        except (TypeError, ValueError, pickle.PicklingError) as e:
+            raise ValueError(f"无法序列化值: {e}")
+
+    def _decode(self, data: Union[str, bytes], codec: Optional[str]) -> Any:
+        """按行记录的编解码器反序列化值，旧数据没有记录时按 JSON 处理"""
+        return get_codec(codec or 'json').loads(data)
 
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """
@@ -57,17 +515,25 @@ class KVCache:
             expire_time = current_time + (ttl or self.default_ttl)
 
             # 序列化值
-            try:
-                serialized_value = json.dumps(value, ensure_ascii=False)
-            except (TypeError, ValueError) as e:
-                raise ValueError(f"无法序列化值: {e}")
-
-            with sqlite3.connect(self.db_path) as conn:
+            serialized_value = self._encode(value)
+            size = _byte_size(serialized_value)
+            with self._connection() as conn:
                 conn.execute(
-                    'INSERT OR REPLACE INTO cache (key, value, expire_time, created_time) VALUES (?, ?, ?, ?)',
-                    (key, serialized_value, expire_time, current_time),
+                    SQL_SET,
+                    (
+                        key,
+                        serialized_value,
+                        expire_time,
+                        current_time,
+                        current_time,
+                        size,
+                        self.codec.name,
+                    ),
                 )
-                conn.commit()
+            self._touched.pop(key, None)
+            if self._memory is not None:
+                self._memory.put(key, serialized_value, self.codec.name, expire_time, size)
+            self._after_write()
 
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -83,26 +549,33 @@ class KVCache:
         with self._lock:
             current_time = time.time()
 
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    'SELECT value, expire_time FROM cache WHERE key = ?', (key,)
-                )
-                row = cursor.fetchone()
+            if self._memory is not None:
+                item = self._memory.get(key, current_time)
+                if item is not None:
+                    self._touch(key, current_time)
+                    return self._decode(item[0], item[1])
+
+            with self._connection() as conn:
+                row = conn.execute(SQL_GET, (key,)).fetchone()
 
                 if row is None:
                     return default
 
-                value, expire_time = row
+                value, expire_time, codec = row
                 if current_time > expire_time:
                     # 删除过期缓存
-                    conn.execute('DELETE FROM cache WHERE key = ?', (key,))
-                    conn.commit()
+                    conn.execute(SQL_DELETE, (key,))
                     return default
 
-                try:
-                    return json.loads(value)
-                except (json.JSONDecodeError, TypeError):
-                    return default
+            try:
+                result = self._decode(value, codec)
+            except DECODE_ERRORS:
+                return default
+
+            self._touch(key, current_time)
+            if self._memory is not None:
+                self._memory.put(key, value, codec, expire_time, _byte_size(value))
+            return result
 
     def delete(self, key: str) -> bool:
         """
@@ -115,11 +588,114 @@ class KVCache:
             是否删除成功
         """
         with self._lock:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute('DELETE FROM cache WHERE key = ?', (key,))
-                conn.commit()
+            self._touched.pop(key, None)
+            if self._memory is not None:
+                self._memory.discard(key)
+            with self._connection() as conn:
+                cursor = conn.execute(SQL_DELETE, (key,))
                 return cursor.rowcount > 0
 
+    def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """
+        批量设置缓存，在同一事务中写入
+
+        Args:
+            items: 键值对
+            ttl: 过期时间（秒），None表示使用默认TTL
+        """
+        if not items:
+            return
+
+        with self._lock:
+            current_time = time.time()
+            expire_time = current_time + (ttl or self.default_ttl)
+
+            codec = self.codec.name
+            rows = []
+            for key, value in items.items():
+                serialized_value = self._encode(value)
+                size = _byte_size(serialized_value)
+                rows.append(
+                    (key, serialized_value, expire_time, current_time, current_time, size, codec)
+                )
+
+            with self._connection() as conn:
+                conn.executemany(SQL_SET, rows)
+
+            for key in items:
+                self._touched.pop(key, None)
+            if self._memory is not None:
+                for row in rows:
+                    self._memory.put(row[0], row[1], codec, expire_time, row[5])
+            self._after_write(len(rows))
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        批量获取缓存
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            存在且未过期的键值对，不包含未命中的键
+        """
+        with self._lock:
+            current_time = time.time()
+            result = {}
+            pending = []
+            for key in dict.fromkeys(keys):
+                if self._memory is not None:
+                    item = self._memory.get(key, current_time)
+                    if item is not None:
+                        self._touch(key, current_time)
+                        result[key] = self._decode(item[0], item[1])
+                        continue
+                pending.append(key)
+
+            expired = []
+            with self._connection() as conn:
+                for i in range(0, len(pending), BATCH_SIZE):
+                    chunk = pending[i:i + BATCH_SIZE]
+                    sql = SQL_GET_MANY.format(','.join('?' * len(chunk)))
+                    for key, value, expire_time, codec in conn.execute(sql, chunk):
+                        if current_time > expire_time:
+                            expired.append((key,))
+                            continue
+                        try:
+                            result[key] = self._decode(value, codec)
+                        except DECODE_ERRORS:
+                            continue
+                        self._touch(key, current_time)
+                        if self._memory is not None:
+                            self._memory.put(key, value, codec, expire_time, _byte_size(value))
+                if expired:
+                    conn.executemany(SQL_DELETE, expired)
+            return result
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """
+        批量删除缓存
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            删除的缓存数量
+        """
+        keys = [(key,) for key in dict.fromkeys(keys)]
+        if not keys:
+            return 0
+
+        with self._lock:
+            for (key,) in keys:
+                self._touched.pop(key, None)
+                if self._memory is not None:
+                    self._memory.discard(key)
+            with self._connection() as conn:
+                before = conn.total_changes
+                conn.executemany(SQL_DELETE, keys)
+                return conn.total_changes - before
+
     def exists(self, key: str) -> bool:
         """
         检查缓存是否存在且未过期
@@ -147,11 +723,10 @@ class KVCache:
             current_time = time.time()
             expire_time = current_time + ttl
 
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    'UPDATE cache SET expire_time = ? WHERE key = ?', (expire_time, key)
-                )
-                conn.commit()
+            if self._memory is not None:
+                self._memory.set_expire(key, expire_time)
+            with self._connection() as conn:
+                cursor = conn.execute(SQL_EXPIRE, (expire_time, key))
                 return cursor.rowcount > 0
 
     def ttl(self, key: str) -> int:
@@ -167,11 +742,13 @@ class KVCache:
         with self._lock:
             current_time = time.time()
 
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    'SELECT expire_time FROM cache WHERE key = ?', (key,)
-                )
-                row = cursor.fetchone()
+            if self._memory is not None:
+                item = self._memory.get(key, current_time)
+                if item is not None:
+                    return int(item[2] - current_time)
+
+            with self._connection() as conn:
+                row = conn.execute(SQL_TTL, (key,)).fetchone()
 
                 if row is None:
                     return -1
@@ -191,23 +768,24 @@ class KVCache:
         """
         with self._lock:
             current_time = time.time()
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    'DELETE FROM cache WHERE expire_time < ?', (current_time,)
-                )
-                conn.commit()
+            if self._memory is not None:
+                self._memory.cleanup(current_time)
+            with self._connection() as conn:
+                cursor = conn.execute(SQL_CLEANUP, (current_time,))
                 return cursor.rowcount
 
     def clear(self) -> None:
         """清空所有缓存"""
         with self._lock:
-            with sqlite3.connect(self.db_path) as conn:
+            self._touched.clear()
+            if self._memory is not None:
+                self._memory.clear()
+            with self._connection() as conn:
                 conn.execute('DELETE FROM cache')
-                conn.commit()
 
     def size(self) -> int:
         """获取缓存数量"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.execute('SELECT COUNT(*) FROM cache')
             return cursor.fetchone()[0]
 
@@ -215,39 +793,104 @@ class KVCache:
         """获取所有有效缓存键"""
         with self._lock:
             current_time = time.time()
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute(
-                    'SELECT key FROM cache WHERE expire_time > ?', (current_time,)
-                )
+            with self._connection() as conn:
+                cursor = conn.execute(SQL_KEYS, (current_time,))
                 return [row[0] for row in cursor.fetchall()]
 
     def stats(self) -> dict:
         """获取缓存统计信息"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.execute(
                 '''
                 SELECT 
                     COUNT(*) as total,
                     COUNT(CASE WHEN expire_time > ? THEN 1 END) as valid,
-                    COUNT(CASE WHEN expire_time <= ? THEN 1 END) as expired
+                    COUNT(CASE WHEN expire_time <= ? THEN 1 END) as expired,
+                    COALESCE(SUM(size), 0) as bytes
                 FROM cache
             ''',
                 (time.time(), time.time()),
             )
 
             row = cursor.fetchone()
-            return {'total': row[0], 'valid': row[1], 'expired': row[2]}
+        stats = {
+            'total': row[0],
+            'valid': row[1],
+            'expired': row[2],
+            'bytes': row[3],
+        }
+        if self._memory is not None:
+            with self._lock:
+                stats['memory'] = self._memory.stats()
+        return stats
+
+
+class AsyncKVCache:
+    """KVCache 的 asyncio 封装，所有 SQLite 操作在专用线程上执行"""
+
+    def __init__(self, cache: Optional[KVCache] = None):
+        """
+        Args:
+            cache: 被封装的缓存实例，None表示使用默认实例
+        """
+        self.cache = cache or get_default_cache()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='KVCache')
+
+    async def _run(self, func: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return await self._run(self.cache.get, key, default)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        await self._run(self.cache.set, key, value, ttl)
+
+    async def delete(self, key: str) -> bool:
+        return await self._run(self.cache.delete, key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return await self._run(self.cache.get_many, list(keys))
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        await self._run(self.cache.set_many, dict(items), ttl)
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        return await self._run(self.cache.delete_many, list(keys))
+
+    async def ttl(self, key: str) -> int:
+        return await self._run(self.cache.ttl, key)
+
+    async def maintain(self) -> dict:
+        return await self._run(self.cache.maintain)
+
+    def close(self) -> None:
+        """停止专用线程"""
+        self._executor.shutdown(wait=True)
 
 
 # 全局缓存实例
 _default_cache = None
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
 
 
 def get_default_cache() -> KVCache:
     """获取默认缓存实例"""
     global _default_cache
     if _default_cache is None:
-        _default_cache = KVCache(str(CACHE_FILE))
+        _default_cache = KVCache(
+            str(CACHE_FILE),
+            pooled=True,
+            memory_entries=DEFAULT_MEMORY_ENTRIES,
+            memory_bytes=DEFAULT_MEMORY_BYTES,
+            max_entries=DEFAULT_MAX_ENTRIES,
+            max_bytes=DEFAULT_MAX_BYTES,
+        )
+        # 启动时的清理放到后台执行，不阻塞导入和启动
+        _default_cache.schedule_maintenance()
     return _default_cache
 
 
@@ -331,6 +974,21 @@ def delete_cache(key: str) -> bool:
     return get_default_cache().delete(key)
 
 
+def set_cache_many(items: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    """批量设置缓存"""
+    get_default_cache().set_many(items, ttl)
+
+
+def get_cache_many(keys: Iterable[str]) -> Dict[str, Any]:
+    """批量获取缓存"""
+    return get_default_cache().get_many(keys)
+
+
+def delete_cache_many(keys: Iterable[str]) -> int:
+    """批量删除缓存"""
+    return get_default_cache().delete_many(keys)
+
+
 def clear_cache() -> None:
     """清空缓存"""
     get_default_cache().clear()
@@ -354,6 +1012,3 @@ def cleanup_cache() -> int:
 def cache_stats() -> dict:
     """获取缓存统计"""
     return get_default_cache().stats()
-
-
-cleanup_cache()
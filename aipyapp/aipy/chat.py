@@ -1,47 +1,113 @@
 import hashlib
 import base64
 from collections import Counter
-from typing import Optional, List, Union, Dict
+from typing import Optional, List, Union, Dict, Any
 
-from pydantic import BaseModel, Field
+from loguru import logger
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, ValidationError, field_serializer
 
 from ..llm import MessageRole, AIMessage, UserMessage, SystemMessage, ErrorMessage
 from .types import InstanceTrackerMixin
+from .blobs import BlobStore, update_hash, extract_blobs, resolve_blobs, has_blob_refs, has_large_strings
+
+Message = Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]
+MessageAdapter = TypeAdapter(Message)
 
 class ChatMessage(InstanceTrackerMixin, BaseModel):
     id: str
-    message: Union[AIMessage, UserMessage, SystemMessage, ErrorMessage] = Field(exclude=True, default=None)
+    message: Message = Field(exclude=True, default=None)
+    _storage: Optional['MessageStorage'] = PrivateAttr(default=None)
 
     def __hash__(self):
         return hash(self.id)
+
+    def __eq__(self, other):
+        if not isinstance(other, ChatMessage):
+            return NotImplemented
+        return self.id == other.id
     
     def model_post_init(self, __context):
         if __context and 'message_storage' in __context:
-            message_storage = __context['message_storage']
-            self.message = message_storage.get(self.id)
-            #print(f'Recover message {self.id} from storage: {self.message is not None}')
+            # 首次访问时再从存储中取出消息
+            self._storage = __context['message_storage']
+
+    @classmethod
+    def from_storage(cls, id: str, storage: 'MessageStorage') -> 'ChatMessage':
+        """创建每次访问时从存储中读取消息的引用"""
+        message = cls(id=id)
+        message._storage = storage
+        return message
+
+    def get_message(self) -> Optional[Message]:
+        """返回消息，保存在 blob 中的消息不缓存，每次从存储读取"""
+        message = self.message
+        if message is None and self._storage is not None:
+            storage = self._storage
+            message = storage.get(self.id)
+            if storage.is_resident(self.id):
+                self.message = message
+                self._storage = None
+        return message
 
     @property
     def role(self):
-        return self.message.role if self.message is not None else None
+        if self.message is None and self._storage is not None:
+            return self._storage.get_role(self.id)
+        message = self.get_message()
+        return message.role if message is not None else None
     
     @property
     def content(self):
-        return self.message.content if self.message is not None else None
+        message = self.get_message()
+        return message.content if message is not None else None
     
     @property
     def reason(self):
-        return self.message.reason if self.message is not None else None
+        message = self.get_message()
+        return message.reason if message is not None else None
     
     @property
     def usage(self):
-        return self.message.usage if self.message is not None else Counter()
+        message = self.get_message()
+        return message.usage if message is not None else Counter()
     
     def dict(self) -> dict:
-        return self.message.dict() if self.message is not None else {}
+        message = self.get_message()
+        return message.dict() if message is not None else {}
     
+def serialize_messages(messages: Dict[str, Any], handler) -> Dict[str, Any]:
+    """序列化消息字典，未校验的原始字典原样输出"""
+    loaded = {id: message for id, message in messages.items() if not isinstance(message, dict)}
+    if len(loaded) == len(messages):
+        return handler(messages)
+    dumped = handler(loaded)
+    return {id: message if isinstance(message, dict) else dumped[id] for id, message in messages.items()}
+
 class MessageStorage(BaseModel):
-    messages: Dict[str, Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]] = Field(default_factory=dict)
+    """消息存储
+
+    延迟加载时 messages 中保存未校验的原始字典，get() 首次访问时再校验。
+    设置 blob 存储后，超过 BLOB_THRESHOLD 的消息内容保存到 blob，
+    messages 中只保留引用，get() 每次从 blob 读取。
+    """
+    messages: Dict[str, Message] = Field(default_factory=dict)
+    _blob_store: Optional[BlobStore] = PrivateAttr(default=None)
+
+    @classmethod
+    def lazy(cls, messages: Dict[str, Any]) -> 'MessageStorage':
+        """用未校验的原始消息字典创建存储"""
+        return cls.model_construct(messages=dict(messages))
+
+    @field_serializer('messages', mode='wrap')
+    def _serialize_messages(self, messages: Dict[str, Any], handler):
+        return serialize_messages(messages, handler)
+
+    @property
+    def blob_store(self) -> Optional[BlobStore]:
+        return self._blob_store
+
+    def set_blob_store(self, blob_store: Optional[BlobStore]) -> None:
+        self._blob_store = blob_store
 
     def __len__(self):
         return len(self.messages)
@@ -51,20 +117,67 @@ class MessageStorage(BaseModel):
     
     def _compute_id(self, message: Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]) -> str:
         """Compute short hash of message role + content using Base64-encoded 8-byte SHA-1"""
-        content_str = f"{message.role}:{message.content}"
-        hash_bytes = hashlib.sha1(content_str.encode('utf-8')).digest()[:8]
+        hasher = hashlib.sha1(f"{message.role}:".encode('utf-8'))
+        content = message.content
+        update_hash(hasher, content if isinstance(content, str) else str(content))
+        hash_bytes = hasher.digest()[:8]
         return base64.urlsafe_b64encode(hash_bytes).decode().rstrip('=')
     
     def store(self, message: Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]) -> ChatMessage:
         id = self._compute_id(message)
-        try:
-            message = self.messages[id]
-        except KeyError:
-            self.messages[id] = message
+        if id in self.messages and not self.is_resident(id):
+            return ChatMessage.from_storage(id, self)
+
+        stored = self.get(id)
+        if stored is not None:
+            return ChatMessage(id=id, message=stored)
+
+        blob_store = self._blob_store
+        if blob_store is not None:
+            data = message.model_dump(mode='json', exclude_none=True)
+            if has_large_strings(data.get('content')):
+                data['content'] = extract_blobs(data['content'], blob_store)
+                self.messages[id] = data
+                return ChatMessage.from_storage(id, self)
+
+        self.messages[id] = message
         return ChatMessage(id=id, message=message)
 
+    def is_resident(self, id: str) -> bool:
+        """消息是否常驻内存，内容保存在 blob 中的消息返回 False"""
+        message = self.messages.get(id)
+        return not isinstance(message, dict) or not has_blob_refs(message)
+
+    def get_role(self, id: str) -> Optional[MessageRole]:
+        """不读取消息内容，返回消息角色"""
+        message = self.messages.get(id)
+        if isinstance(message, dict):
+            role = message.get('role')
+            return MessageRole(role) if role else None
+        return message.role if message is not None else None
+
     def get(self, id: str) -> Optional[Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]]:
-        return self.messages.get(id)
+        message = self.messages.get(id)
+        if not isinstance(message, dict):
+            return message
+
+        try:
+            if has_blob_refs(message):
+                if self._blob_store is None:
+                    logger.error('Blob store not set', id=id)
+                    return None
+                return MessageAdapter.validate_python(resolve_blobs(message, self._blob_store))
+            message = self.messages[id] = MessageAdapter.validate_python(message)
+        except (ValidationError, KeyError):
+            logger.exception('Invalid message in storage', id=id)
+            return None
+        return message
+
+    def load_all(self) -> None:
+        """校验所有延迟加载的消息，内容保存在 blob 中的消息除外"""
+        for id in list(self.messages):
+            if self.is_resident(id):
+                self.get(id)
 
 class ChatMessages(BaseModel):
     messages: list[ChatMessage] = Field(default_factory=list)
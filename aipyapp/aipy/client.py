@@ -2,12 +2,15 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
+import time
+import asyncio
 from typing import TYPE_CHECKING
 from loguru import logger
 
 from .. import __version__
 from ..llm import ModelCapability, AIMessage
 from .chat import ChatMessage
+from .response import Response, StreamingParser
 
 if TYPE_CHECKING:
     from .task import Task
@@ -15,42 +18,70 @@ if TYPE_CHECKING:
 class LineReceiver(list):
     def __init__(self):
         super().__init__()
-        self.buffer = ""
+        # 未结束的一行按数据块保存，收到换行时才拼接，避免长行反复拼接字符串
+        self._parts = []
 
     @property
     def content(self):
         return '\n'.join(self)
+
+    @property
+    def buffer(self):
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ""
     
     def feed(self, data: str):
-        self.buffer += data
-        new_lines = []
-
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            if line:
-                self.append(line)
-                new_lines.append(line)
+        if not data:
+            return []
+        self._parts.append(data)
+        if '\n' not in data:
+            return []
 
+        *lines, rest = ''.join(self._parts).split('\n')
+        self._parts = [rest] if rest else []
+        new_lines = [line for line in lines if line]
+        self.extend(new_lines)
         return new_lines
     
     def empty(self):
-        return not self and not self.buffer
+        return not self and not self._parts
     
     def done(self):
         buffer = self.buffer
         if buffer:
             self.append(buffer)
-            self.buffer = ""
+            self._parts = []
         return buffer
 
+def _is_marker(line: str) -> bool:
+    """Block / ToolCall 标记行不显示"""
+    return line.startswith('<!-- Block-') or line.startswith('<!-- ToolCall:')
+
 class StreamProcessor:
-    """流式数据处理器，负责处理 LLM 流式响应并发送事件"""
+    """
+    流式数据处理器，负责处理 LLM 流式响应并发送事件
+
+    mode 为 line 时每收到完整的行发送一次 stream 事件；为 chunk 时按数据块发送，
+    interval 毫秒内的数据块合并为一个事件，事件的 partial 为当前未结束的一行。
+    收到的正文按行喂给 parser，代码块和工具调用完整时即可发出事件。
+    """
+    LINE = 'line'
+    CHUNK = 'chunk'
     
-    def __init__(self, task, name):
+    def __init__(self, task, name, mode: str = LINE, interval: int = 0, parser: StreamingParser | None = None):
         self.task = task
         self.name = name
+        self.parser = parser
         self.lr = LineReceiver()
         self.lr_reason = LineReceiver()
+        self.chunked = mode == self.CHUNK
+        self.interval = interval / 1000
+        # chunk 模式下尚未发送的完整行
+        self._pending = []
+        self._pending_reason = False
+        self._dirty = False
+        self._last_emit = 0.0
 
     @property
     def content(self):
@@ -69,6 +100,8 @@ class StreamProcessor:
         """支持上下文管理器协议"""
         if self.lr.buffer:
             self.process_chunk('\n')        
+        if self.chunked:
+            self._flush()
         self.task.emit('stream_completed', llm=self.name)
     
     def process_chunk(self, content, *, reason=False):
@@ -80,19 +113,54 @@ class StreamProcessor:
         if not reason and self.lr.empty() and not self.lr_reason.empty():
             line = self.lr_reason.done()
             if line:
-                self.task.emit('stream', llm=self.name, lines=[line, "\n\n----\n\n"], reason=True)
+                self._emit([line, "\n\n----\n\n"], True)
 
         # 处理当前数据块
         lr = self.lr_reason if reason else self.lr
         lines = lr.feed(content)
+        if self.parser and lines and not reason:
+            self.parser.feed(''.join(f'{line}\n' for line in lines))
+        if self.chunked:
+            self._feed_chunk(lines, reason)
+            return
         if not lines:
             return
         
         # 过滤掉特殊注释行
-        lines2 = [line for line in lines if not (line.startswith('<!-- Block-') or line.startswith('<!-- ToolCall:'))]
+        lines2 = [line for line in lines if not _is_marker(line)]
         if lines2:
             self.task.emit('stream', llm=self.name, lines=lines2, reason=reason)
 
+    def _emit(self, lines, reason):
+        if self.chunked:
+            self._flush()
+        self.task.emit('stream', llm=self.name, lines=lines, reason=reason)
+
+    def _feed_chunk(self, lines, reason):
+        if reason != self._pending_reason:
+            self._flush()
+            self._pending_reason = reason
+        self._pending.extend(line for line in lines if not _is_marker(line))
+        self._dirty = True
+        now = time.monotonic()
+        if now - self._last_emit >= self.interval:
+            self._flush(now)
+
+    def _flush(self, now: float | None = None):
+        """发送已收到的完整行和当前未结束的一行"""
+        if not self._dirty:
+            return
+        reason = self._pending_reason
+        partial = (self.lr_reason if reason else self.lr).buffer
+        # 可能是正在接收的标记行
+        if partial.startswith('<!--') or '<!--'.startswith(partial):
+            partial = ''
+        lines, self._pending = self._pending, []
+        self._dirty = False
+        self._last_emit = now or time.monotonic()
+        if lines or partial:
+            self.task.emit('stream', llm=self.name, lines=lines, reason=reason, partial=partial)
+
 class Client:
     def __init__(self, task: 'Task'):
         self.manager = task.client_manager
@@ -103,7 +171,12 @@ class Client:
         # 接收外部传入的上下文管理器
         self.context_manager = task.context_manager
         self.storage = task.message_storage
+        self.response_cache = getattr(task.manager, 'response_cache', None)
+        settings = getattr(task.manager, 'settings', None) or {}
+        self.stream_config = settings.get('stream') or {}
         self.log = logger.bind(src='Client', name=self.current.name)
+        # 最近一次请求的增量解析器
+        self.parser: StreamingParser | None = None
 
     @property
     def name(self):
@@ -144,15 +217,49 @@ class Client:
         
         return any(capability in model_info.capabilities for capability in capabilities)
     
-    def __call__(self, user_message: ChatMessage) -> ChatMessage:
+    def _prepare(self, user_message: ChatMessage):
         client = self.current
-        stream_processor = StreamProcessor(self.task, client.name)
+        self.parser = StreamingParser(self.task.emit)
+        stream_processor = StreamProcessor(self.task, client.name, mode=self.stream_config.get('mode', StreamProcessor.LINE),
+                                           interval=self.stream_config.get('interval_ms', 0), parser=self.parser)
         
         messages = self.context_manager.get_messages()
         messages.append(user_message)
-        msg = client([msg.dict() for msg in messages], stream_processor=stream_processor, extra_headers=self.extra_headers)
+        messages = [msg.dict() for msg in messages]
+        return client, messages, stream_processor
+
+    def _complete(self, user_message: ChatMessage, msg) -> ChatMessage:
         msg = self.storage.store(msg)
-        if isinstance(msg.message, AIMessage):
+        if isinstance(msg.get_message(), AIMessage):
             self.context_manager.add_message(user_message)
             self.context_manager.add_message(msg)
         return msg
+
+    def __call__(self, user_message: ChatMessage) -> ChatMessage:
+        client, messages, stream_processor = self._prepare(user_message)
+        cache = self.response_cache
+        msg = cache.get(client, messages, stream_processor) if cache else None
+        if msg is None:
+            msg = self.manager.call(client, messages, stream_processor=stream_processor,
+                                    extra_headers=self.extra_headers)
+            if cache and isinstance(msg, AIMessage):
+                cache.put(client, messages, msg)
+        return self._complete(user_message, msg)
+
+    async def acall(self, user_message: ChatMessage) -> ChatMessage:
+        """__call__ 的异步版本，同样经过响应缓存和请求路由"""
+        client, messages, stream_processor = self._prepare(user_message)
+        cache = self.response_cache
+        msg = await asyncio.to_thread(cache.get, client, messages, stream_processor) if cache else None
+        if msg is None:
+            msg = await self.manager.acall(client, messages, stream_processor=stream_processor,
+                                           extra_headers=self.extra_headers)
+            if cache and isinstance(msg, AIMessage):
+                await asyncio.to_thread(cache.put, client, messages, msg)
+        return self._complete(user_message, msg)
+
+    def parse(self, msg: ChatMessage, parse_mcp: bool = False) -> Response:
+        """解析最近一次请求的响应，结果与 Response.from_message 相同"""
+        if self.parser:
+            return self.parser.finish(msg, parse_mcp=parse_mcp)
+        return Response.from_message(msg, parse_mcp=parse_mcp)
@@ -2,10 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import time
+import heapq
+import itertools
 from abc import ABC, abstractmethod
 from collections import Counter
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Union, Tuple
+from typing import List, Dict, Any, Optional, Union, Tuple, TYPE_CHECKING
 from enum import Enum
 
 from loguru import logger
@@ -13,6 +15,10 @@ from pydantic import BaseModel, Field
 
 from ..llm import MessageRole, UserMessage
 from .chat import ChatMessage, MessageStorage
+from .retrieval import VectorIndex, create_embedder
+
+if TYPE_CHECKING:
+    from .summary import RollingSummarizer
 
 class ContextStrategy(str, Enum):
     """上下文管理策略"""
@@ -20,6 +26,7 @@ class ContextStrategy(str, Enum):
     IMPORTANCE_FILTER = "importance_filter"  # 重要性过滤
     SUMMARY_COMPRESSION = "summary_compression"  # 摘要压缩
     HYBRID = "hybrid"                      # 混合策略
+    RETRIEVAL = "retrieval"                # 相关性检索
 
 class ITokenEstimator(ABC):
     """Token估算器接口"""
@@ -30,20 +37,83 @@ class ITokenEstimator(ABC):
         pass
 
 
+def _iter_text(content) -> List[str]:
+    """提取消息内容中的文本"""
+    if isinstance(content, str):
+        return [content]
+    texts = []
+    if isinstance(content, list):
+        for item in content:
+            if isinstance(item, dict):
+                if item.get('type') == 'text':
+                    texts.append(item.get('text', ''))
+            elif getattr(item, 'type', None) == 'text':
+                texts.append(item.text)
+    return texts
+
 class DefaultTokenEstimator(ITokenEstimator):
-    """默认Token估算器实现"""
+    """默认Token估算器实现
+
+    按字符估算：非 ASCII 字符（中日韩文字等）每个约 1 个 token，ASCII 字符约 4 个一个 token。
+    """
     
     def estimate(self, message: ChatMessage) -> int:
-        content = message.content
-        if isinstance(content, str):
-            return len(content) // 4
-        elif isinstance(content, list):
-            total_length = 0
-            for item in content:
-                if item.get('type') == 'text':
-                    total_length += len(item.get('text', ''))
-            return total_length // 4
-        return 0
+        total = 0
+        for text in _iter_text(message.content):
+            ascii_count = len(text.encode('ascii', 'ignore'))
+            total += len(text) - ascii_count + (ascii_count + 3) // 4
+        return total
+
+class TiktokenEstimator(ITokenEstimator):
+    """基于 tiktoken BPE 词表的估算器
+
+    tiktoken 为可选依赖，词表首次使用时下载并缓存（可用 TIKTOKEN_CACHE_DIR 指定缓存目录）。
+    """
+
+    def __init__(self, encoding_name: str):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def estimate(self, message: ChatMessage) -> int:
+        return sum(len(self.encoding.encode(text, disallowed_special=())) for text in _iter_text(message.content))
+
+class MemoizedTokenEstimator(ITokenEstimator):
+    """按 ChatMessage.id 缓存估算结果，每条消息只计算一次
+
+    消息 ID 由角色和内容的哈希得到，相同 ID 的消息内容相同。
+    """
+
+    def __init__(self, estimator: ITokenEstimator):
+        self.estimator = estimator
+        self._counts: Dict[str, int] = {}
+
+    def estimate(self, message: ChatMessage) -> int:
+        try:
+            return self._counts[message.id]
+        except KeyError:
+            count = self._counts[message.id] = self.estimator.estimate(message)
+            return count
+
+    def clear(self):
+        self._counts.clear()
+
+def create_token_estimator(tokenizer: Optional[str] = None) -> ITokenEstimator:
+    """
+    创建带缓存的估算器
+
+    Args:
+        tokenizer: tiktoken 编码名称，为空或 tiktoken 不可用时使用 DefaultTokenEstimator
+    """
+    estimator = None
+    if tokenizer:
+        try:
+            estimator = TiktokenEstimator(tokenizer)
+        except ImportError:
+            logger.debug('tiktoken not installed, using default token estimator')
+        except Exception as e:
+            logger.warning(f'Failed to load tokenizer {tokenizer}: {e}')
+    return MemoizedTokenEstimator(estimator or DefaultTokenEstimator())
 
 class ContextConfig(BaseModel):
     """上下文管理配置"""
@@ -51,19 +121,32 @@ class ContextConfig(BaseModel):
     max_rounds: int = Field(default=10, description="最大对话轮数")
     auto_compress: bool = Field(default=True, description="是否自动压缩")
     strategy: ContextStrategy = Field(default=ContextStrategy.HYBRID, description="压缩策略")
-    compression_ratio: float = Field(default=0.3, ge=0.0, le=1.0, description="压缩比例")
+    compression_ratio: float = Field(default=0.3, ge=0.0, le=1.0, description="压缩时额外腾出的预算比例")
     importance_threshold: float = Field(default=0.5, ge=0.0, le=1.0, description="重要性阈值")
     summary_max_length: int = Field(default=200, gt=0, description="摘要最大长度")
     preserve_system: bool = Field(default=True, description="是否保留系统消息")
     preserve_recent: int = Field(default=3, gt=0, description="保留最近几轮对话")
+    summary_llm: Optional[str] = Field(default=None, description="生成摘要的 LLM 名称，为空时截取消息开头作为摘要")
+    retrieval_top_k: int = Field(default=5, gt=0, description="检索策略最多加入的历史消息数")
+    embedding_model: Optional[str] = Field(default=None, description="本地 embedding 模型，为空时使用哈希词袋向量")
+
+    @property
+    def target_tokens(self) -> int:
+        """压缩后的目标 token 数
+
+        压缩到 max_tokens 以下再留出 compression_ratio 的余量，之后几轮只追加消息，
+        消息前缀保持不变，可以命中 LLM 服务端的提示词缓存。
+        """
+        return int(self.max_tokens * (1 - self.compression_ratio))
 
 class IContextStrategy(ABC):
     """上下文压缩策略接口"""
     def __init__(self, message_store: MessageStorage, config: ContextConfig, 
-                 estimator: ITokenEstimator):
+                 estimator: ITokenEstimator, summarizer: Optional['RollingSummarizer'] = None):
         self.message_store = message_store
         self.config = config
         self.estimator = estimator
+        self.summarizer = summarizer
         self.log = logger.bind(src=self.__class__.__name__)
 
     @abstractmethod
@@ -71,6 +154,10 @@ class IContextStrategy(ABC):
         """压缩上下文数据（原地修改）"""
         pass
 
+    def on_message(self, message: ChatMessage, tokens: int) -> None:
+        """消息加入上下文后调用，默认不处理"""
+        pass
+
 class SlidingWindowStrategy(IContextStrategy):
     """滑动窗口压缩策略"""
     
@@ -79,35 +166,42 @@ class SlidingWindowStrategy(IContextStrategy):
             return
             
         original_count = len(context_data.messages)
+        tokens = context_data.tokens
         preserved_messages = []
+        preserved_counts = []
         preserved_tokens = 0
         
         # 保留系统消息
-        system_messages = [msg for msg in context_data.messages if msg.role == MessageRole.SYSTEM]
-        for msg in system_messages:
-            preserved_messages.append(msg)
-            preserved_tokens += self.estimator.estimate(msg)
+        recent_messages = []
+        for msg, msg_tokens in zip(context_data.messages, tokens):
+            if msg.role == MessageRole.SYSTEM:
+                preserved_messages.append(msg)
+                preserved_counts.append(msg_tokens)
+                preserved_tokens += msg_tokens
+            else:
+                recent_messages.append((msg, msg_tokens))
         
         # 保留最近的对话
-        recent_messages = [msg for msg in context_data.messages if msg.role != MessageRole.SYSTEM]
         max_recent = self.config.preserve_recent * 2
         
-        for msg in recent_messages[-max_recent:]:
-            msg_tokens = self.estimator.estimate(msg)
-            if preserved_tokens + msg_tokens <= self.config.max_tokens:
+        for msg, msg_tokens in recent_messages[-max_recent:]:
+            if preserved_tokens + msg_tokens <= self.config.target_tokens:
                 preserved_messages.append(msg)
+                preserved_counts.append(msg_tokens)
                 preserved_tokens += msg_tokens
             else:
                 break
         
         # 更新上下文数据
-        context_data.messages = preserved_messages
-        context_data.total_tokens = preserved_tokens
+        context_data.set_messages(preserved_messages, preserved_counts)
         
         self.log.info(f"Sliding window compression: {original_count} -> {len(preserved_messages)} messages, {preserved_tokens} tokens")
 
 class ImportanceFilterStrategy(IContextStrategy):
-    """重要性过滤压缩策略"""
+    """重要性过滤压缩策略
+
+    用堆按重要性依次取出消息，在 token 预算内贪心选择，复杂度 O(n log n)。
+    """
     
     def compress(self, context_data: 'ContextData') -> None:
         if context_data.total_tokens <= self.config.max_tokens:
@@ -115,33 +209,29 @@ class ImportanceFilterStrategy(IContextStrategy):
             
         original_count = len(context_data.messages)
         messages = context_data.messages
+        tokens = context_data.tokens
+        budget = self.config.target_tokens
         
-        # 计算消息重要性分数
-        scored_messages = []
-        for i, msg in enumerate(messages):
-            score = self._calculate_importance_score(msg, i, len(messages))
-            scored_messages.append((score, msg))
-        
-        # 按重要性排序
-        scored_messages.sort(key=lambda x: x[0], reverse=True)
+        # 计算消息重要性分数，堆中保存 (-分数, 原始下标)，分数相同时优先保留较早的消息
+        total = len(messages)
+        heap = [(-self._calculate_importance_score(msg, i, total), i) for i, msg in enumerate(messages)]
+        heapq.heapify(heap)
         
-        preserved_messages = []
+        # 按重要性依次选择，放不下的消息跳过，继续尝试后面较小的消息
+        selected = [False] * total
         preserved_tokens = 0
-        
-        for score, msg in scored_messages:
-            msg_tokens = self.estimator.estimate(msg)
-            if preserved_tokens + msg_tokens <= self.config.max_tokens:
-                preserved_messages.append(msg)
+        min_tokens = min(tokens, default=0)
+        while heap and budget - preserved_tokens >= min_tokens:
+            _, i = heapq.heappop(heap)
+            msg_tokens = tokens[i]
+            if preserved_tokens + msg_tokens <= budget:
+                selected[i] = True
                 preserved_tokens += msg_tokens
-            else:
-                break
         
-        # 按原始顺序重新排序
-        preserved_messages.sort(key=lambda x: messages.index(x))
-        
-        # 更新上下文数据
-        context_data.messages = preserved_messages
-        context_data.total_tokens = preserved_tokens
+        # 按原始顺序输出
+        preserved_messages = [msg for msg, keep in zip(messages, selected) if keep]
+        preserved_counts = [count for count, keep in zip(tokens, selected) if keep]
+        context_data.set_messages(preserved_messages, preserved_counts)
         
         self.log.info(f"Importance filter compression: {original_count} -> {len(preserved_messages)} messages, {preserved_tokens} tokens")
     
@@ -171,7 +261,10 @@ class ImportanceFilterStrategy(IContextStrategy):
         return score
 
 class SummaryCompressionStrategy(IContextStrategy):
-    """摘要压缩策略"""
+    """摘要压缩策略
+
+    有 summarizer 时使用后台预先生成的 LLM 摘要，尚未摘要的消息截取开头补充在后面。
+    """
     
     def compress(self, context_data: 'ContextData') -> None:
         if context_data.total_tokens <= self.config.max_tokens:
@@ -179,16 +272,22 @@ class SummaryCompressionStrategy(IContextStrategy):
             
         original_count = len(context_data.messages)
         preserved_messages: List[ChatMessage] = []
+        preserved_counts: List[int] = []
         preserved_tokens = 0
         
         # 保留系统消息
-        system_messages = [msg for msg in context_data.messages if msg.role == MessageRole.SYSTEM]
-        for msg in system_messages:
-            preserved_messages.append(msg)
-            preserved_tokens += self.estimator.estimate(msg)
+        recent_messages: List[ChatMessage] = []
+        recent_counts: List[int] = []
+        for msg, msg_tokens in zip(context_data.messages, context_data.tokens):
+            if msg.role == MessageRole.SYSTEM:
+                preserved_messages.append(msg)
+                preserved_counts.append(msg_tokens)
+                preserved_tokens += msg_tokens
+            else:
+                recent_messages.append(msg)
+                recent_counts.append(msg_tokens)
         
         # 保留最近的对话
-        recent_messages: List[ChatMessage] = [msg for msg in context_data.messages if msg.role != MessageRole.SYSTEM]
         max_recent = self.config.preserve_recent * 2
         
         # 分割消息
@@ -196,27 +295,47 @@ class SummaryCompressionStrategy(IContextStrategy):
             old_messages = recent_messages[:-max_recent]
             
             # 创建摘要消息
-            summary_content = self._create_summary(old_messages)
+            summary_content = self._get_summary(old_messages)
             summary_msg = UserMessage(content=f"对话历史摘要：{summary_content}")
             
-            preserved_messages.append(self.message_store.store(summary_msg))
-            preserved_tokens += self.estimator.estimate(summary_msg.content)
+            summary_msg = self.message_store.store(summary_msg)
+            if self.summarizer:
+                self.summarizer.register(summary_msg, summary_content)
+            summary_tokens = self.estimator.estimate(summary_msg)
+            preserved_messages.append(summary_msg)
+            preserved_counts.append(summary_tokens)
+            preserved_tokens += summary_tokens
         
         # 添加新消息
-        for msg in recent_messages[-max_recent:]:
-            msg_tokens = self.estimator.estimate(msg)
-            if preserved_tokens + msg_tokens <= self.config.max_tokens:
+        for msg, msg_tokens in zip(recent_messages[-max_recent:], recent_counts[-max_recent:]):
+            if preserved_tokens + msg_tokens <= self.config.target_tokens:
                 preserved_messages.append(msg)
+                preserved_counts.append(msg_tokens)
                 preserved_tokens += msg_tokens
             else:
                 break
         
         # 更新上下文数据
-        context_data.messages = preserved_messages
-        context_data.total_tokens = preserved_tokens
+        context_data.set_messages(preserved_messages, preserved_counts)
         
         self.log.info(f"Summary compression: {original_count} -> {len(preserved_messages)} messages, {preserved_tokens} tokens")
     
+    def _get_summary(self, messages: List[ChatMessage]) -> str:
+        """查找预先生成的摘要，没有时截取消息开头"""
+        if not self.summarizer:
+            return self._create_summary(messages)
+
+        summary, covered = self.summarizer.lookup(messages)
+        if summary is None:
+            self.log.info('No precomputed summary, fallback to truncation')
+            return self._create_summary(messages)
+
+        rest = messages[covered:]
+        if rest:
+            summary = f"{summary} | {self._create_summary(rest)}"
+        self.log.info(f"Using precomputed summary: {covered}/{len(messages)} messages")
+        return summary
+
     def _create_summary(self, messages: List[ChatMessage]) -> str:
         """创建消息摘要"""
         summary_parts = []
@@ -236,10 +355,10 @@ class HybridStrategy(IContextStrategy):
     """混合压缩策略"""
     
     def __init__(self, message_store: MessageStorage, config: ContextConfig, 
-                 estimator: ITokenEstimator):
-        super().__init__(message_store, config, estimator)
+                 estimator: ITokenEstimator, summarizer: Optional['RollingSummarizer'] = None):
+        super().__init__(message_store, config, estimator, summarizer)
         self.sliding_window = SlidingWindowStrategy(message_store, config, estimator)
-        self.summary_compression = SummaryCompressionStrategy(message_store, config, estimator)
+        self.summary_compression = SummaryCompressionStrategy(message_store, config, estimator, summarizer)
     
     def compress(self, context_data: 'ContextData') -> None:
         if context_data.total_tokens <= self.config.max_tokens:
@@ -252,6 +371,97 @@ class HybridStrategy(IContextStrategy):
         if context_data.total_tokens > self.config.max_tokens:
             self.summary_compression.compress(context_data)
 
+class RetrievalStrategy(IContextStrategy):
+    """相关性检索压缩策略
+
+    保留系统消息和最近的对话，再从历史消息中选出与最近对话最相关的 top-k 条。
+    消息加入上下文时即写入向量索引（包括其中的代码块），被移出上下文的消息在之后的对话相关时可以重新加入。
+
+    索引只保存消息 ID 和 token 数，消息内容按需从 MessageStorage 读取；
+    任务恢复后按 MessageStorage 中的顺序重建索引，恢复前已移出上下文的消息同样可以检索。
+    检索只在压缩时进行，两次压缩之间只追加消息，消息前缀保持不变以命中提示词缓存。
+    """
+
+    def __init__(self, message_store: MessageStorage, config: ContextConfig, 
+                 estimator: ITokenEstimator, summarizer: Optional['RollingSummarizer'] = None):
+        super().__init__(message_store, config, estimator, summarizer)
+        self.index = VectorIndex(create_embedder(config.embedding_model))
+        # 消息 ID -> token 数，按在 MessageStorage 中的顺序
+        self.history: Dict[str, int] = {}
+        # 已扫描的 MessageStorage 消息数
+        self._synced = 0
+
+    def _sync(self) -> None:
+        """索引 MessageStorage 中新增的消息"""
+        store = self.message_store
+        if len(store) == self._synced:
+            return
+        for msg_id in itertools.islice(store.messages, self._synced, None):
+            if msg_id in self.history or store.get_role(msg_id) in (MessageRole.SYSTEM, MessageRole.ERROR):
+                continue
+            msg = ChatMessage.from_storage(msg_id, store)
+            self.history[msg_id] = self.estimator.estimate(msg)
+            self.index.add(msg_id, '\n'.join(_iter_text(msg.content)))
+        self._synced = len(store)
+
+    def on_message(self, message: ChatMessage, tokens: int) -> None:
+        self._sync()
+        if message.id in self.history:
+            self.history[message.id] = tokens
+
+    def compress(self, context_data: 'ContextData') -> None:
+        if context_data.total_tokens <= self.config.max_tokens:
+            return
+
+        original_count = len(context_data.messages)
+        self._sync()
+        budget = self.config.target_tokens
+
+        # 保留系统消息
+        system_messages = []
+        recent_messages = []
+        for msg, msg_tokens in zip(context_data.messages, context_data.tokens):
+            if msg.role == MessageRole.SYSTEM:
+                system_messages.append((msg, msg_tokens))
+                budget -= msg_tokens
+            else:
+                recent_messages.append((msg, msg_tokens))
+
+        # 从最新的消息开始保留最近的对话
+        recent = []
+        for msg, msg_tokens in reversed(recent_messages[-self.config.preserve_recent * 2:]):
+            if msg_tokens > budget:
+                break
+            recent.append((msg, msg_tokens))
+            budget -= msg_tokens
+        recent.reverse()
+
+        # 用最近的对话检索相关的历史消息，按相似度在剩余预算内选择
+        selected = set()
+        if recent:
+            recent_ids = {msg.id for msg, _ in recent}
+            query = self.index.embed('\n'.join(text for msg, _ in recent for text in _iter_text(msg.content)))
+            candidates = [msg_id for msg_id in self.history if msg_id not in recent_ids]
+            for _, msg_id in self.index.search(query, candidates, self.config.retrieval_top_k):
+                msg_tokens = self.history[msg_id]
+                if msg_tokens <= budget:
+                    selected.add(msg_id)
+                    budget -= msg_tokens
+
+        # 历史消息按原始顺序放在最近的对话之前，仍在上下文中的消息沿用原对象
+        current = {msg.id: msg for msg, _ in recent_messages}
+        retrieved = [
+            (current.get(msg_id) or ChatMessage.from_storage(msg_id, self.message_store), msg_tokens)
+            for msg_id, msg_tokens in self.history.items() if msg_id in selected
+        ]
+        preserved = system_messages + retrieved + recent
+        context_data.set_messages([msg for msg, _ in preserved], [count for _, count in preserved])
+
+        self.log.info(
+            f"Retrieval compression: {original_count} -> {len(preserved)} messages, "
+            f"{len(retrieved)} retrieved from {len(self.history)}, {context_data.total_tokens} tokens"
+        )
+
 class ContextStrategyFactory:
     """上下文策略工厂类"""
     
@@ -260,17 +470,19 @@ class ContextStrategyFactory:
         ContextStrategy.IMPORTANCE_FILTER: ImportanceFilterStrategy,
         ContextStrategy.SUMMARY_COMPRESSION: SummaryCompressionStrategy,
         ContextStrategy.HYBRID: HybridStrategy,
+        ContextStrategy.RETRIEVAL: RetrievalStrategy,
     }
     
     @classmethod
     def create(cls, strategy_type: ContextStrategy, message_store: MessageStorage,
-               config: ContextConfig, estimator: ITokenEstimator) -> IContextStrategy:
+               config: ContextConfig, estimator: ITokenEstimator,
+               summarizer: Optional['RollingSummarizer'] = None) -> IContextStrategy:
         """创建指定类型的压缩策略"""
         if strategy_type not in cls._strategies:
             raise ValueError(f"Unsupported strategy type: {strategy_type}")
         
         strategy_class = cls._strategies[strategy_type]
-        return strategy_class(message_store, config, estimator)
+        return strategy_class(message_store, config, estimator, summarizer)
     
     @classmethod
     def register_strategy(cls, strategy_type: ContextStrategy, strategy_class: type):
@@ -283,50 +495,86 @@ class MessageCompressor:
     """消息压缩器 - 重构为使用策略模式"""
     
     def __init__(self, message_store: MessageStorage, config: ContextConfig, 
-                 estimator: ITokenEstimator = None):
+                 estimator: ITokenEstimator = None, summarizer: Optional['RollingSummarizer'] = None):
         self.config = config
         self.message_store = message_store
-        self.estimator = estimator or DefaultTokenEstimator()
-        self.strategy = ContextStrategyFactory.create(config.strategy, message_store, config, self.estimator)
+        self.estimator = estimator or MemoizedTokenEstimator(DefaultTokenEstimator())
+        self.summarizer = summarizer
+        self.strategy = ContextStrategyFactory.create(config.strategy, message_store, config, self.estimator, summarizer)
         self.log = logger.bind(src='message_compressor')
     
     def compress_context(self, context_data: 'ContextData') -> None:
         """压缩上下文数据"""
         self.strategy.compress(context_data)
+
+    def on_message(self, message: ChatMessage, tokens: int) -> None:
+        """通知压缩策略有新消息加入上下文"""
+        self.strategy.on_message(message, tokens)
     
     def update_strategy(self, new_strategy: ContextStrategy):
         """更新压缩策略"""
-        self.strategy = ContextStrategyFactory.create(new_strategy, self.message_store, self.config, self.estimator)
+        self.strategy = ContextStrategyFactory.create(new_strategy, self.message_store, self.config, self.estimator, self.summarizer)
         self.log.info(f"Strategy updated to: {new_strategy.value}")
     
     def update_config(self, new_config: ContextConfig):
         """更新配置并重新创建策略"""
         self.config = new_config
-        self.strategy = ContextStrategyFactory.create(new_config.strategy, self.message_store, new_config, self.estimator)
+        self.strategy = ContextStrategyFactory.create(new_config.strategy, self.message_store, new_config, self.estimator, self.summarizer)
         self.log.info(f"Config updated: {new_config.strategy.value}")
     
     def estimate_message_tokens(self, message: ChatMessage) -> int:
         """估算消息的token数量"""
         total_tokens = 0
         if message.role == MessageRole.ASSISTANT:
-            total_tokens = message.usage.get('total_tokens', 0)
+            # total_tokens 包含整个请求，回复本身只计输出部分
+            total_tokens = message.usage.get('output_tokens', 0)
 
         if total_tokens == 0:
             total_tokens = self.estimator.estimate(message)
         return total_tokens
 
 class ContextData(BaseModel):
+    """上下文消息及 token 账本
+
+    tokens 与 messages 一一对应，保存每条消息的 token 数，total_tokens 是其总和。
+    旧版本保存的数据没有 tokens，由 ContextManager 在首次使用时重建。
+    """
     messages: List[ChatMessage] = Field(default_factory=list)
     total_tokens: int = 0
+    tokens: List[int] = Field(default_factory=list)
     
     def __len__(self):
         return len(self.messages)
+
+    @property
+    def ledger_valid(self) -> bool:
+        return len(self.tokens) == len(self.messages)
+
+    def append(self, message: ChatMessage, tokens: int) -> None:
+        self.messages.append(message)
+        self.tokens.append(tokens)
+        self.total_tokens += tokens
+
+    def pop(self, index: int = -1) -> ChatMessage:
+        message = self.messages.pop(index)
+        self.total_tokens -= self.tokens.pop(index)
+        return message
+
+    def set_messages(self, messages: List[ChatMessage], tokens: List[int]) -> None:
+        """替换全部消息，tokens 为对应的 token 数"""
+        if len(messages) != len(tokens):
+            raise ValueError('messages and tokens must have the same length')
+        self.messages = messages
+        self.tokens = tokens
+        self.total_tokens = sum(tokens)
     
 class ContextManager:
     """上下文管理器"""
     
     def __init__(self, message_store: MessageStorage, data: ContextData, 
-                 config: Union[dict, ContextConfig, None] = None):
+                 config: Union[dict, ContextConfig, None] = None,
+                 estimator: Optional[ITokenEstimator] = None,
+                 summarizer: Optional['RollingSummarizer'] = None):
         if isinstance(config, dict):
             self.config = ContextConfig(**config)
         elif isinstance(config, ContextConfig):
@@ -335,12 +583,23 @@ class ContextManager:
             self.config = ContextConfig()
         
         self.message_store = message_store
-        self.compressor = MessageCompressor(message_store, self.config)
+        self.summarizer = summarizer
+        self.compressor = MessageCompressor(message_store, self.config, estimator, summarizer)
         self.log = logger.bind(src='context_manager')
         
         self.data = data
         self._last_compression_time = 0
+        self._compressions = 0
+        self._compressed_tokens = 0
         
+    def _ensure_ledger(self):
+        """旧数据或自定义策略直接修改 messages 后重建 token 账本"""
+        data = self.data
+        if data.ledger_valid:
+            return
+        data.set_messages(data.messages, [self.compressor.estimate_message_tokens(msg) for msg in data.messages])
+        self.log.info(f"Token ledger rebuilt: {len(data.messages)} messages, {data.total_tokens} tokens")
+
     @property
     def total_tokens(self):
         return self.data.total_tokens
@@ -349,12 +608,41 @@ class ContextManager:
     def messages(self):
         return self.data.messages
     
-    def add_message(self, message: ChatMessage):
-        """添加消息到上下文"""
-        # 添加到缓存
-        self.data.messages.append(message)
-        self.data.total_tokens = self.compressor.estimate_message_tokens(message)
-        self.log.info(f"Added message: {message.role}, tokens: {self.data.total_tokens}, id: {message.id}")
+    def add_message(self, message: ChatMessage, tokens: Optional[int] = None) -> int:
+        """
+        添加消息到上下文
+
+        Args:
+            message: 消息
+            tokens: 已知的 token 数，为空时估算
+
+        Returns:
+            消息的 token 数
+        """
+        self._ensure_ledger()
+        if tokens is None:
+            tokens = self.compressor.estimate_message_tokens(message)
+        self.data.append(message, tokens)
+        self.compressor.on_message(message, tokens)
+        self.log.info(f"Added message: {message.role}, tokens: {tokens}/{self.data.total_tokens}, id: {message.id}")
+        self._schedule_summary()
+        return tokens
+
+    def _schedule_summary(self):
+        """移出 preserve_recent 窗口的消息交给后台生成摘要"""
+        if not self.summarizer:
+            return
+        messages = [msg for msg in self.data.messages if msg.role != MessageRole.SYSTEM]
+        old_messages = messages[:-self.config.preserve_recent * 2]
+        if old_messages:
+            self.summarizer.submit(old_messages)
+
+    def remove_message(self, index: int = -1) -> ChatMessage:
+        """从上下文中移除消息"""
+        self._ensure_ledger()
+        message = self.data.pop(index)
+        self.log.info(f"Removed message: {message.id}, tokens: {self.data.total_tokens}")
+        return message
     
     def get_messages(self, force_compress: bool = False) -> List[ChatMessage]:
         """获取压缩后的消息列表"""
@@ -362,6 +650,7 @@ class ContextManager:
         
         # 检查是否需要压缩
         if force_compress or self.config.auto_compress:
+            self._ensure_ledger()
             should_compress = (
                 force_compress or
                 self.total_tokens > self.config.max_tokens or
@@ -379,13 +668,18 @@ class ContextManager:
         if not self.data.messages:
             return
         
+        self._ensure_ledger()
         original_count = len(self.data.messages)
         original_tokens = self.total_tokens
         
         # 执行压缩
         self.compressor.compress_context(self.data)
+        self._ensure_ledger()
         
         self._last_compression_time = time.time()
+        if self.data.total_tokens < original_tokens:
+            self._compressions += 1
+            self._compressed_tokens += original_tokens - self.data.total_tokens
         
         self.log.info(
             f"Context compressed: {original_count}->{len(self.data.messages)} messages, "
@@ -394,34 +688,38 @@ class ContextManager:
     
     def get_stats(self) -> Dict[str, Any]:
         """获取上下文统计信息"""
+        self._ensure_ledger()
+        total_tokens = self.data.total_tokens
+        original_tokens = total_tokens + self._compressed_tokens
         return {
             'message_count': len(self.data.messages),
-            'total_tokens': self.data.total_tokens,
+            'total_tokens': total_tokens,
+            'max_tokens': self.config.max_tokens,
+            'usage_ratio': total_tokens / self.config.max_tokens if self.config.max_tokens else 0.0,
+            'compression_ratio': total_tokens / original_tokens if original_tokens else 1.0,
+            'compressions': self._compressions,
+            'compressed_tokens': self._compressed_tokens,
             'last_compression': self._last_compression_time
         }
     
     def clear(self):
         """清理消息缓存，只保留最初的两条消息和最后一条消息"""
+        self._ensure_ledger()
         messages = self.data.messages
         if not messages or len(messages) <= 2:
             return
             
-        if messages[0].role == MessageRole.SYSTEM:
-            if len(messages) > 3:
-                messages[2] = messages[-1]
-                del messages[3:]
-        else:
-            messages[1] = messages[-1]
-            del messages[2:]
+        keep = 2 if messages[0].role == MessageRole.SYSTEM else 1
+        if len(messages) > keep + 1:
+            tokens = self.data.tokens
+            self.data.set_messages(messages[:keep] + messages[-1:], tokens[:keep] + tokens[-1:])
         
         self._last_compression_time = 0
-        self.data.total_tokens = sum(self.compressor.estimate_message_tokens(msg) for msg in messages)
         self.log.info(f"Context cleaned: {len(self.data.messages)} messages, {self.data.total_tokens} tokens")
 
     def rebuild(self, messages: List[ChatMessage]):
         """重建消息缓存"""
-        self.data.messages.clear()
-        self.data.total_tokens = 0
+        self.data.set_messages([], [])
         
         for message in messages:
             self.add_message(message)
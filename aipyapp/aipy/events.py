@@ -205,6 +205,7 @@ class StreamEvent(BaseEvent):
     llm: Optional[str] = Field(None, title="LLM", description="Name of the streaming LLM")
     lines: Optional[List[str]] = Field(None, title="Lines", description="Streaming content lines")
     reason: Optional[bool] = Field(None, title="Reason", description="Whether this chunk contains reasoning")
+    partial: Optional[str] = Field(None, title="Partial", description="Unfinished last line (chunk streaming mode)")
 
 # ==================== Message Parsing Events ====================
 
@@ -213,6 +214,16 @@ class ParseReplyCompletedEvent(BaseEvent):
     name: Literal["parse_reply_completed"] = "parse_reply_completed"
     response: Response = Field(..., title="Response", description="Parsed response object")
 
+class BlockReadyEvent(BaseEvent):
+    """Event fired when a code block is complete in the streaming response"""
+    name: Literal["block_ready"] = "block_ready"
+    block: CodeBlock = Field(..., title="Block", description="Completed code block")
+
+class ToolCallReadyEvent(BaseEvent):
+    """Event fired when a tool call is complete in the streaming response"""
+    name: Literal["toolcall_ready"] = "toolcall_ready"
+    tool_call: ToolCall = Field(..., title="Tool Call", description="Completed tool call")
+
 # ==================== Code Execution Events ====================
 
 class ExecStartedEvent(BaseEvent):
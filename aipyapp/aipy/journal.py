@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""任务日志：快照 task.json + 追加写入的增量日志 task.jsonl"""
+
+from __future__ import annotations
+import os
+import json
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Union, Any, TYPE_CHECKING
+
+from loguru import logger
+from pydantic import BaseModel, Field, field_serializer
+
+from ..llm import AIMessage, UserMessage, SystemMessage, ErrorMessage
+from .blocks import CodeBlock, CodeBlocks
+from .chat import MessageStorage, serialize_messages
+from .context import ContextData
+from .step import StepData
+from .blobs import BlobStore
+from .utils import atomic_write
+
+if TYPE_CHECKING:
+    from .task import Task, TaskData
+
+JOURNAL_SUFFIX = '.jsonl'
+
+class JournalRecord(BaseModel):
+    """一次保存追加的增量
+
+    step_offset/block_offset 记录增量在完整列表中的起始位置，
+    重放时按偏移覆盖，因此重复重放同一条记录的结果不变。
+    """
+    step_offset: int = 0
+    steps: List[StepData] = Field(default_factory=list)
+    block_offset: int = 0
+    blocks: List[CodeBlock] = Field(default_factory=list)
+    messages: Dict[str, Union[AIMessage, UserMessage, SystemMessage, ErrorMessage]] = Field(default_factory=dict)
+    context: ContextData | None = None
+
+    @field_serializer('messages', mode='wrap')
+    def _serialize_messages(self, messages: Dict[str, Any], handler):
+        return serialize_messages(messages, handler)
+
+def _copy_deps(deps: Dict[str, set] | None) -> Dict[str, set]:
+    return {name: set(values) for name, values in (deps or {}).items()}
+
+def _copy_step(data: StepData | dict) -> StepData | dict:
+    # 未加载的步骤是原始字典，不会被修改
+    if isinstance(data, StepData):
+        return data.model_copy(update={'rounds': list(data.rounds), 'events': list(data.events)})
+    return data
+
+def _copy_block(block: CodeBlock) -> CodeBlock:
+    return block.model_copy(update={'deps': _copy_deps(block.deps)})
+
+def _copy_context(context: ContextData) -> ContextData:
+    return context.model_copy(update={'messages': list(context.messages), 'tokens': list(context.tokens)})
+
+class TaskJournal:
+    """任务状态日志
+
+    首次保存写入完整快照，之后每次保存只向日志追加一行新增的步骤、代码块和消息。
+    最后一个步骤保存后仍会追加事件，每次都重新记录；已保存的代码块执行时会修改 deps，
+    从第一个修改过的代码块开始重新记录。
+    日志记录数达到 COMPACT_RECORDS 或已保存的内容被删除时，重写快照并清空日志。
+    """
+    COMPACT_RECORDS = 32
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(JOURNAL_SUFFIX)
+        self.log = logger.bind(src='TaskJournal')
+        self.reset()
+
+    def reset(self):
+        """丢弃已保存状态，下次保存时重写快照"""
+        self._synced = False
+        self._steps = 0
+        self._last_step = None
+        self._blocks = 0
+        # 已保存代码块的 deps 副本，用于发现原地修改
+        self._block_deps = []
+        self._messages = 0
+        self._records = 0
+
+    def save(self, task: Task) -> None:
+        """同步保存任务状态，优先追加增量"""
+        self.write([self.collect(task)])
+
+    def collect(self, task: Task) -> TaskData | JournalRecord:
+        """
+        在调用线程上收集待保存的数据
+
+        复制任务线程还会修改的列表和字典（步骤的 rounds/events、代码块的 deps），不做序列化，
+        返回值可交给其它线程调用 write()。
+        返回 TaskData 表示需要重写快照，JournalRecord 表示追加增量。
+        """
+        if self._needs_snapshot(task):
+            item = self._collect_snapshot(task)
+            self._records = 0
+            self._synced = True
+        else:
+            messages = task.message_storage.messages
+            step_offset = max(self._steps - 1, 0)
+            block_offset = self._first_changed_block(task.blocks.history)
+            item = JournalRecord.model_construct(
+                step_offset=step_offset,
+                steps=[_copy_step(step.data) for step in task.steps[step_offset:]],
+                block_offset=block_offset,
+                blocks=[_copy_block(block) for block in task.blocks.history[block_offset:]],
+                messages=dict(islice(messages.items(), self._messages, None)),
+                context=_copy_context(task.context),
+            )
+            self._records += 1
+        self._mark(task)
+        return item
+
+    def _collect_snapshot(self, task: Task) -> TaskData:
+        from .task import TaskData
+
+        return TaskData.model_construct(
+            id=task.task_id,
+            steps=[_copy_step(step.raw_data) for step in task.steps],
+            blocks=CodeBlocks.model_construct(history=[_copy_block(block) for block in task.blocks.history]),
+            context=_copy_context(task.context),
+            message_storage=MessageStorage.model_construct(messages=dict(task.message_storage.messages)),
+        )
+
+    def _needs_snapshot(self, task: Task) -> bool:
+        if not self._synced or self._records >= self.COMPACT_RECORDS:
+            return True
+
+        # 已保存的内容被删除或替换时无法追加
+        steps = task.steps
+        if len(steps) < self._steps:
+            return True
+        if self._steps and steps[self._steps - 1].data is not self._last_step:
+            return True
+        if len(task.blocks.history) < self._blocks:
+            return True
+        if len(task.message_storage) < self._messages:
+            return True
+        return False
+
+    def _first_changed_block(self, history: List[CodeBlock]) -> int:
+        for i, deps in enumerate(self._block_deps):
+            if (history[i].deps or {}) != deps:
+                return i
+        return self._blocks
+
+    def _mark(self, task: Task) -> None:
+        steps = task.steps
+        self._steps = len(steps)
+        self._last_step = steps[-1].data if steps else None
+        self._blocks = len(task.blocks.history)
+        self._block_deps = [_copy_deps(block.deps) for block in task.blocks.history]
+        self._messages = len(task.message_storage)
+
+    def write(self, items: List[TaskData | JournalRecord]) -> None:
+        """
+        写入 collect() 收集的数据
+
+        多次收集的数据合并为一次写入：只写最后一个快照，其后的增量一次性追加。
+        """
+        if not items:
+            return
+
+        snapshot = None
+        records = items
+        for i in range(len(items) - 1, -1, -1):
+            if not isinstance(items[i], JournalRecord):
+                snapshot, records = items[i], items[i + 1:]
+                break
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if snapshot is not None:
+            atomic_write(self.path, snapshot.model_dump_json(indent=2, exclude_none=True))
+            # 先写快照再删日志：中途失败时日志可重复重放
+            self.journal_path.unlink(missing_ok=True)
+            self.log.info('Wrote task snapshot', path=str(self.path))
+
+        if records:
+            lines = [record.model_dump_json(exclude_none=True) for record in records]
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            self.log.info('Appended task journal', path=str(self.journal_path), records=len(lines))
+
+    @staticmethod
+    def replay(data: dict, journal_path: Union[str, Path]) -> dict:
+        """
+        将日志重放到快照数据上
+
+        Args:
+            data: 快照 JSON 数据
+            journal_path: 日志文件路径，不存在时原样返回
+
+        Returns:
+            合并后的任务数据
+        """
+        journal_path = Path(journal_path)
+        if not journal_path.exists():
+            return data
+
+        steps = data.setdefault('steps', [])
+        history = data.setdefault('blocks', {}).setdefault('history', [])
+        messages = data.setdefault('message_storage', {}).setdefault('messages', {})
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 最后一行可能因中断而不完整
+                    logger.warning('Skip broken journal record', path=str(journal_path), line=lineno)
+                    break
+                steps[record.get('step_offset', 0):] = record.get('steps', [])
+                history[record.get('block_offset', 0):] = record.get('blocks', [])
+                messages.update(record.get('messages', {}))
+                if 'context' in record:
+                    data['context'] = record['context']
+        return data
+
+class TaskSaver:
+    """后台保存线程
+
+    调用线程只收集数据，序列化、写文件和渲染 console.html 都在后台线程完成。
+    写入期间到达的多次保存请求会合并为一次写入。journal 的保存状态由 _cond 保护。
+    """
+
+    def __init__(self, journal: TaskJournal, display: Any = None,
+                 html_path: Union[str, Path, None] = None, code_format: str | None = None,
+                 blob_store: BlobStore | None = None):
+        self.journal = journal
+        self.blob_store = blob_store
+        self.display = display
+        self.html_path = Path(html_path) if html_path else None
+        self.code_format = code_format
+        self.log = logger.bind(src='TaskSaver')
+        self._cond = threading.Condition()
+        self._pending = []
+        self._html = False
+        self._busy = False
+        self._stop = False
+        self._errors = []
+        self._thread = None
+
+    def request(self, task: Task) -> None:
+        """请求保存，立即返回"""
+        with self._cond:
+            self._pending.append(self.journal.collect(task))
+            self._html = bool(self.display and self.html_path)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = False
+                self._thread = threading.Thread(
+                    target=self._run, name=f'TaskSaver-{task.task_id}', daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._html:
+                    if self._stop:
+                        return
+                    self._cond.wait()
+                items, self._pending = self._pending, []
+                html, self._html = self._html, False
+                self._busy = True
+
+            try:
+                self._write(items, html)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, items: list, html: bool):
+        try:
+            # 先写 blob，保证任务文件中的引用都能读到
+            if self.blob_store:
+                self.blob_store.flush()
+            self.journal.write(items)
+        except Exception as e:
+            self.log.exception('Failed to save task state', path=str(self.journal.path))
+            # 写入失败后下一次保存重写完整快照
+            with self._cond:
+                self.journal.reset()
+            self._errors.append(e)
+
+        if not html:
+            return
+        try:
+            tmp_path = self.html_path.with_name(f'.{self.html_path.name}.tmp')
+            self.display.save(str(tmp_path), clear=False, code_format=self.code_format)
+            if tmp_path.exists():
+                os.replace(tmp_path, self.html_path)
+        except Exception as e:
+            self.log.exception('Failed to save console html', path=str(self.html_path))
+            self._errors.append(e)
+
+    def flush(self, stop: bool = False) -> List[Exception]:
+        """
+        等待所有保存请求写入完成
+
+        Args:
+            stop: 完成后停止后台线程，之后的 request() 会重新启动线程
+
+        Returns:
+            后台写入过程中发生的异常
+        """
+        with self._cond:
+            while self._pending or self._html or self._busy:
+                self._cond.wait()
+            if stop:
+                self._stop = True
+                self._cond.notify_all()
+            thread = self._thread
+            errors, self._errors = self._errors, []
+
+        if stop and thread is not None:
+            thread.join()
+        return errors
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""LLM 响应缓存
+
+相同的请求（客户端类型、模型、参数和消息列表都相同）直接返回缓存的响应，不消耗 token。
+用于回放保存的任务和回归测试，需要在配置中开启：
+
+    [llm_cache]
+    enable = true
+"""
+
+import json
+import hashlib
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from ..llm import AIMessage
+from .cache import KVCache
+from .config import CONFIG_DIR
+
+CACHE_FILE = 'llm_cache.db'
+# 默认保存 7 天
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def _default(obj):
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    return str(obj)
+
+class ResponseCache:
+    """按请求内容精确匹配的 LLM 响应缓存"""
+
+    def __init__(self, cache: KVCache, ttl: Optional[int] = None):
+        self.cache = cache
+        self.ttl = ttl
+        self.log = logger.bind(src='ResponseCache')
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    @classmethod
+    def create(cls, config: Optional[Dict[str, Any]]) -> Optional['ResponseCache']:
+        """根据 [llm_cache] 配置创建，未开启时返回 None"""
+        config = config or {}
+        if not config.get('enable', False):
+            return None
+        path = Path(config.get('path') or CACHE_FILE)
+        if not path.is_absolute():
+            path = CONFIG_DIR / path
+        ttl = config.get('ttl', DEFAULT_TTL)
+        cache = KVCache(str(path), default_ttl=ttl, pooled=True,
+                        max_bytes=config.get('max_bytes', DEFAULT_MAX_BYTES))
+        return cls(cache, ttl)
+
+    def make_key(self, client, messages: List[Dict[str, Any]]) -> str:
+        """缓存键：客户端类型、模型、请求参数和消息列表的哈希"""
+        request = {
+            'kind': client.kind,
+            'model': client.model,
+            'params': client._params,
+            'temperature': client._temperature,
+            'max_tokens': client.max_tokens,
+        }
+        digest = hashlib.sha256()
+        digest.update(json.dumps(request, sort_keys=True, default=_default).encode('utf-8'))
+        digest.update(json.dumps(messages, sort_keys=True, ensure_ascii=False, default=_default).encode('utf-8'))
+        return f'llm:{digest.hexdigest()}'
+
+    def get(self, client, messages: List[Dict[str, Any]], stream_processor=None) -> Optional[AIMessage]:
+        """
+        查找缓存的响应
+
+        命中时通过 stream_processor 按行回放内容，显示与实际请求相同。
+        """
+        entry = self.cache.get(self.make_key(client, messages))
+        with self._lock:
+            self.stats['hits' if entry else 'misses'] += 1
+        if not entry:
+            return None
+
+        self.log.info('LLM response cache hit', client=client.name)
+        content = entry['content']
+        reason = entry.get('reason')
+        if stream_processor:
+            with stream_processor as lm:
+                if reason:
+                    lm.process_chunk(reason, reason=True)
+                for line in content.splitlines(keepends=True):
+                    lm.process_chunk(line)
+        # 命中缓存不消耗 token
+        usage = Counter({'input_tokens': 0, 'output_tokens': 0, 'total_tokens': 0, 'time': 0, 'cached_responses': 1})
+        return AIMessage(content=content, reason=reason, usage=usage)
+
+    def put(self, client, messages: List[Dict[str, Any]], msg: AIMessage) -> None:
+        if not msg.content:
+            return
+        entry = {'content': msg.content, 'reason': msg.reason}
+        try:
+            self.cache.set(self.make_key(client, messages), entry, self.ttl)
+        except Exception as e:
+            self.log.warning('Failed to save LLM response', error=str(e))
+
+    def clear(self) -> None:
+        self.cache.clear()
@@ -60,6 +60,8 @@ class MCPToolManager:
         self.sys_mcp = self.config_reader.get_sys_mcp()
         self.mcp_servers = self.sys_mcp | self.user_mcp
         self._tools_dict = {}  # 缓存已获取的工具列表
+        self._tools_version = 0  # 工具列表每次加载后递增
+        self._tools_prompt = None  # (指纹, 工具提示)
         self._inited = False
 
         # 全局启用/禁用用户MCP标志，默认禁用
@@ -94,6 +96,9 @@ class MCPToolManager:
             server_status[server_name] = is_enabled
         return server_status
 
+    def _cache_key(self, server_name, server_config):
+        return f"mcp_tool:{server_name}:{cache.cache_key(server_config)}"
+
     def list_tools(self, mcp_type="user", force_load=False):
         """返回所有MCP服务器的工具列表
         [{'description': 'Get weather alerts for a US state.\n'
@@ -132,21 +137,26 @@ class MCPToolManager:
         servers_to_load = []
         servers_from_cache = []
 
-        for server_name, server_config in mcp_servers.items():
-            if server_name in self._tools_dict:
-                # 已经在内存中，直接使用
-                continue
-
-            key = f"mcp_tool:{server_name}:{cache.cache_key(server_config)}"
-            cached_tools = cache.get_cache(key)
+        # 已经在内存中的服务器直接使用，其余一次性批量查询缓存
+        cache_keys = {
+            server_name: self._cache_key(server_name, server_config)
+            for server_name, server_config in mcp_servers.items()
+            if server_name not in self._tools_dict
+        }
+        cached = cache.get_cache_many(cache_keys.values())
 
+        for server_name, key in cache_keys.items():
+            cached_tools = cached.get(key)
             if cached_tools is not None:
                 # 从缓存中恢复
                 self._tools_dict[server_name] = cached_tools
                 servers_from_cache.append(server_name)
             else:
                 # 需要重新加载
-                servers_to_load.append((server_name, server_config))
+                servers_to_load.append((server_name, mcp_servers[server_name]))
+
+        if servers_from_cache or servers_to_load:
+            self._tools_version += 1
 
         if servers_from_cache:
             print(f"+ Loading MCP server {', '.join(servers_from_cache)} from cache...")
@@ -160,7 +170,8 @@ class MCPToolManager:
                     discover_all=True
                 )
 
-                # 按服务器名称分组工具
+                # 按服务器名称分组工具，统一在一个事务中写入缓存
+                to_cache = {}
                 for server_name, server_config in servers_to_load:
                     try:
                         #print(f"  Processing tools for {server_name}")
@@ -179,9 +190,8 @@ class MCPToolManager:
                                 server_tools.append(clean_tool)
 
                         # 保存到缓存和内存
-                        key = f"mcp_tool:{server_name}:{cache.cache_key(server_config)}"
                         if server_tools:
-                            cache.set_cache(key, server_tools, ttl=60 * 60 * 24 * 2)
+                            to_cache[self._cache_key(server_name, server_config)] = server_tools
 
                         self._tools_dict[server_name] = server_tools
 
@@ -189,6 +199,8 @@ class MCPToolManager:
                         print(f"Error processing tools for server {server_name}: {e}")
                         self._tools_dict[server_name] = []
 
+                cache.set_cache_many(to_cache, ttl=60 * 60 * 24 * 2)
+
             except Exception as e:
                 print(f"Error loading MCP tools: {e}")
                 # 如果全局加载失败，为所有待加载的服务器设置空列表
@@ -203,8 +215,22 @@ class MCPToolManager:
         self._inited = True
         return all_tools
 
+    def get_tools_fingerprint(self):
+        """已启用工具的指纹，工具列表重新加载或启用状态变化时改变"""
+        tools = self.get_available_tools()
+        text = json.dumps([self._tools_version, [tool.get("id", "") for tool in tools]])
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
     def get_tools_prompt(self):
-        """获取工具列表并转换为 Markdown 格式"""
+        """获取工具列表并转换为 Markdown 格式，按工具指纹缓存"""
+        fingerprint = self.get_tools_fingerprint()
+        if self._tools_prompt and self._tools_prompt[0] == fingerprint:
+            return self._tools_prompt[1]
+        prompt = self._render_tools_prompt()
+        self._tools_prompt = (fingerprint, prompt)
+        return prompt
+
+    def _render_tools_prompt(self):
         tools = self.get_available_tools()  # 获取启用的工具
         if not tools:
             return ""
@@ -9,14 +9,27 @@ import json
 import shutil
 import subprocess
 import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import Any, Callable, Dict, Hashable, List, Optional
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from .. import __respath__
 from .toolcalls import ToolCallResult
 
+# 系统提示词缓存的最大条目数
+SYSTEM_PROMPT_CACHE_SIZE = 32
+
+@dataclass
+class SystemPrompt:
+    """渲染后的系统提示词"""
+    content: str
+    # tokenizer 名称 -> token 数，None 表示默认估算器
+    tokens: Dict[Optional[str], int] = field(default_factory=dict)
+
 def check_commands(commands):
     """
     检查多个命令是否存在，并获取其版本号。
@@ -63,6 +76,8 @@ class Prompts:
             #autoescape=select_autoescape(['j2'])
         )
         self._init_env()  # 调用 _init_env 方法注册全局变量
+        self._system_prompts: OrderedDict[tuple, SystemPrompt] = OrderedDict()
+        self._lock = threading.Lock()
 
     def _init_env(self):
         # 可以在这里注册全局变量或 filter
@@ -103,6 +118,32 @@ class Prompts:
         all_vars = {**extra_vars, **kwargs}
         return self.get_prompt('default', **all_vars)
 
+    def get_templates_mtime(self) -> float:
+        """模板目录中最近的修改时间"""
+        with os.scandir(self.template_dir) as entries:
+            return max((entry.stat().st_mtime for entry in entries if entry.name.endswith('.j2')), default=0)
+
+    def get_system_prompt(self, key: Hashable, get_params: Callable[[], Dict[str, Any]]) -> SystemPrompt:
+        """
+        获取系统提示词，按 key 和模板修改时间缓存
+        :param key: 决定渲染结果的参数指纹（角色、插件、MCP 工具等）
+        :param get_params: 返回 default 模板变量的函数，只在未命中缓存时调用
+        :return: 渲染结果，同一个 key 的多个任务共用
+        """
+        key = (key, self.get_templates_mtime())
+        with self._lock:
+            prompt = self._system_prompts.get(key)
+            if prompt:
+                self._system_prompts.move_to_end(key)
+                return prompt
+
+        prompt = SystemPrompt(self.get_default_prompt(**get_params()))
+        with self._lock:
+            prompt = self._system_prompts.setdefault(key, prompt)
+            while len(self._system_prompts) > SYSTEM_PROMPT_CACHE_SIZE:
+                self._system_prompts.popitem(last=False)
+        return prompt
+
     def get_task_prompt(self, instruction: str, gui: bool = False) -> str:
         """
         获取任务提示
@@ -5,7 +5,7 @@
 
 import re
 import json
-from typing import List, Dict, Any, Tuple, Literal
+from typing import List, Dict, Any, Tuple, Literal, Callable
 from enum import Enum
 
 import yaml
@@ -59,6 +59,88 @@ class FrontMatter(BaseModel):
     """Front Matter 数据"""
     task_status: TaskCompleted | TaskCannotContinue = Field(description="Task status")
 
+def parse_block_match(match: re.Match, errors: Errors) -> CodeBlock | None:
+    """把 BLOCK_PATTERN 的匹配结果转换为 CodeBlock，出错时记录到 errors 并返回 None"""
+    start_json, _, lang, content, end_json = match.groups()
+    
+    # 解析开始标签
+    try:
+        start_meta = json.loads(start_json)
+    except json.JSONDecodeError as e:
+        errors.add(
+            "Invalid JSON in Block-Start",
+            json_str=start_json,
+            exception=str(e),
+            position="Block-Start",
+            error_type=ParseErrorType.JSON_DECODE_ERROR,
+        )
+        return None
+    
+    # 解析结束标签
+    try:
+        end_meta = json.loads(end_json)
+    except json.JSONDecodeError as e:
+        errors.add(
+            "Invalid JSON in Block-End",
+            json_str=end_json,
+            exception=str(e),
+            position="Block-End",
+            error_type=ParseErrorType.JSON_DECODE_ERROR,
+        )
+        return None
+    
+    # 检查名称是否一致
+    start_name = start_meta.get("name")
+    end_name = end_meta.get("name")
+    
+    if not start_name or start_name != end_name:
+        errors.add(
+            "Block-Start and Block-End name mismatch",
+            start_name=start_name,
+            end_name=end_name,
+            error_type=ParseErrorType.INVALID_FORMAT,
+        )
+        return None
+    
+    # 创建 CodeBlock 对象，让 Pydantic 处理验证
+    try:
+        return CodeBlock(
+            name=start_name,
+            lang=lang or "markdown",
+            code=content,
+            path=start_meta.get("path")
+        )
+    except ValidationError as e:
+        errors.add(
+            "Failed to create CodeBlock",
+            exception=str(e),
+            error_type=ParseErrorType.PYDANTIC_VALIDATION_ERROR,
+        )
+    return None
+
+def parse_toolcall_match(match: re.Match, errors: Errors) -> ToolCall | None:
+    """把 TOOLCALL_PATTERN 的匹配结果转换为 ToolCall，出错时记录到 errors 并返回 None"""
+    json_str = match.group(1)
+    
+    # 直接使用 Pydantic 解析，让它处理所有验证
+    try:
+        return ToolCall.model_validate_json(json_str)
+    except json.JSONDecodeError as e:
+        errors.add(
+            "Invalid JSON in ToolCall",
+            json_str=json_str,
+            exception=str(e),
+            error_type=ParseErrorType.JSON_DECODE_ERROR,
+        )
+    except ValidationError as e:
+        errors.add(
+            "Invalid ToolCall data",
+            json_str=json_str,
+            exception=str(e),
+            error_type=ParseErrorType.PYDANTIC_VALIDATION_ERROR,
+        )
+    return None
+
 class Response(BaseModel):
     """响应对象 - 封装解析结果"""
     message: ChatMessage = Field(default_factory=ChatMessage)
@@ -123,62 +205,9 @@ class Response(BaseModel):
         errors = Errors()
         code_blocks = []
         for match in BLOCK_PATTERN.finditer(markdown):
-            start_json, _, lang, content, end_json = match.groups()
-            
-            # 解析开始标签
-            try:
-                start_meta = json.loads(start_json)
-            except json.JSONDecodeError as e:
-                errors.add(
-                    "Invalid JSON in Block-Start",
-                    json_str=start_json,
-                    exception=str(e),
-                    position="Block-Start",
-                    error_type=ParseErrorType.JSON_DECODE_ERROR,
-                )
-                continue
-            
-            # 解析结束标签
-            try:
-                end_meta = json.loads(end_json)
-            except json.JSONDecodeError as e:
-                errors.add(
-                    "Invalid JSON in Block-End",
-                    json_str=end_json,
-                    exception=str(e),
-                    position="Block-End",
-                    error_type=ParseErrorType.JSON_DECODE_ERROR,
-                )
-                continue
-            
-            # 检查名称是否一致
-            start_name = start_meta.get("name")
-            end_name = end_meta.get("name")
-            
-            if not start_name or start_name != end_name:
-                errors.add(
-                    "Block-Start and Block-End name mismatch",
-                    start_name=start_name,
-                    end_name=end_name,
-                    error_type=ParseErrorType.INVALID_FORMAT,
-                )
-                continue
-            
-            # 创建 CodeBlock 对象，让 Pydantic 处理验证
-            try:
-                code_block = CodeBlock(
-                    name=start_name,
-                    lang=lang or "markdown",
-                    code=content,
-                    path=start_meta.get("path")
-                )
+            code_block = parse_block_match(match, errors)
+            if code_block:
                 code_blocks.append(code_block)
-            except ValidationError as e:
-                errors.add(
-                    "Failed to create CodeBlock",
-                    exception=str(e),
-                    error_type=ParseErrorType.PYDANTIC_VALIDATION_ERROR,
-                )
 
         if code_blocks:
             self.code_blocks = code_blocks
@@ -189,26 +218,9 @@ class Response(BaseModel):
         errors = Errors()
         tool_calls = []
         for match in TOOLCALL_PATTERN.finditer(markdown):
-            json_str = match.group(1)
-            
-            # 直接使用 Pydantic 解析，让它处理所有验证
-            try:
-                tool_call = ToolCall.model_validate_json(json_str)
+            tool_call = parse_toolcall_match(match, errors)
+            if tool_call:
                 tool_calls.append(tool_call)
-            except json.JSONDecodeError as e:
-                errors.add(
-                    "Invalid JSON in ToolCall",
-                    json_str=json_str,
-                    exception=str(e),
-                    error_type=ParseErrorType.JSON_DECODE_ERROR,
-                )
-            except ValidationError as e:
-                errors.add(
-                    "Invalid ToolCall data",
-                    json_str=json_str,
-                    exception=str(e),
-                    error_type=ParseErrorType.PYDANTIC_VALIDATION_ERROR,
-                )
         self._add_tool_calls(tool_calls)
         return errors
     
@@ -279,4 +291,67 @@ class Response(BaseModel):
                     error_type=ParseErrorType.PYDANTIC_VALIDATION_ERROR,
                 )
 
-        return errors
\ No newline at end of file
+        return errors
+
+class StreamingParser:
+    """
+    流式响应的增量解析器
+
+    由 StreamProcessor 逐块喂入正文，每当收到标记的结尾 `-->` 时查找新完成的代码块和工具调用，
+    通过 emit 发送 block_ready / toolcall_ready 事件，后续处理可以在 LLM 输出结束前开始。
+    最终结果仍以 finish() 对完整消息的解析为准，与 Response.from_message 完全一致。
+    """
+
+    def __init__(self, emit: Callable[..., Any] | None = None):
+        self.emit = emit
+        self.log = logger.bind(src='StreamingParser')
+        self.code_blocks: List[CodeBlock] = []
+        self.tool_calls: List[ToolCall] = []
+        self._parts: List[str] = []
+        # 上一个数据块末尾的两个字符，用于发现跨数据块的 `-->`
+        self._tail = ''
+        self._block_pos = 0
+        self._toolcall_pos = 0
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ''
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        window = self._tail + chunk
+        self._tail = window[-2:]
+        if '-->' in window:
+            self._scan()
+
+    def _scan(self) -> None:
+        text = self.text
+        errors = Errors()
+        for match in BLOCK_PATTERN.finditer(text, self._block_pos):
+            self._block_pos = match.end()
+            code_block = parse_block_match(match, errors)
+            if code_block:
+                self.code_blocks.append(code_block)
+                self._emit('block_ready', block=code_block)
+
+        for match in TOOLCALL_PATTERN.finditer(text, self._toolcall_pos):
+            self._toolcall_pos = match.end()
+            tool_call = parse_toolcall_match(match, errors)
+            if tool_call:
+                self.tool_calls.append(tool_call)
+                self._emit('toolcall_ready', tool_call=tool_call)
+
+    def _emit(self, event: str, **kwargs) -> None:
+        if self.emit:
+            self.emit(event, **kwargs)
+
+    def finish(self, message: ChatMessage, parse_mcp: bool = False) -> Response:
+        """解析完整消息，提前发出的结果与最终结果不一致时记录日志"""
+        response = Response.from_message(message, parse_mcp=parse_mcp)
+        if self.code_blocks and self.code_blocks != (response.code_blocks or [])[:len(self.code_blocks)]:
+            self.log.warning('Streaming code blocks differ from final parse')
+        return response
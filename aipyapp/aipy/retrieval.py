@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""本地向量索引，供检索上下文策略使用
+
+默认使用哈希词袋向量，不依赖模型和网络；安装 sentence-transformers 并配置本地模型后使用语义向量。
+向量均为 L2 归一化的稀疏向量 {维度: 权重}，点积即余弦相似度。
+"""
+
+import re
+import math
+import zlib
+import heapq
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+Vector = Dict[int, float]
+
+# 哈希词袋向量维度
+HASH_DIM = 1 << 16
+# 每段文本参与计算的最大字符数
+TEXT_MAX_CHARS = 8000
+
+WORD_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+')
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+CODE_BLOCK_PATTERN = re.compile(r'```[^\n]*\n(.*?)```', re.DOTALL)
+
+def split_code_blocks(text: str) -> List[str]:
+    """提取文本中的 markdown 代码块"""
+    return [code for code in CODE_BLOCK_PATTERN.findall(text) if code.strip()]
+
+def _normalize(weights: Dict[int, float]) -> Vector:
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    if not norm:
+        return {}
+    return {i: w / norm for i, w in weights.items()}
+
+def similarity(a: Vector, b: Vector) -> float:
+    """归一化稀疏向量的余弦相似度"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(i, 0.0) for i, w in a.items())
+
+class IEmbedder(ABC):
+    """文本向量化接口"""
+
+    @abstractmethod
+    def embed(self, text: str) -> Vector:
+        """返回归一化的稀疏向量"""
+        pass
+
+class HashingEmbedder(IEmbedder):
+    """哈希词袋向量
+
+    英文按标识符和数字切词，中日韩文字取单字和相邻两字，词频取对数后哈希到固定维度。
+    """
+
+    def __init__(self, dim: int = HASH_DIM):
+        self.dim = dim
+
+    def _tokens(self, text: str) -> Iterable[str]:
+        for word in WORD_PATTERN.findall(text[:TEXT_MAX_CHARS].lower()):
+            if CJK_PATTERN.match(word):
+                yield from word
+                for i in range(len(word) - 1):
+                    yield word[i:i + 2]
+            else:
+                yield word
+                # 下划线连接的标识符同时按各部分计数
+                if '_' in word:
+                    yield from (part for part in word.split('_') if part)
+
+    def embed(self, text: str) -> Vector:
+        weights: Dict[int, float] = {}
+        for token, count in Counter(self._tokens(text)).items():
+            i = zlib.crc32(token.encode('utf-8')) % self.dim
+            weights[i] = weights.get(i, 0.0) + 1.0 + math.log(count)
+        return _normalize(weights)
+
+class SentenceTransformerEmbedder(IEmbedder):
+    """sentence-transformers 本地模型，只从本地缓存或路径加载"""
+
+    def __init__(self, model: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model, local_files_only=True)
+
+    def embed(self, text: str) -> Vector:
+        values = self.model.encode(text[:TEXT_MAX_CHARS], normalize_embeddings=True)
+        return {i: float(v) for i, v in enumerate(values) if v}
+
+def create_embedder(model: Optional[str] = None) -> IEmbedder:
+    """
+    创建向量化器
+
+    Args:
+        model: 本地 embedding 模型名称或路径，为空或加载失败时使用 HashingEmbedder
+    """
+    if model:
+        try:
+            return SentenceTransformerEmbedder(model)
+        except ImportError:
+            logger.debug('sentence-transformers not installed, using hashing embedder')
+        except Exception as e:
+            logger.warning(f'Failed to load embedding model {model}: {e}')
+    return HashingEmbedder()
+
+class VectorIndex:
+    """内存向量索引
+
+    每个键对应一段或多段文本（消息全文及其中的代码块），相似度取各段的最大值。
+    """
+
+    def __init__(self, embedder: Optional[IEmbedder] = None):
+        self.embedder = embedder or HashingEmbedder()
+        self._vectors: Dict[str, List[Vector]] = {}
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._vectors
+
+    def embed(self, text: str) -> Vector:
+        return self.embedder.embed(text)
+
+    def add(self, key: str, text: str) -> None:
+        """索引文本及其中的代码块，已存在的键不重复计算"""
+        if key in self._vectors:
+            return
+        texts = [text, *split_code_blocks(text)]
+        self._vectors[key] = [vector for vector in map(self.embedder.embed, texts) if vector]
+
+    def score(self, key: str, query: Vector) -> float:
+        return max((similarity(query, vector) for vector in self._vectors.get(key, ())), default=0.0)
+
+    def search(self, query: Vector, keys: Iterable[str], k: int) -> List[Tuple[float, str]]:
+        """
+        在 keys 中查找与 query 最相似的 k 个
+
+        Returns:
+            按相似度从高到低排列的 (相似度, 键)，不包含相似度为 0 的键
+        """
+        scored = ((self.score(key, query), key) for key in keys)
+        return heapq.nlargest(k, (item for item in scored if item[0] > 0), key=lambda item: item[0])
@@ -2,8 +2,10 @@
 # -*- coding: utf-8 -*-
 
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
+import hashlib
 import tomllib
+import json
 import os
 
 from loguru import logger
@@ -54,6 +56,20 @@ class Role:
     def add_plugin(self, name: str, data: Dict[str, Any]):
         self.plugins[name] = data
 
+    def fingerprint(self) -> str:
+        """角色内容的哈希，用于缓存系统提示词"""
+        data = {
+            'name': self.name,
+            'short': self.short,
+            'detail': self.detail,
+            'envs': self.envs,
+            'packages': {name: sorted(packages) for name, packages in self.packages.items()},
+            'tips': {name: asdict(tip) for name, tip in self.tips.items()},
+            'plugins': self.plugins,
+        }
+        text = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
     def __iter__(self):
         return iter(self.tips.items())
 
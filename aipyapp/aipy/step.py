@@ -55,53 +55,77 @@ class StepData(BaseModel):
         self.rounds.append(round)
 
 class Step:
-    def __init__(self, task: Task, data: StepData):
+    def __init__(self, task: Task, data: StepData | dict):
+        """
+        Args:
+            task: 所属任务
+            data: 步骤数据，延迟加载时为未校验的原始字典，首次访问 data 时校验
+        """
         self.task = task
         self.log = logger.bind(src='Step')
         self._data = data
         self._summary = Counter()
     
     @property
-    def data(self):
+    def data(self) -> StepData:
+        if isinstance(self._data, dict):
+            context = {'message_storage': self.task.message_storage}
+            self._data = StepData.model_validate(self._data, context=context)
+        return self._data
+
+    @property
+    def loaded(self) -> bool:
+        return not isinstance(self._data, dict)
+
+    @property
+    def raw_data(self) -> StepData | dict:
+        """未加载时返回原始字典，用于保存时避免校验"""
         return self._data
     
     def __getitem__(self, name: str):
-        return getattr(self._data, name)
+        return getattr(self.data, name)
     
     def __setitem__(self, name: str, value: Any):
-        setattr(self._data, name, value)
+        setattr(self.data, name, value)
     
     def get(self, name: str, default: Any = None):
-        return getattr(self._data, name, default)
+        return getattr(self.data, name, default)
     
     def request(self, user_message: ChatMessage) -> Response:
         client = self.task.client
+        self.task.tool_call_processor.begin_round(self.task)
         self.task.emit('request_started', llm=client.name)
         msg = client(user_message)
         self.task.emit('response_completed', llm=client.name, msg=msg)
-        if isinstance(msg.message, ErrorMessage):
+        if isinstance(msg.get_message(), ErrorMessage):
             response = Response(message=msg)
             self.log.error('LLM request error', error=msg.content)
         else:
             self._summary.update(msg.usage)
-            response = Response.from_message(msg, parse_mcp=self.task.mcp)
+            response = client.parse(msg, parse_mcp=self.task.mcp)
         return response
 
     def process(self, response: Response) -> list[ToolCallResult] | None:
-        if isinstance(response.message.message, ErrorMessage):
-            return None
-        
-        if response.task_status:
-            self.task.emit('task_status', status=response.task_status)
+        processor = self.task.tool_call_processor
+        try:
+            if isinstance(response.message.get_message(), ErrorMessage):
+                return None
+            
+            if response.task_status:
+                self.task.emit('task_status', status=response.task_status)
 
-        if response.code_blocks:
-            self.task.blocks.add_blocks(response.code_blocks)
-        
-        if response.tool_calls:
-            toolcall_results = self.task.tool_call_processor.process(self.task, response.tool_calls)
-        else:
-            toolcall_results = None
-        return toolcall_results
+            if response.code_blocks:
+                # 提前执行的代码块文件可能还在使用，覆盖前等待执行结束
+                processor.wait_speculation()
+                self.task.blocks.add_blocks(response.code_blocks)
+            
+            if response.tool_calls:
+                toolcall_results = processor.process(self.task, response.tool_calls)
+            else:
+                toolcall_results = None
+            return toolcall_results
+        finally:
+            processor.end_round()
     
     def run(self, user_message: UserMessage) -> Response:
         max_rounds = self.task.max_rounds
@@ -112,7 +136,7 @@ class Step:
 
             self.task.emit('parse_reply_completed', response=response)
             round = Round(request=user_message, response=response)
-            self._data.add_round(round)
+            self.data.add_round(round)
             
             round.toolcall_results = self.process(response)
             
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""用 LLM 生成滚动摘要
+
+消息移出 preserve_recent 窗口后在后台线程生成摘要：已有摘要和新移出的消息一起交给 LLM，
+得到覆盖全部旧消息的新摘要（层级滚动摘要）。摘要按消息前缀的滚动哈希缓存，
+压缩时只需查表，不在请求路径上调用 LLM。
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ..llm import MessageRole
+from .chat import ChatMessage
+from .context import _iter_text
+
+# 每次调用 LLM 最多摘要的消息数
+CHUNK_SIZE = 20
+# 至少积累多少条新消息才调用 LLM（一轮对话）
+BATCH_SIZE = 2
+# 每条消息交给 LLM 的最大字符数
+MESSAGE_MAX_CHARS = 2000
+
+SYSTEM_PROMPT = (
+    "你负责压缩一段 AI 助手与用户的对话历史。"
+    "请把已有摘要和新的对话内容合并为一份新的摘要，保留用户的目标和要求、已完成的步骤、"
+    "关键结论、文件路径、变量名、错误信息和未解决的问题，省略寒暄和重复内容。"
+    "直接输出摘要正文，不要超过 {max_length} 个字符。"
+)
+
+# 空前缀的键
+ROOT_KEY = ''
+
+def _next_key(key: str, message_id: str) -> str:
+    """消息前缀的滚动哈希：前一个前缀的键加上下一条消息的 ID"""
+    return hashlib.sha1(f'{key}:{message_id}'.encode('utf-8')).hexdigest()
+
+def _format_message(message: ChatMessage) -> str:
+    text = '\n'.join(_iter_text(message.content))
+    if len(text) > MESSAGE_MAX_CHARS:
+        text = text[:MESSAGE_MAX_CHARS] + '...'
+    return f'[{message.role}]\n{text}'
+
+class _Collector:
+    """收集流式回复，不发送任务事件"""
+
+    def __init__(self):
+        self._content = []
+        self._reason = []
+
+    @property
+    def content(self) -> str:
+        return ''.join(self._content)
+
+    @property
+    def reason(self) -> str:
+        return ''.join(self._reason)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def process_chunk(self, content, *, reason=False):
+        if content:
+            (self._reason if reason else self._content).append(content)
+
+class RollingSummarizer:
+    """后台生成并缓存滚动摘要
+
+    client 是 ClientManager 中的 LLM 客户端（建议使用便宜的小模型），调用方式与任务的 LLM 相同。
+    """
+
+    def __init__(self, client: Callable[..., Any], max_length: int = 200,
+                 chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE):
+        self.client = client
+        self.max_length = max_length
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.log = logger.bind(src='RollingSummarizer')
+        self._cond = threading.Condition()
+        # 前缀键 -> 覆盖该前缀的摘要
+        self._summaries: Dict[str, str] = {}
+        self._pending: Optional[List[ChatMessage]] = None
+        self._busy = False
+        self._thread = None
+
+    def _find(self, messages: List[ChatMessage]) -> Tuple[int, str, Optional[str]]:
+        """查找已有摘要的最长前缀，返回 (覆盖的消息数, 前缀键, 摘要)"""
+        key = ROOT_KEY
+        covered, covered_key, summary = 0, key, None
+        with self._cond:
+            for i, message in enumerate(messages):
+                key = _next_key(key, message.id)
+                text = self._summaries.get(key)
+                if text is not None:
+                    covered, covered_key, summary = i + 1, key, text
+        return covered, covered_key, summary
+
+    def lookup(self, messages: List[ChatMessage]) -> Tuple[Optional[str], int]:
+        """
+        查找覆盖 messages 最长前缀的摘要
+
+        Returns:
+            (摘要, 覆盖的消息数)，没有摘要时返回 (None, 0)
+        """
+        covered, _, summary = self._find(messages)
+        return summary, covered
+
+    def register(self, message: ChatMessage, summary: str) -> None:
+        """记录摘要消息对应的摘要，之后的摘要在此基础上滚动生成"""
+        with self._cond:
+            self._summaries[_next_key(ROOT_KEY, message.id)] = summary
+
+    def submit(self, messages: List[ChatMessage]) -> None:
+        """请求为 messages 生成摘要，立即返回
+
+        处理期间到达的多次请求只保留最新的一次。
+        """
+        with self._cond:
+            self._pending = list(messages)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='RollingSummarizer', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待后台摘要完成，返回是否已完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._pending is None:
+                    self._thread = None
+                    return
+                messages, self._pending = self._pending, None
+                self._busy = True
+
+            try:
+                self._summarize(messages)
+            except Exception:
+                self.log.exception('Failed to summarize messages')
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _summarize(self, messages: List[ChatMessage]) -> None:
+        covered, key, summary = self._find(messages)
+        while len(messages) - covered >= self.batch_size:
+            chunk = messages[covered:covered + self.chunk_size]
+            text = self._call(summary, chunk)
+            if not text:
+                return
+            for message in chunk:
+                key = _next_key(key, message.id)
+            covered += len(chunk)
+            summary = text
+            with self._cond:
+                self._summaries[key] = summary
+            self.log.info('Summary updated', messages=covered, length=len(summary))
+
+    def _call(self, summary: Optional[str], messages: List[ChatMessage]) -> Optional[str]:
+        parts = []
+        if summary:
+            parts.append(f'## 已有摘要\n{summary}')
+        parts.append('## 新的对话\n' + '\n\n'.join(_format_message(msg) for msg in messages))
+        request = [
+            {'role': 'system', 'content': SYSTEM_PROMPT.format(max_length=self.max_length)},
+            {'role': 'user', 'content': '\n\n'.join(parts)},
+        ]
+        reply = self.client(request, stream_processor=_Collector())
+        if reply is None or reply.role == MessageRole.ERROR:
+            self.log.error('Summary LLM call failed', error=getattr(reply, 'content', None))
+            return None
+        return reply.content.strip() or None
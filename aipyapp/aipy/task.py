@@ -6,13 +6,13 @@ from __future__ import annotations
 import os
 import json
 import uuid
-from typing import List, Union, TYPE_CHECKING
+from typing import Any, List, Union, TYPE_CHECKING
 from pathlib import Path
 from collections import namedtuple
 from importlib.resources import read_text
 
 import requests
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, ValidationError, field_serializer
 from loguru import logger
 
 from .. import T, __respkg__, Stoppable, TaskPlugin
@@ -22,12 +22,17 @@ from .runtime import CliPythonRuntime
 from .utils import get_safe_filename, validate_file
 from .events import TypedEventBus
 from .multimodal import MMContent   
-from .context import ContextManager, ContextData
+from .context import ContextManager, ContextData, ContextConfig, create_token_estimator
+from .summary import RollingSummarizer
 from .toolcalls import ToolCallProcessor
 from .chat import MessageStorage, ChatMessage, UserMessage
 from .step import Step, StepData
 from .blocks import CodeBlocks
 from .client import Client
+from .prompts import SystemPrompt
+from .journal import TaskJournal, TaskSaver, JOURNAL_SUFFIX
+from .archive import ARCHIVE_SUFFIX, is_archive, read_archive, write_archive
+from .blobs import BlobStore, resolve_blobs
 
 if TYPE_CHECKING:
     from .taskmgr import TaskManager
@@ -35,6 +40,7 @@ if TYPE_CHECKING:
 MAX_ROUNDS = 16
 TASK_VERSION = 20250818
 
+BLOB_DIR = 'blobs'
 CONSOLE_WHITE_HTML = read_text(__respkg__, "console_white.html")
 CONSOLE_CODE_HTML = read_text(__respkg__, "console_code.html")
 
@@ -63,6 +69,14 @@ class TaskData(BaseModel):
     blocks: CodeBlocks = Field(default_factory=CodeBlocks)
     context: ContextData = Field(default_factory=ContextData)
     message_storage: MessageStorage = Field(default_factory=MessageStorage)
+
+    @field_serializer('steps', mode='wrap')
+    def _serialize_steps(self, steps: List[Any], handler):
+        # 延迟加载时未访问过的步骤是原始字典，原样输出
+        if not any(isinstance(step, dict) for step in steps):
+            return handler(steps)
+        dumped = iter(handler([step for step in steps if not isinstance(step, dict)]))
+        return [step if isinstance(step, dict) else next(dumped) for step in steps]
     
     def add_step(self, step: StepData):
         self.steps.append(step)
@@ -82,6 +96,7 @@ class Task(Stoppable):
         self.cwd = self.workdir / self.task_id
         self.gui = manager.settings.gui
         self._saved = False
+        self._journal = TaskJournal(self.cwd / "task.json")
         self.max_rounds = manager.settings.get('max_rounds', MAX_ROUNDS)
         self.role = manager.role_manager.current_role
 
@@ -89,8 +104,16 @@ class Task(Stoppable):
         self.steps: List[Step] = [Step(self, step_data) for step_data in data.steps]
         self.blocks = data.blocks
         self.message_storage = data.message_storage
+        self.blob_store = BlobStore(self.cwd / BLOB_DIR)
+        self.message_storage.set_blob_store(self.blob_store)
         self.context = data.context
-        self.context_manager = ContextManager(self.message_storage, self.context, manager.settings.get('context_manager'))
+        context_config = ContextConfig(**(manager.settings.get('context_manager') or {}))
+        self._tokenizer = self._get_tokenizer(manager)
+        self.context_manager = ContextManager(
+            self.message_storage, self.context, context_config,
+            estimator=create_token_estimator(self._tokenizer),
+            summarizer=self._create_summarizer(manager, context_config),
+        )
 
         # Display
         if manager.display_manager:
@@ -98,6 +121,7 @@ class Task(Stoppable):
             self.event_bus.add_listener(self.display)
         else:
             self.display = None
+        self._saver = TaskSaver(self._journal, self.display, self.cwd / "console.html", CONSOLE_WHITE_HTML, self.blob_store)
 
         # Objects for steps
         self.mcp = manager.mcp
@@ -107,7 +131,10 @@ class Task(Stoppable):
         self.runner = BlockExecutor()
         self.runner.set_python_runtime(self.runtime)
         self.client = Client(self)
-        self.tool_call_processor = ToolCallProcessor()
+        speculative = (manager.settings.get('speculative') or {}).get('enable', False)
+        self.tool_call_processor = ToolCallProcessor(speculative=speculative)
+        if speculative:
+            self.event_bus.add_listener(self.tool_call_processor)
 
         # Plugins
         plugins: dict[str, TaskPlugin] = {}
@@ -132,16 +159,33 @@ class Task(Stoppable):
             self.steps[-1].data.events.append(event)
         return event
 
-    def get_system_message(self) -> ChatMessage:
+    def _get_system_prompt_params(self) -> dict:
         params = {}
         if self.mcp:
             params['mcp_tools'] = self.mcp.get_tools_prompt()
         params['util_functions'] = self.runtime.get_builtin_functions()
         params['tool_functions'] = self.runtime.get_plugin_functions()
         params['role'] = self.role
-        system_prompt = self.prompts.get_default_prompt(**params)
-        msg = SystemMessage(content=system_prompt)
+        return params
+
+    def _get_system_prompt(self) -> SystemPrompt:
+        """系统提示词，角色、插件函数和 MCP 工具都相同的任务共用渲染结果"""
+        key = (
+            self.role.fingerprint(),
+            tuple(sorted(self.runtime.get_plugin_functions())),
+            self.mcp.get_tools_fingerprint() if self.mcp else None,
+        )
+        return self.prompts.get_system_prompt(key, self._get_system_prompt_params)
+
+    def get_system_message(self) -> ChatMessage:
+        msg = SystemMessage(content=self._get_system_prompt().content)
         return self.message_storage.store(msg)
+
+    def _add_system_message(self):
+        """添加系统消息，复用缓存的 token 数"""
+        prompt = self._get_system_prompt()
+        msg = self.message_storage.store(SystemMessage(content=prompt.content))
+        prompt.tokens[self._tokenizer] = self.context_manager.add_message(msg, prompt.tokens.get(self._tokenizer))
     
     def delete_step(self, index: int) -> bool:
         if index < 0 or index >= len(self.steps):
@@ -153,6 +197,23 @@ class Task(Stoppable):
         self.steps.clear()
         return True
     
+    def _get_tokenizer(self, manager: TaskManager) -> str | None:
+        """当前模型的 tiktoken 编码名称"""
+        client = manager.client_manager.current
+        if not client or not client.model:
+            return None
+        return manager.client_manager.get_tokenizer(client.model)
+
+    def _create_summarizer(self, manager: TaskManager, config: ContextConfig) -> RollingSummarizer | None:
+        """使用 summary_llm 指定的 LLM 生成摘要"""
+        if not config.summary_llm:
+            return None
+        client = manager.client_manager.get_client(config.summary_llm)
+        if not client or not client.usable():
+            self.log.warning(f"Summary LLM {config.summary_llm} not available")
+            return None
+        return RollingSummarizer(client, config.summary_max_length)
+
     def get_status(self):
         return {
             'llm': self.client.name,
@@ -170,23 +231,44 @@ class Task(Stoppable):
         )
     
     @classmethod
-    def from_file(cls, path: Union[str, Path], manager: TaskManager) -> 'Task':
-        """从文件创建 TaskState 对象"""
+    def from_file(cls, path: Union[str, Path], manager: TaskManager, lazy: bool = True) -> 'Task':
+        """
+        从文件创建 TaskState 对象
+
+        Args:
+            path: task.json 或任务归档路径
+            manager: 任务管理器
+            lazy: 延迟加载，消息和步骤在首次访问时才校验
+        """
         path = Path(path)
         validate_file(path)
         
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.loads(f.read())
-                try:
-                    model_context = {'message_storage': MessageStorage.model_validate(data['message_storage'])}
-                except:
-                    model_context = None
-
-                task_data = TaskData.model_validate(data, context=model_context)
-                task = cls(manager, task_data)
-                logger.info('Loaded task state from file', path=str(path), task_id=task.task_id)
-                return task
+            if is_archive(path):
+                data = read_archive(path)
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.loads(f.read())
+                data = TaskJournal.replay(data, path.with_suffix(JOURNAL_SUFFIX))
+
+            steps = data.pop('steps', [])
+            messages = data.pop('message_storage', {}).get('messages', {})
+            message_storage = MessageStorage.lazy(messages)
+            model_context = {'message_storage': message_storage}
+
+            task_data = TaskData.model_validate(data, context=model_context)
+            task_data.message_storage = message_storage
+            if lazy:
+                task_data.steps = steps
+            else:
+                task_data.steps = [StepData.model_validate(step, context=model_context) for step in steps]
+            task = cls(manager, task_data)
+            # 原任务目录中的 blob
+            task.blob_store.add_source(path.parent / BLOB_DIR)
+            if not lazy:
+                message_storage.load_all()
+            logger.info('Loaded task state from file', path=str(path), task_id=task.task_id)
+            return task
         except json.JSONDecodeError as e:
             raise TaskError(f'Invalid JSON file: {e}') from e
         except ValidationError as e:
@@ -195,13 +277,18 @@ class Task(Stoppable):
             raise TaskError(f'Failed to load task state: {e}') from e
     
     def to_file(self, path: Union[str, Path]) -> None:
-        """保存任务状态到文件"""
+        """保存任务状态到文件，.zip 后缀保存为压缩归档"""
         path = Path(path)
         path.parent.mkdir(parents=True, exist_ok=True)
         try:
-            with open(path, 'w', encoding='utf-8') as f:
-                data = self.get_task_data()
-                f.write(data.model_dump_json(indent=2, exclude_none=True))
+            data = self.get_task_data()
+            if path.suffix == ARCHIVE_SUFFIX:
+                write_archive(path, data.model_dump(mode='json', exclude_none=True), blob_store=self.blob_store)
+            else:
+                # 单个 JSON 文件不引用 blob，写入完整内容
+                data = resolve_blobs(data.model_dump(mode='json', exclude_none=True), self.blob_store)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
             self.log.info('Saved task state to file', path=str(path))
         except Exception as e:
             self.log.exception('Failed to save task state', path=str(path))
@@ -216,19 +303,19 @@ class Task(Stoppable):
             return
         
         try:
-            self.to_file(cwd / "task.json")
-            
-            display = self.display
-            if display:
-                filename = cwd / "console.html"
-                display.save(filename, clear=False, code_format=CONSOLE_WHITE_HTML)
-            
+            # 序列化、写文件和渲染 console.html 在后台线程完成
+            self._saver.request(self)
             self._saved = True
-            self.log.info('Task auto saved')
+            self.log.info('Task auto save requested')
         except Exception as e:
             self.log.exception('Error saving task')
             self.emit('exception', msg='save_task', exception=e)
 
+    def _flush_save(self):
+        """等待后台保存完成并停止保存线程"""
+        for e in self._saver.flush(stop=True):
+            self.emit('exception', msg='save_task', exception=e)
+
     def done(self):
         if not self.steps:
             self.log.warning('Task not started, skipping save')
@@ -240,6 +327,8 @@ class Task(Stoppable):
             if not self._saved:
                 self.log.warning('Task not saved, trying to save')
                 self._auto_save()
+            # 重命名目录前必须等待后台写入完成
+            self._flush_save()
 
             newname = get_safe_filename(self.instruction, extension=None)
             if newname:
@@ -285,7 +374,7 @@ class Task(Stoppable):
         first_run = not self.steps
         user_message = self.prepare_user_prompt(instruction, first_run)
         if first_run:
-            self.context_manager.add_message(self.get_system_message())
+            self._add_system_message()
 
         # We MUST create the task directory here because it could be a resumed task.
         self.cwd.mkdir(exist_ok=True, parents=True)
@@ -17,6 +17,7 @@ from .diagnose import Diagnose
 from .config import PLUGINS_DIR, ROLES_DIR, get_mcp_config_file, get_tt_api_key
 from .role import RoleManager
 from .mcp_tool import MCPToolManager
+from .llm_cache import ResponseCache
 
 class TaskManager:
     MAX_TASKS = 16
@@ -68,7 +69,8 @@ class TaskManager:
         self.diagnose = Diagnose.create(settings)
         
         # 客户端管理器
-        self.client_manager = ClientManager(settings.llm, max_tokens=settings.get('max_tokens'))
+        self.client_manager = ClientManager(settings.llm, max_tokens=settings.get('max_tokens'),
+                                            http_pool=settings.get('http_pool'), router=settings.get('llm_router'))
         
         # 角色管理器
         api_conf = settings.get('api', {})
@@ -83,6 +85,9 @@ class TaskManager:
         # 提示管理器
         self.prompts = Prompts()
 
+        # LLM 响应缓存（默认关闭）
+        self.response_cache = ResponseCache.create(settings.get('llm_cache'))
+
     def get_status(self):
         status = {
             'tasks': len(self.tasks),
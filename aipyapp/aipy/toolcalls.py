@@ -5,7 +5,9 @@
 
 from __future__ import annotations
 from enum import Enum
-from typing import Union, List, Dict, Any, Optional, TYPE_CHECKING
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Union, List, Dict, Any, Optional, Tuple, TYPE_CHECKING
 
 from loguru import logger
 from pydantic import BaseModel, model_validator, Field
@@ -15,6 +17,7 @@ from ..exec import ExecResult, ProcessResult, PythonResult
 
 if TYPE_CHECKING:
     from .task import Task
+    from .blocks import CodeBlock
 
 class ToolName(str, Enum):
     """Tool name"""
@@ -84,11 +87,110 @@ class ToolCallResult(BaseModel):
     tool_name: ToolName
     result: Union[ExecToolResult, EditToolResult, MCPToolResult] = Field(title="Tool result")
 
+class Speculation:
+    """
+    一轮请求中提前执行的 Exec 工具调用
+
+    LLM 还在输出时，回复开头连续的 Exec 调用一旦代码块和参数都已完整，就在单个工作线程上按顺序执行。
+    只提前执行在子进程中运行的代码块：Python 代码块会替换进程全局的 sys.stdout，
+    还可能向用户提问，与主线程的流式输出冲突。遇到其它代码块或工具调用后不再提前执行。
+    工作线程不发送事件，本轮结束时由 take() 按顺序取出与最终解析一致的结果，
+    在主线程发送工具调用事件；不一致时丢弃剩余的结果。
+    """
+
+    def __init__(self, processor: 'ToolCallProcessor', task: 'Task'):
+        self.processor = processor
+        self.task = task
+        self.log = logger.bind(src='Speculation')
+        self.blocks: Dict[str, CodeBlock] = {}
+        self.pending: deque[Tuple[ToolCall, CodeBlock, Future]] = deque()
+        self.stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='speculation')
+
+    def add_block(self, block: CodeBlock):
+        if not self.stopped:
+            self.blocks[block.name] = block
+
+    def add_tool_call(self, tool_call: ToolCall):
+        if self.stopped:
+            return
+        block = self.blocks.get(tool_call.arguments.name) if tool_call.name == ToolName.EXEC else None
+        # 子进程执行的代码块需要先写入 path
+        if not block or not block.path or not self.task.runner.is_subprocess(block):
+            self.stopped = True
+            return
+        future = self._executor.submit(self._run, tool_call, block)
+        self.pending.append((tool_call, block, future))
+        self.log.info('Speculative exec started', block_name=block.name)
+
+    def _run(self, tool_call: ToolCall, block: CodeBlock) -> ExecToolResult:
+        block.save()
+        return self.processor._call_exec(self.task, tool_call, block)
+
+    def wait(self):
+        """等待所有提前执行的调用结束，之后才能覆盖代码块文件"""
+        wait([future for _, _, future in self.pending])
+
+    def take(self, tool_call: ToolCall) -> ExecToolResult | None:
+        """取出与最终解析一致的提前执行结果"""
+        if not self.pending:
+            return None
+        spec_call, spec_block, future = self.pending[0]
+        block = self.task.blocks[spec_block.name] if spec_block.name in self.task.blocks else None
+        if spec_call != tool_call or not block or \
+                (spec_block.lang, spec_block.code, spec_block.path) != (block.lang, block.code, block.path):
+            self.discard()
+            return None
+        self.pending.popleft()
+        return future.result()
+
+    def discard(self):
+        """丢弃剩余的结果，等待正在执行的调用结束"""
+        self.stopped = True
+        if not self.pending:
+            return
+        self.log.warning('Discard speculative results', count=len(self.pending))
+        futures = [future for _, _, future in self.pending if not future.cancel()]
+        self.pending.clear()
+        wait(futures)
+
+    def close(self):
+        self.discard()
+        self._executor.shutdown(wait=True)
+
 class ToolCallProcessor:
     """工具调用处理器 - 高级接口"""
     
-    def __init__(self):
+    def __init__(self, speculative: bool = False):
         self.log = logger.bind(src='ToolCallProcessor')
+        # 是否在 LLM 输出过程中提前执行 Exec 工具调用
+        self.speculative = speculative
+        self.speculation: Speculation | None = None
+
+    def begin_round(self, task: 'Task'):
+        """开始一轮请求，开启提前执行时接收流式解析的结果"""
+        self.end_round()
+        if self.speculative:
+            self.speculation = Speculation(self, task)
+
+    def wait_speculation(self):
+        """等待提前执行的调用结束"""
+        if self.speculation:
+            self.speculation.wait()
+
+    def end_round(self):
+        """结束一轮请求，丢弃未使用的提前执行结果"""
+        if self.speculation:
+            self.speculation.close()
+            self.speculation = None
+
+    def on_block_ready(self, event):
+        if self.speculation:
+            self.speculation.add_block(event.block)
+
+    def on_toolcall_ready(self, event):
+        if self.speculation:
+            self.speculation.add_tool_call(event.tool_call)
     
     def process(self, task: 'Task', tool_calls: List[ToolCall]) -> List[ToolCallResult]:
         """
@@ -122,8 +224,9 @@ class ToolCallProcessor:
                     ))
                     continue
             
-            # 执行工具调用
-            result = self.call_tool(task, tool_call)
+            # 执行工具调用，优先使用提前执行的结果
+            speculative = self.speculation.take(tool_call) if self.speculation else None
+            result = self.call_tool(task, tool_call, speculative)
             results.append(result)
             
             if name == ToolName.EDIT and result.result.error:
@@ -131,25 +234,27 @@ class ToolCallProcessor:
         
         return results
 
-    def call_tool(self, task: 'Task', tool_call: ToolCall) -> ToolCallResult:
+    def call_tool(self, task: 'Task', tool_call: ToolCall, result: ToolResult | None = None) -> ToolCallResult:
         """
         执行工具调用
         
         Args:
             tool_call: ToolCall 对象
+            result: 提前执行得到的结果，为空时执行工具
             
         Returns:
             ToolResult: 执行结果
         """
         task.emit('tool_call_started', tool_call=tool_call)
-        if tool_call.name == ToolName.EXEC:
-            result = self._call_exec(task, tool_call)
-        elif tool_call.name == ToolName.EDIT:
-            result = self._call_edit(task, tool_call)
-        elif tool_call.name == ToolName.MCP:
-            result = self._call_mcp(task, tool_call)
-        else:
-            result = ToolResult(error=Error('Unknown tool'))
+        if result is None:
+            if tool_call.name == ToolName.EXEC:
+                result = self._call_exec(task, tool_call)
+            elif tool_call.name == ToolName.EDIT:
+                result = self._call_edit(task, tool_call)
+            elif tool_call.name == ToolName.MCP:
+                result = self._call_mcp(task, tool_call)
+            else:
+                result = ToolResult(error=Error('Unknown tool'))
 
         toolcall_result = ToolCallResult(
             tool_name=tool_call.name,
@@ -194,13 +299,13 @@ class ToolCallProcessor:
         task.blocks.add_block(new_block, validate=False)
         return EditToolResult(block_name=block_name, new_version=new_block.version)
     
-    def _call_exec(self, task: 'Task', tool_call: ToolCall) -> ExecToolResult:
+    def _call_exec(self, task: 'Task', tool_call: ToolCall, block: CodeBlock | None = None) -> ExecToolResult:
         """执行 Exec 工具"""
         args = tool_call.arguments
         block_name = args.name
         
         # 获取代码块
-        block = task.blocks.get(block_name)
+        block = block or task.blocks.get(block_name)
         if not block:
             return ExecToolResult(
                 block_name=block_name,
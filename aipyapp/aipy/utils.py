@@ -43,6 +43,16 @@ def confirm_disclaimer(console):
         else:
             console.print("[yellow]请输入 yes 或 no。[/yellow]")
 
+def atomic_write(path: Union[str, Path], data: Union[str, bytes], encoding: str = 'utf-8') -> None:
+    """先写入同目录下的临时文件再重命名，避免中断时留下不完整的文件"""
+    path = Path(path)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    if isinstance(data, bytes):
+        tmp_path.write_bytes(data)
+    else:
+        tmp_path.write_text(data, encoding=encoding)
+    os.replace(tmp_path, path)
+
 def get_safe_filename(input_str, extension=".html", max_length=16):
     input_str = input_str.strip()
     safe_str = re.sub(r'[\\/:*?"<>|\s]', '', input_str).strip()
@@ -67,8 +77,8 @@ def validate_file(path: Union[str, Path]) -> None:
     if not path.exists():
         raise FileNotFoundError(f"Task file not found: {path}")
     
-    if not path.name.endswith('.json'):
-        raise ValueError("Task file must be a .json file")
+    if path.suffix not in ('.json', '.zip'):
+        raise ValueError("Task file must be a .json or .zip file")
     
     if not path.is_file():
         raise ValueError(f"Path is not a file: {path}")
@@ -7,7 +7,7 @@ from loguru import logger
 
 from .python import PythonRuntime, PythonExecutor
 from .html import HtmlExecutor
-from .prun import BashExecutor, PowerShellExecutor, AppleScriptExecutor, NodeExecutor
+from .prun import SubprocessExecutor, BashExecutor, PowerShellExecutor, AppleScriptExecutor, NodeExecutor
 from .types import ExecResult
 
 EXECUTORS = {executor.name: executor for executor in [
@@ -53,6 +53,11 @@ class BlockExecutor:
         self.log.info(f'Registered executor for {lang}: {executor}')
         return executor
 
+    def is_subprocess(self, block) -> bool:
+        """代码块是否在子进程中执行，不会修改本进程的 sys.stdout 等全局状态"""
+        executor = EXECUTORS.get(block.get_lang())
+        return bool(executor) and issubclass(executor, SubprocessExecutor)
+
     def __call__(self, block) -> ExecResult:
         self.log.info(f'Exec: {block}')
         executor = self.get_executor(block)
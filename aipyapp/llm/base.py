@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import time
+import asyncio
+import weakref
 from enum import Enum
 from collections import Counter
 from abc import ABC, abstractmethod
@@ -11,6 +13,8 @@ from loguru import logger
 from pydantic import BaseModel, Field
 
 from .. import T
+from .transport import get_http_pool
+from .ratelimit import RateLimitConfig, RateLimiter, billable_tokens, estimate_tokens
 
 class TextItem(BaseModel):
     type: Literal['text'] = 'text'
@@ -63,10 +67,40 @@ class AIMessage(Message):
 class ErrorMessage(Message):
     role: Literal[MessageRole.ERROR] = MessageRole.ERROR
 
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+def add_cache_control(message: Dict[str, Any]) -> Dict[str, Any]:
+    """在消息最后一个内容块上添加缓存断点，返回新的消息字典"""
+    content = message['content']
+    if isinstance(content, str):
+        content = [{'type': 'text', 'text': content}]
+    elif not content:
+        return message
+    content = list(content)
+    last = content[-1]
+    if not isinstance(last, dict):
+        # TextItem 等 pydantic 内容块
+        last = last.model_dump()
+    content[-1] = {**last, 'cache_control': CACHE_CONTROL}
+    return {**message, 'content': content}
+
+def mark_cache_prefix(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    标记提示词缓存断点，返回新的消息列表
+
+    断点放在最后一条消息上，本轮请求整体写入缓存。服务端从断点向前查找已缓存的前缀，
+    上一轮请求（系统提示词和之前的对话）在本轮直接命中缓存。
+    """
+    if not messages:
+        return messages
+    return messages[:-1] + [add_cache_control(messages[-1])]
+
 class BaseClient(ABC):
     MODEL = None
     BASE_URL = None
     TEMPERATURE = 0.5
+    # 是否在请求中标记提示词缓存断点
+    CACHE_PROMPT = False
 
     def __init__(self, config):
         self.name = config['name']
@@ -81,7 +115,11 @@ class BaseClient(ABC):
         self._base_url = self.get_base_url()
         self._stream = config.get("stream", True)
         self._tls_verify = bool(config.get("tls_verify", True))
+        self._cache_prompt = bool(config.get("cache_prompt", self.CACHE_PROMPT))
         self._client = None
+        self.rate_limiter: RateLimiter | None = None
+        # 事件循环 -> 异步 SDK 客户端，异步连接不能跨事件循环使用
+        self._async_clients = weakref.WeakKeyDictionary()
         params = self.get_params()
         params.update(config.get("params", {}))
         self._params = params
@@ -106,9 +144,38 @@ class BaseClient(ABC):
     
     def usable(self):
         return self._model
+
+    def set_rate_limit(self, config: RateLimitConfig):
+        """设置请求速率限制，config 未设置 rpm/tpm 时不限制"""
+        self.rate_limiter = RateLimiter(config) if config.enabled else None
     
     def _get_client(self):
         return self._client
+
+    def _get_http_client(self, url: str | None = None):
+        """进程内共享的 httpx.Client，默认连接 base_url 所在主机"""
+        return get_http_pool().get_client(url or self._base_url, self._tls_verify)
+
+    def _get_async_http_client(self, url: str | None = None):
+        """当前事件循环共享的 httpx.AsyncClient，默认连接 base_url 所在主机"""
+        return get_http_pool().get_async_client(url or self._base_url, self._tls_verify)
+
+    def _create_async_client(self):
+        return None
+
+    def _get_async_client(self):
+        """当前事件循环的异步 SDK 客户端"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._create_async_client()
+            self._async_clients[loop] = client
+        return client
+
+    @property
+    def supports_async(self) -> bool:
+        """是否实现了原生异步请求，否则 acall 在线程中执行同步请求"""
+        return type(self).aget_completion is not BaseClient.aget_completion
     
     @abstractmethod
     def get_completion(self, messages: list[Dict[str, Any]], **kwargs) -> AIMessage:
@@ -117,6 +184,9 @@ class BaseClient(ABC):
     def _prepare_messages(self, messages: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
         return messages
     
+    async def aget_completion(self, messages: list[Dict[str, Any]], **kwargs):
+        raise NotImplementedError
+
     @abstractmethod
     def _parse_usage(self, response) -> Counter:
         pass
@@ -128,21 +198,97 @@ class BaseClient(ABC):
     @abstractmethod
     def _parse_response(self, response) -> AIMessage:
         pass
+
+    async def _aparse_stream_response(self, response, stream_processor) -> AIMessage:
+        raise NotImplementedError
     
-    def __call__(self, messages: list[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage | ErrorMessage:
+    def _request(self, messages: list[Dict[str, Any]], tokens: int, **kwargs):
+        """按速率限制排队发送请求，超过限制时等待后重试"""
+        limiter = self.rate_limiter
+        if not limiter:
+            return self.get_completion(messages, **kwargs)
+
+        attempt = 0
+        while True:
+            limiter.acquire(tokens)
+            try:
+                return self.get_completion(messages, **kwargs)
+            except Exception as e:
+                if limiter.backoff(e, attempt) is None:
+                    raise
+                attempt += 1
+
+    async def _arequest(self, messages: list[Dict[str, Any]], tokens: int, **kwargs):
+        limiter = self.rate_limiter
+        if not limiter:
+            return await self.aget_completion(messages, **kwargs)
+
+        attempt = 0
+        while True:
+            await limiter.aacquire(tokens)
+            try:
+                return await self.aget_completion(messages, **kwargs)
+            except Exception as e:
+                if limiter.backoff(e, attempt) is None:
+                    raise
+                attempt += 1
+
+    def _record_usage(self, tokens: int, msg: AIMessage):
+        if self.rate_limiter:
+            self.rate_limiter.record_usage(tokens, billable_tokens(msg.usage))
+
+    def send(self, messages: list[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage:
+        """发送请求并解析响应，失败时抛出异常"""
+        tokens = estimate_tokens(messages) if self.rate_limiter else 0
         messages = self._prepare_messages(messages)
         start = time.time()
+        response = self._request(messages, tokens, **kwargs)
+
+        if self._stream:
+            msg = self._parse_stream_response(response, stream_processor)
+        else:
+            msg = self._parse_response(response)
+
+        self._record_usage(tokens, msg)
+        msg.usage['time'] = int(time.time() - start)
+        return msg
+
+    def __call__(self, messages: list[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage | ErrorMessage:
         try:
-            response = self.get_completion(messages, **kwargs)
+            return self.send(messages, stream_processor=stream_processor, **kwargs)
         except Exception as e:
             self.log.exception(f"{self.name} API Call failed", e=e)
             return ErrorMessage(content=str(e))
 
+    async def asend(self, messages: list[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage:
+        """异步发送请求并解析响应，失败时抛出异常"""
+        tokens = estimate_tokens(messages) if self.rate_limiter else 0
+        messages = self._prepare_messages(messages)
+        start = time.time()
+        response = await self._arequest(messages, tokens, **kwargs)
+
         if self._stream:
-            msg = self._parse_stream_response(response, stream_processor)
+            msg = await self._aparse_stream_response(response, stream_processor)
         else:
             msg = self._parse_response(response)
 
+        self._record_usage(tokens, msg)
         msg.usage['time'] = int(time.time() - start)
         return msg
-    
\ No newline at end of file
+
+    async def acall(self, messages: list[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage | ErrorMessage:
+        """
+        异步调用，多个请求可以在同一个事件循环中并发
+
+        与 __call__ 一样直接请求这个客户端，不经过重试、故障转移和响应缓存；
+        任务中使用 ClientManager.acall 或 aipy Client.acall。
+        未实现原生异步请求的客户端在线程中执行 __call__。
+        """
+        if not self.supports_async:
+            return await asyncio.to_thread(self, messages, stream_processor=stream_processor, **kwargs)
+
+        try:
+            return await self.asend(messages, stream_processor=stream_processor, **kwargs)
+        except Exception as e:
+            self.log.exception(f"{self.name} API Call failed", e=e)
+            return ErrorMessage(content=str(e))
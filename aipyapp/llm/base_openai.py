@@ -4,15 +4,18 @@
 from typing import Any, Dict
 from collections import Counter
 
-import httpx
 import openai
 
-from .base import BaseClient, MessageRole, AIMessage
+from .base import BaseClient, MessageRole, AIMessage, add_cache_control, mark_cache_prefix
 
 # https://platform.openai.com/docs/api-reference/chat/create
 # https://api-docs.deepseek.com/api/create-chat-completion
 class OpenAIBaseClient(BaseClient):
-    """ OpenAI compatible client """
+    """ OpenAI compatible client
+
+    OpenAI、DeepSeek 等服务自动缓存相同的提示词前缀。支持 cache_control 的兼容服务
+    （如 OpenRouter、通义千问）可以配置 cache_prompt = true 显式标记缓存断点。
+    """
     
     def get_params(self):
         params = {'stream_options': {'include_usage': True}}
@@ -27,9 +30,15 @@ class OpenAIBaseClient(BaseClient):
             api_key=self._api_key,
             base_url=self._base_url,
             timeout=self._timeout,
-            http_client=httpx.Client(
-                verify=self._tls_verify
-            )
+            http_client=self._get_http_client()
+        )
+
+    def _create_async_client(self):
+        return openai.AsyncClient(
+            api_key=self._api_key,
+            base_url=self._base_url,
+            timeout=self._timeout,
+            http_client=self._get_async_http_client()
         )
     
     def _parse_usage(self, usage) -> Counter:
@@ -38,30 +47,59 @@ class OpenAIBaseClient(BaseClient):
         except Exception:
             reasoning_tokens = 0
 
-        usage = Counter({'total_tokens': usage.total_tokens,
+        try:
+            cached_tokens = int(usage.prompt_tokens_details.cached_tokens)
+        except Exception:
+            # DeepSeek
+            cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None) or 0
+
+        ret = Counter({'total_tokens': usage.total_tokens,
                 'input_tokens': usage.prompt_tokens,
                 'output_tokens': usage.completion_tokens + reasoning_tokens})
-        return usage
+        if cached_tokens:
+            ret['cached_tokens'] = cached_tokens
+        return ret
+
+    def _prepare_messages(self, messages: list[Dict[str, Any]]) -> list[Dict[str, Any]]:
+        if not self._cache_prompt or not messages:
+            return messages
+        if messages[0]['role'] == MessageRole.SYSTEM and len(messages) > 1:
+            # 系统提示词单独设置断点，压缩对话历史后仍能命中
+            messages = [add_cache_control(messages[0])] + messages[1:]
+        return mark_cache_prefix(messages)
     
+    def _process_chunk(self, chunk, lm) -> Counter | None:
+        """处理一个流式数据块，返回其中的用量"""
+        usage = None
+        if hasattr(chunk, 'usage') and chunk.usage is not None:
+            usage = self._parse_usage(chunk.usage)
+
+        if chunk.choices:
+            content = None
+            delta = chunk.choices[0].delta
+            if delta.content:
+                reason = False
+                content = delta.content
+            elif hasattr(delta, 'reasoning_content') and delta.reasoning_content:
+                reason = True
+                content = delta.reasoning_content
+            if content:
+                lm.process_chunk(content, reason=reason)
+        return usage
+
     def _parse_stream_response(self, response, stream_processor) -> AIMessage:
         usage = Counter()
         with stream_processor as lm:
             for chunk in response:
-                #print(chunk)
-                if hasattr(chunk, 'usage') and chunk.usage is not None:
-                    usage = self._parse_usage(chunk.usage)
-
-                if chunk.choices:
-                    content = None
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        reason = False
-                        content = delta.content
-                    elif hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                        reason = True
-                        content = delta.reasoning_content
-                    if content:
-                        lm.process_chunk(content, reason=reason)
+                usage = self._process_chunk(chunk, lm) or usage
+
+        return AIMessage(role=MessageRole.ASSISTANT, content=lm.content, reason=lm.reason, usage=usage)
+
+    async def _aparse_stream_response(self, response, stream_processor) -> AIMessage:
+        usage = Counter()
+        with stream_processor as lm:
+            async for chunk in response:
+                usage = self._process_chunk(chunk, lm) or usage
 
         return AIMessage(role=MessageRole.ASSISTANT, content=lm.content, reason=lm.reason, usage=usage)
 
@@ -75,20 +113,24 @@ class OpenAIBaseClient(BaseClient):
             usage=self._parse_usage(response.usage)
         )
 
-    def get_completion(self, messages: list[Dict[str, Any]], **kwargs) -> AIMessage:
-        if not self._client:
-            self._client = self._get_client()
-
-        extra_headers = kwargs.get('extra_headers')
-
-        response = self._client.chat.completions.create(
+    def _get_request(self, messages: list[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        return dict(
             model = self._model,
             messages = messages,
             stream=self._stream,
             max_tokens = self.max_tokens,
             temperature = self._temperature,
-            extra_headers = extra_headers,
+            extra_headers = kwargs.get('extra_headers'),
             **self._params
         )
-        return response
+
+    def get_completion(self, messages: list[Dict[str, Any]], **kwargs) -> AIMessage:
+        if not self._client:
+            self._client = self._get_client()
+
+        return self._client.chat.completions.create(**self._get_request(messages, **kwargs))
+
+    async def aget_completion(self, messages: list[Dict[str, Any]], **kwargs):
+        client = self._get_async_client()
+        return await client.chat.completions.create(**self._get_request(messages, **kwargs))
     
\ No newline at end of file
@@ -4,47 +4,83 @@
 from typing import Any, Dict
 from collections import Counter
 
-from .base import BaseClient, MessageRole, AIMessage
+from .base import BaseClient, MessageRole, AIMessage, add_cache_control, mark_cache_prefix
+
+def _cache_usage(usage) -> Counter:
+    """缓存命中和写入的 token 数，计入 input_tokens"""
+    ret = Counter()
+    read = getattr(usage, 'cache_read_input_tokens', None) or 0
+    write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+    if read:
+        ret['cached_tokens'] = read
+    if write:
+        ret['cache_write_tokens'] = write
+    return ret
 
 # https://docs.anthropic.com/en/api/messages
 class ClaudeClient(BaseClient):
     MODEL = "claude-sonnet-4-20250514"
     ENV_API_KEY = "ANTHROPIC_API_KEY"
     #PARAMS = {'thinking': {'type': 'enabled', 'budget_tokens': 1024}}
-
-    def __init__(self, config):
-        super().__init__(config)
-        self._system_prompt = None
+    CACHE_PROMPT = True
 
     def _get_client(self):
         import anthropic
-        return anthropic.Anthropic(api_key=self._api_key, timeout=self._timeout)
+        return anthropic.Anthropic(api_key=self._api_key, timeout=self._timeout, http_client=self._get_http_client())
+
+    def _create_async_client(self):
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=self._api_key, timeout=self._timeout,
+                                        http_client=self._get_async_http_client())
     
     def usable(self):
         return super().usable() and self._api_key
     
     def _parse_usage(self, response):
         usage = response.usage
-        ret = {'input_tokens': usage.input_tokens, 'output_tokens': usage.output_tokens}
+        ret = _cache_usage(usage)
+        # input_tokens 不包含缓存部分，与 OpenAI 的 prompt_tokens 保持一致
+        ret['input_tokens'] = usage.input_tokens + ret['cached_tokens'] + ret['cache_write_tokens']
+        ret['output_tokens'] = usage.output_tokens
         ret['total_tokens'] = ret['input_tokens'] + ret['output_tokens']
         return ret
 
+    def _process_event(self, event, lm, usage: Counter, cache: Counter):
+        """处理一个流式事件，累计用量"""
+        if hasattr(event, 'delta') and hasattr(event.delta, 'text') and event.delta.text:
+            content = event.delta.text
+            lm.process_chunk(content)
+        elif hasattr(event, 'message') and hasattr(event.message, 'usage') and event.message.usage:
+            usage['input_tokens'] += getattr(event.message.usage, 'input_tokens', 0)
+            usage['output_tokens'] += getattr(event.message.usage, 'output_tokens', 0)
+            cache |= _cache_usage(event.message.usage)
+        elif hasattr(event, 'usage') and event.usage:
+            usage['input_tokens'] += getattr(event.usage, 'input_tokens', 0) or 0
+            usage['output_tokens'] += getattr(event.usage, 'output_tokens', 0)
+            # message_delta 中的缓存计数是累计值，取最大值避免重复计算
+            cache |= _cache_usage(event.usage)
+
+    def _stream_message(self, lm, usage: Counter, cache: Counter) -> AIMessage:
+        usage.update(cache)
+        usage['input_tokens'] += cache['cached_tokens'] + cache['cache_write_tokens']
+        usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
+        return AIMessage(content=lm.content, usage=usage)
+
     def _parse_stream_response(self, response, stream_processor):
-        usage = Counter()    
+        usage = Counter()
+        cache = Counter()
         with stream_processor as lm:
             for event in response:
-                if hasattr(event, 'delta') and hasattr(event.delta, 'text') and event.delta.text:
-                    content = event.delta.text
-                    lm.process_chunk(content)
-                elif hasattr(event, 'message') and hasattr(event.message, 'usage') and event.message.usage:
-                    usage['input_tokens'] += getattr(event.message.usage, 'input_tokens', 0)
-                    usage['output_tokens'] += getattr(event.message.usage, 'output_tokens', 0)
-                elif hasattr(event, 'usage') and event.usage:
-                    usage['input_tokens'] += getattr(event.usage, 'input_tokens', 0)
-                    usage['output_tokens'] += getattr(event.usage, 'output_tokens', 0)
+                self._process_event(event, lm, usage, cache)
+        return self._stream_message(lm, usage, cache)
 
-        usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
-        return AIMessage(content=lm.content, usage=usage)
+    async def _aparse_stream_response(self, response, stream_processor):
+        usage = Counter()
+        cache = Counter()
+        with stream_processor as lm:
+            async for event in response:
+                self._process_event(event, lm, usage, cache)
+        return self._stream_message(lm, usage, cache)
 
     def _parse_response(self, response):
         content = response.content[0].text
@@ -52,26 +88,37 @@ class ClaudeClient(BaseClient):
         return AIMessage(role=role, content=content, usage=self._parse_usage(response))
     
     def _prepare_messages(self, messages):
+        if not self._cache_prompt or not messages:
+            return messages
         if messages[0]['role'] == MessageRole.SYSTEM:
-            self._system_prompt = messages[0]['content']
-            messages = messages[1:]
-        return messages
+            # 系统提示词单独设置断点，压缩对话历史后仍能命中
+            return [add_cache_control(messages[0])] + mark_cache_prefix(messages[1:])
+        return mark_cache_prefix(messages)
 
-    def get_completion(self, messages: list[Dict[str, Any]], **kwargs) -> AIMessage:
-        if not self._client:
-            self._client = self._get_client()
-
-        extra_headers = kwargs.get('extra_headers')
-
-        message = self._client.messages.create(
+    def _get_request(self, messages: list[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        # 系统提示词通过 system 参数传递，请求之间不共享状态，可以并发调用
+        request = {}
+        if messages and messages[0]['role'] == MessageRole.SYSTEM:
+            request['system'] = messages[0]['content']
+            messages = messages[1:]
+        request.update(
             model = self._model,
             messages = messages,
             stream=self._stream,
-            system=self._system_prompt,
             max_tokens = self.max_tokens,
             temperature = self._temperature,
-            extra_headers = extra_headers,
+            extra_headers = kwargs.get('extra_headers'),
             **self._params
         )
-        return message
+        return request
+
+    def get_completion(self, messages: list[Dict[str, Any]], **kwargs) -> AIMessage:
+        if not self._client:
+            self._client = self._get_client()
+
+        return self._client.messages.create(**self._get_request(messages, **kwargs))
+
+    async def aget_completion(self, messages: list[Dict[str, Any]], **kwargs):
+        client = self._get_async_client()
+        return await client.messages.create(**self._get_request(messages, **kwargs))
     
\ No newline at end of file
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import time
-import httpx
+import asyncio
 from typing import Optional, Dict
 
 from .base_openai import OpenAIBaseClient
@@ -47,14 +47,15 @@ class OAuth2Client(OpenAIBaseClient):
             'grant_type': 'client_credentials'
         }
 
-        with httpx.Client(timeout=self._timeout, verify=self._tls_verify) as client:
-            response = client.post(
-                self._token_url,
-                data=auth_data
-            )
-            response.raise_for_status()
-            token_data = response.json()
-            self._access_token = token_data['access_token']
+        client = self._get_http_client(self._token_url)
+        response = client.post(
+            self._token_url,
+            data=auth_data,
+            timeout=self._timeout
+        )
+        response.raise_for_status()
+        token_data = response.json()
+        self._access_token = token_data['access_token']
 
         # Calculate expiration time (default to 5 mins if not provided)
         expires_in = token_data.get("expires_in", 300)
@@ -63,7 +64,15 @@ class OAuth2Client(OpenAIBaseClient):
         return self._access_token
         
     def get_completion(self, messages, **kwargs):
-        response = super().get_completion(messages, **kwargs)
-        self._client = None
+        # token 更新后重新创建 OpenAI 客户端，连接池共享不受影响
+        if self._client and self._get_access_token() != self._api_key:
+            self._client = None
+        return super().get_completion(messages, **kwargs)
 
-        return response
+    async def aget_completion(self, messages, **kwargs):
+        token = await asyncio.to_thread(self._get_access_token)
+        if token != self._api_key:
+            self._api_key = token
+            self._client = None
+            self._async_clients.clear()
+        return await super().aget_completion(messages, **kwargs)
@@ -2,16 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import json
-import requests
 
 from .base import BaseClient, AIMessage
 
 # https://github.com/ollama/ollama/blob/main/docs/api.md
 class OllamaClient(BaseClient):
-    def __init__(self, config):
-        super().__init__(config)
-        self._session = requests.Session()
-
     def usable(self):
         return super().usable() and self._base_url
     
@@ -20,18 +15,45 @@ class OllamaClient(BaseClient):
         ret['total_tokens'] = ret['input_tokens'] + ret['output_tokens']
         return ret
 
+    def _process_line(self, line, lm):
+        """处理一行流式数据，结束时返回用量"""
+        if not line:
+            return None
+        msg = json.loads(line)
+        if msg['done']:
+            return self._parse_usage(msg)
+
+        if 'message' in msg and 'content' in msg['message'] and msg['message']['content']:
+            content = msg['message']['content']
+            lm.process_chunk(content)
+        return None
+
     def _parse_stream_response(self, response, stream_processor):
+        usage = {}
         with stream_processor as lm:
-            for chunk in response.iter_lines():
-                chunk = chunk.decode(encoding='utf-8')
-                msg = json.loads(chunk)
-                if msg['done']:
-                    usage = self._parse_usage(msg)
-                    break
+            try:
+                for line in response.iter_lines():
+                    done = self._process_line(line, lm)
+                    if done is not None:
+                        usage = done
+                        break
+            finally:
+                # 连接放回连接池
+                response.close()
 
-                if 'message' in msg and 'content' in msg['message'] and msg['message']['content']:
-                    content = msg['message']['content']
-                    lm.process_chunk(content)
+        return AIMessage(content=lm.content, usage=usage)
+
+    async def _aparse_stream_response(self, response, stream_processor):
+        usage = {}
+        with stream_processor as lm:
+            try:
+                async for line in response.aiter_lines():
+                    done = self._process_line(line, lm)
+                    if done is not None:
+                        usage = done
+                        break
+            finally:
+                await response.aclose()
 
         return AIMessage(content=lm.content, usage=usage)
 
@@ -40,10 +62,10 @@ class OllamaClient(BaseClient):
         msg = response["message"]
         return AIMessage(role=msg['role'], content=msg['content'], usage=self._parse_usage(response))
     
-    def get_completion(self, messages, **kwargs):
+    def _build_request(self, client, messages, **kwargs):
         extra_headers = kwargs.get('extra_headers')
-
-        response = self._session.post(
+        return client.build_request(
+            "POST",
             f"{self._base_url}/api/chat",
             json={
                 "model": self._model,
@@ -55,5 +77,23 @@ class OllamaClient(BaseClient):
             headers=extra_headers,
             **self._params
         )
+
+    def get_completion(self, messages, **kwargs):
+        client = self._get_http_client()
+        request = self._build_request(client, messages, **kwargs)
+        response = client.send(request, stream=self._stream)
+        if response.is_error:
+            response.read()
+            response.close()
+        response.raise_for_status()
+        return response
+
+    async def aget_completion(self, messages, **kwargs):
+        client = self._get_async_http_client()
+        request = self._build_request(client, messages, **kwargs)
+        response = await client.send(request, stream=self._stream)
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
         response.raise_for_status()
         return response
@@ -8,6 +8,9 @@ from .client_claude import ClaudeClient
 from .client_ollama import OllamaClient
 from .client_oauth2 import OAuth2Client
 from .models import ModelRegistry
+from .transport import get_http_pool
+from .ratelimit import RateLimitConfig
+from .router import LLMRouter, RouterConfig
 
 class OpenAIClient(OpenAIBaseClient): 
     MODEL = 'gpt-4o'
@@ -42,7 +45,13 @@ class AzureOpenAIClient(OpenAIBaseClient):
     
     def _get_client(self):
         from openai import AzureOpenAI
-        return AzureOpenAI(azure_endpoint=self._end_point, api_key=self._api_key, api_version="2024-02-01")
+        return AzureOpenAI(azure_endpoint=self._end_point, api_key=self._api_key, api_version="2024-02-01",
+                           http_client=self._get_http_client(self._end_point))
+
+    def _create_async_client(self):
+        from openai import AsyncAzureOpenAI
+        return AsyncAzureOpenAI(azure_endpoint=self._end_point, api_key=self._api_key, api_version="2024-02-01",
+                                http_client=self._get_async_http_client(self._end_point))
 
 class DoubaoClient(OpenAIBaseClient): 
     BASE_URL = 'https://ark.cn-beijing.volces.com/api/v3'
@@ -79,14 +88,18 @@ CLIENTS = {
 class ClientManager(object):
     MAX_TOKENS = 8192
 
-    def __init__(self, settings: dict, max_tokens: int | None = None):
+    def __init__(self, settings: dict, max_tokens: int | None = None, http_pool: dict | None = None,
+                 router: dict | None = None):
+        if http_pool:
+            get_http_pool().configure(**http_pool)
         self.clients = {}
         self.default = None
         self.current = None
         self.max_tokens = max_tokens or self.MAX_TOKENS
         self.log = logger.bind(src='client_manager')
-        self.names = self._init_clients(settings)
         self.model_registry = ModelRegistry(__respath__ / "models.yaml")
+        self.names = self._init_clients(settings)
+        self.router = LLMRouter(self.clients, RouterConfig(**(router or {})))
         
     def _create_client(self, config):
         kind = config.get("type", "openai")
@@ -119,6 +132,7 @@ class ClientManager(object):
             names['enabled'].add(name)
             if not client.max_tokens:
                 client.max_tokens = self.max_tokens
+            client.set_rate_limit(self._get_rate_limit(client, config))
             self.clients[name] = client
 
             if config.get('default', False) and not self.default:
@@ -133,6 +147,17 @@ class ClientManager(object):
         self.current = self.default
         return names
 
+    def _get_rate_limit(self, client, config) -> RateLimitConfig:
+        """客户端配置的 rpm/tpm，未配置时不限制（各账号的额度不同，不设默认值）"""
+        limits = {}
+        for key in ('rpm', 'tpm'):
+            if key in config:
+                limits[key] = config[key]
+        retry = config.get('rate_limit_retries')
+        if retry is not None:
+            limits['max_retries'] = retry
+        return RateLimitConfig(**limits)
+
     def __len__(self):
         return len(self.clients)
     
@@ -151,6 +176,22 @@ class ClientManager(object):
 
     def get_client(self, name):
         return self.clients.get(name)
+
+    def call(self, client, messages, stream_processor=None, **kwargs):
+        """通过路由调用 client，失败时重试、转移到备用客户端或发送对冲请求"""
+        return self.router(client, messages, stream_processor=stream_processor, **kwargs)
+
+    async def acall(self, client, messages, stream_processor=None, **kwargs):
+        """call 的异步版本，经过相同的路由"""
+        return await self.router.acall(client, messages, stream_processor=stream_processor, **kwargs)
+
+    def get_http_stats(self):
+        """共享连接池的连接统计"""
+        return get_http_pool().get_stats()
+
+    def get_rate_limit_stats(self):
+        """各客户端的排队和限流统计"""
+        return {name: dict(client.rate_limiter.stats) for name, client in self.clients.items() if client.rate_limiter}
     
     def to_records(self):
         LLMRecord = namedtuple('LLMRecord', ['Name', 'Model', 'Max_Tokens', 'Base_URL'])
@@ -161,4 +202,6 @@ class ClientManager(object):
     
     def get_model_info(self, model: str):
         return self.model_registry.get_model_info(model)
-    
\ No newline at end of file
+    
+    def get_tokenizer(self, model: str):
+        return self.model_registry.get_tokenizer(model.rsplit('/', 1)[-1])
@@ -37,6 +37,11 @@ class ModelInfo:
     def has_capability(self, cap: ModelCapability) -> bool:
         return cap in self.capabilities
 
+# 未在 models.yaml 中指定 tokenizer 时按厂商选择的 tiktoken 编码
+DEFAULT_TOKENIZERS = {
+    'OpenAI': 'o200k_base',
+}
+
 class ModelRegistry:
     def __init__(self, config_path: str):
         self.models: Dict[str, ModelInfo] = {}
@@ -68,6 +73,14 @@ class ModelRegistry:
         main_name = self.alias_map.get(model_name, model_name)
         return self.models.get(main_name)
 
+    def get_tokenizer(self, model_name: str) -> Optional[str]:
+        """返回模型使用的 tiktoken 编码名称，未知时返回 None"""
+        info = self.get_model_info(model_name)
+        if not info:
+            return None
+        extra = info.extra or {}
+        return extra.get('tokenizer') or DEFAULT_TOKENIZERS.get(info.company)
+
     def get_models_by_company(self, company: str) -> Dict[str, ModelInfo]:
         return {k: v for k, v in self.models.items() if v.company == company}
 
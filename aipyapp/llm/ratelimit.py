@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""LLM 客户端的请求速率限制
+
+每个客户端一个 RateLimiter，同一客户端的所有任务共用。请求按令牌桶排队进入：
+RPM 桶每个请求消耗 1，TPM 桶按估算的 token 数消耗，响应返回后按实际用量修正。
+服务端返回 429 时按 Retry-After（没有时指数退避）暂停整个客户端后重试。
+"""
+
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# 按字符数估算 token 数
+CHARS_PER_TOKEN = 4
+
+@dataclass
+class RateLimitConfig:
+    """速率限制配置，rpm/tpm 为空表示不限制"""
+    rpm: Optional[int] = None          # 每分钟请求数
+    tpm: Optional[int] = None          # 每分钟 token 数
+    max_retries: int = 3               # 429 后的最大重试次数
+    backoff: float = 1.0               # 没有 Retry-After 时的初始退避时间（秒）
+    max_backoff: float = 60.0          # 最长退避时间（秒）
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rpm or self.tpm)
+
+class TokenBucket:
+    """
+    令牌桶
+
+    预约式实现：令牌可以透支，透支部分按速率换算成等待时间，先到的请求先被放行。
+    """
+
+    def __init__(self, per_minute: float, now: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数"""
+        self._refill(now)
+        # 单个请求超过桶容量时按容量计算，否则永远无法放行
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float, now: float) -> None:
+        """归还（amount 为负数时追加扣除）令牌"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """按字符数粗略估算请求的输入 token 数"""
+    chars = 0
+    for message in messages:
+        content = message.get('content') if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(item.get('text') or '') for item in content if isinstance(item, dict))
+    return chars // CHARS_PER_TOKEN + 1
+
+def billable_tokens(usage: Dict[str, Any]) -> int:
+    """计入 TPM 的 token 数：未命中缓存的输入加输出，缓存读取的部分不计入"""
+    input_tokens = usage.get('input_tokens', 0) or 0
+    cached_tokens = usage.get('cached_tokens', 0) or 0
+    output_tokens = usage.get('output_tokens', 0) or 0
+    return max(input_tokens - cached_tokens, 0) + output_tokens
+
+def get_status_code(e: Exception) -> Optional[int]:
+    """异常对应的 HTTP 状态码，网络错误等没有响应时返回 None"""
+    status = getattr(e, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def get_retry_after(e: Exception) -> Optional[float]:
+    """从异常的响应头中读取 Retry-After（秒），没有时返回 None"""
+    headers = getattr(getattr(e, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value:
+            return float(value) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+    except Exception:
+        return None
+
+def is_rate_limited(e: Exception) -> bool:
+    """请求是否因为超过速率限制被拒绝"""
+    return get_status_code(e) == 429
+
+class RateLimiter:
+    """单个 LLM 客户端的请求调度器，线程和协程都可以使用"""
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self.log = logger.bind(src='RateLimiter')
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(config.rpm) if config.rpm else None
+        self._tokens = TokenBucket(config.tpm) if config.tpm else None
+        # 收到 429 后暂停到这个时间点
+        self._paused_until = 0.0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'waited': 0.0}
+
+    def reserve(self, tokens: int) -> float:
+        """预约一次请求，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            self.stats['requests'] += 1
+            self.stats['waited'] += wait
+            return wait
+
+    def acquire(self, tokens: int) -> None:
+        """等待到可以发送请求"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.log.debug('Waiting for rate limit', wait=round(wait, 3))
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.log.debug('Waiting for rate limit', wait=round(wait, 3))
+            await asyncio.sleep(wait)
+
+    def record_usage(self, reserved: int, used: int) -> None:
+        """按实际用量修正 TPM 令牌桶"""
+        if not self._tokens or not used:
+            return
+        with self._lock:
+            self._tokens.refund(reserved - used, time.monotonic())
+
+    def backoff(self, e: Exception, attempt: int) -> Optional[float]:
+        """
+        请求失败后计算重试等待时间
+
+        Returns:
+            等待秒数，不是 429 或超过重试次数时返回 None
+        """
+        if not is_rate_limited(e) or attempt >= self.config.max_retries:
+            return None
+        delay = get_retry_after(e)
+        if delay is None:
+            delay = self.config.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+        delay = min(max(delay, 0.0), self.config.max_backoff)
+        with self._lock:
+            # 同一客户端的其它请求也暂停，避免继续触发 429
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.stats['rate_limited'] += 1
+        self.log.warning('Rate limited', attempt=attempt + 1, delay=round(delay, 3))
+        return delay
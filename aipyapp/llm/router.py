@@ -0,0 +1,313 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""LLM 请求路由：重试、故障转移和对冲请求
+
+- 重试：网络错误、超时、429 和 5xx 按带随机抖动的指数退避重试
+- 故障转移：客户端配置 backup 后，重试用尽或服务端返回其它错误时改用备用客户端
+- 对冲请求：客户端配置 hedge_ms 后，超过这个时间还没有收到第一个 token 时，
+  向备用客户端（没有时为同一客户端）发送相同的请求，先返回 token 的一方胜出，另一方被取消。
+  各尝试在后台线程中执行，胜出一方对流式处理器的调用转交发起请求的线程执行，
+  流式事件仍在调用者的线程上发出
+"""
+
+import sys
+import time
+import queue
+import asyncio
+import random
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+from loguru import logger
+
+from .base import BaseClient, AIMessage, ErrorMessage
+from .ratelimit import get_status_code, is_rate_limited
+
+@dataclass
+class RouterConfig:
+    """路由配置"""
+    max_retries: int = 2          # 同一客户端的最大重试次数
+    backoff: float = 0.5          # 初始退避时间（秒）
+    max_backoff: float = 10.0     # 最长退避时间（秒）
+    hedge_ms: int = 0             # 默认的对冲等待时间（毫秒），0 表示不对冲
+
+class HedgeCancelled(Exception):
+    """对冲请求中落败的一方被取消"""
+
+class _Streamed(Exception):
+    """已经输出内容后请求失败"""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+def _transport_errors() -> tuple:
+    errors = [httpx.TransportError, openai.APIConnectionError, ConnectionError, TimeoutError]
+    # anthropic 按需导入，抛出它的异常时模块一定已经加载
+    anthropic = sys.modules.get('anthropic')
+    if anthropic:
+        errors.append(anthropic.APIConnectionError)
+    return tuple(errors)
+
+def is_retryable(e: Exception) -> bool:
+    """
+    网络错误、超时、429 和 5xx 可以重试
+
+    其它 4xx 错误重试也不会成功；没有 HTTP 状态码的异常只有连接和超时错误可以重试，
+    参数错误、认证配置错误和程序错误直接返回。
+    """
+    status = get_status_code(e)
+    if status is None:
+        return isinstance(e, _transport_errors())
+    return status in (408, 409, 429) or status >= 500
+
+def is_local_error(e: Exception) -> bool:
+    """不是服务端返回的错误（参数、配置或程序错误），换客户端也不会成功"""
+    return get_status_code(e) is None and not is_retryable(e)
+
+class _Race:
+    """一次请求的多个尝试，第一个返回 token 或完成的尝试胜出"""
+
+    def __init__(self, stream_processor):
+        self.target = stream_processor
+        self.lock = threading.Lock()
+        self.winner = None
+        # 有尝试胜出或结束时设置
+        self.settled = threading.Event()
+        # 对冲时由发起请求的线程执行对原处理器的调用
+        self.calls: Optional[queue.Queue] = None
+
+    def claim(self, attempt) -> bool:
+        with self.lock:
+            won = self.winner is None
+            if won:
+                self.winner = attempt
+            self.settled.set()
+        # 只有胜出的尝试会进入这里，不需要持有锁
+        if won and self.target:
+            self.call(self.target.__enter__)
+        return self.winner is attempt
+
+    def call(self, func, *args, **kwargs):
+        """调用原处理器的方法，对冲时转交发起请求的线程执行并等待结果"""
+        if self.calls is None:
+            return func(*args, **kwargs)
+        future = Future()
+        self.calls.put(('call', (func, args, kwargs, future)))
+        return future.result()
+
+class _Attempt:
+    """
+    一个尝试使用的流式处理器
+
+    胜出后把数据转发给原来的处理器，落败时在下一个数据块抛出 HedgeCancelled 结束请求。
+    原来的处理器在收到第一个 token（或请求成功结束）后才进入，
+    失败的尝试不会向它发送任何事件，重试时不会重复输出。
+    """
+
+    def __init__(self, race: _Race, client: BaseClient):
+        self.race = race
+        self.client = client
+
+    @property
+    def content(self):
+        return self.race.target.content
+
+    @property
+    def reason(self):
+        return getattr(self.race.target, 'reason', None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.race.claim(self)
+        if self.race.winner is self:
+            self.race.call(self.race.target.__exit__, exc_type, exc_val, exc_tb)
+
+    def process_chunk(self, content, *, reason=False):
+        if not self.race.claim(self):
+            raise HedgeCancelled()
+        self.race.call(self.race.target.process_chunk, content, reason=reason)
+
+class LLMRouter:
+    """按客户端配置的 backup / hedge_ms 路由请求"""
+
+    def __init__(self, clients: Dict[str, BaseClient], config: Optional[RouterConfig] = None):
+        self.clients = clients
+        self.config = config or RouterConfig()
+        self.log = logger.bind(src='LLMRouter')
+
+    def get_backup(self, client: BaseClient) -> Optional[BaseClient]:
+        name = client.config.get('backup')
+        backup = self.clients.get(name) if name else None
+        if name and not backup:
+            self.log.warning('Backup client not found', client=client.name, backup=name)
+        return backup if backup is not client else None
+
+    def get_hedge_delay(self, client: BaseClient) -> float:
+        """对冲等待时间（秒），0 表示不对冲"""
+        return (client.config.get('hedge_ms') or self.config.hedge_ms or 0) / 1000
+
+    def _delay(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.config.max_backoff, self.config.backoff * (2 ** attempt)))
+
+    def __call__(self, client: BaseClient, messages: List[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage | ErrorMessage:
+        """
+        发送请求，失败时重试并转移到备用客户端
+
+        已经向 stream_processor 输出内容后出错时不再重试，避免重复输出。
+        """
+        backup = self.get_backup(client)
+        error = None
+        for current in self._candidates(client, backup):
+            for attempt in range(self.config.max_retries + 1):
+                try:
+                    return self._send(current, backup, messages, stream_processor, **kwargs)
+                except _Streamed as e:
+                    return self._streamed_error(current, e)
+                except Exception as e:
+                    error = e
+                    if is_local_error(e):
+                        self.log.error('LLM request failed', client=current.name, error=str(e))
+                        return ErrorMessage(content=str(e))
+                    delay = self._retry_delay(current, e, attempt)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+        return ErrorMessage(content=str(error))
+
+    async def acall(self, client: BaseClient, messages: List[Dict[str, Any]], stream_processor=None, **kwargs) -> AIMessage | ErrorMessage:
+        """__call__ 的异步版本，重试和故障转移规则相同"""
+        backup = self.get_backup(client)
+        error = None
+        for current in self._candidates(client, backup):
+            for attempt in range(self.config.max_retries + 1):
+                try:
+                    return await self._asend(current, backup, messages, stream_processor, **kwargs)
+                except _Streamed as e:
+                    return self._streamed_error(current, e)
+                except Exception as e:
+                    error = e
+                    if is_local_error(e):
+                        self.log.error('LLM request failed', client=current.name, error=str(e))
+                        return ErrorMessage(content=str(e))
+                    delay = self._retry_delay(current, e, attempt)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+        return ErrorMessage(content=str(error))
+
+    def _candidates(self, client: BaseClient, backup: Optional[BaseClient]):
+        yield client
+        if backup:
+            self.log.warning('Failover to backup client', client=client.name, backup=backup.name)
+            yield backup
+
+    def _streamed_error(self, client: BaseClient, e: _Streamed) -> ErrorMessage:
+        self.log.error('LLM request failed after streaming', client=client.name, error=str(e.error))
+        return ErrorMessage(content=str(e.error))
+
+    def _retry_delay(self, client: BaseClient, e: Exception, attempt: int) -> Optional[float]:
+        """重试前等待的秒数，不能再重试这个客户端时返回 None"""
+        # 启用速率限制的客户端已经处理过 429
+        if not is_retryable(e) or (is_rate_limited(e) and client.rate_limiter):
+            self.log.error('LLM request failed', client=client.name, error=str(e))
+            return None
+        if attempt == self.config.max_retries:
+            self.log.error('LLM request failed, retries exhausted', client=client.name, error=str(e))
+            return None
+        delay = self._delay(attempt)
+        self.log.warning('Retry LLM request', client=client.name, attempt=attempt + 1,
+                         delay=round(delay, 3), error=str(e))
+        return delay
+
+    def _send(self, client: BaseClient, backup: Optional[BaseClient], messages, stream_processor, **kwargs) -> AIMessage:
+        hedge_delay = self.get_hedge_delay(client)
+        race = _Race(stream_processor)
+        if not hedge_delay:
+            attempt = _Attempt(race, client) if stream_processor else None
+            try:
+                return client.send(messages, stream_processor=attempt, **kwargs)
+            except Exception as e:
+                # 已经向原来的处理器输出过事件，重试会重复输出
+                if race.winner is not None:
+                    raise _Streamed(e)
+                raise
+        return self._hedge(race, client, backup or client, hedge_delay, messages, **kwargs)
+
+    async def _asend(self, client: BaseClient, backup: Optional[BaseClient], messages, stream_processor, **kwargs) -> AIMessage:
+        # 对冲请求和没有原生异步实现的客户端在线程中执行
+        if self.get_hedge_delay(client) or not client.supports_async:
+            return await asyncio.to_thread(self._send, client, backup, messages, stream_processor, **kwargs)
+        race = _Race(stream_processor)
+        attempt = _Attempt(race, client) if stream_processor else None
+        try:
+            return await client.asend(messages, stream_processor=attempt, **kwargs)
+        except Exception as e:
+            if race.winner is not None:
+                raise _Streamed(e)
+            raise
+
+    def _hedge(self, race: _Race, primary: BaseClient, secondary: BaseClient, delay: float, messages, **kwargs) -> AIMessage:
+        # 尝试在后台线程中执行，它们的结果和对原处理器的调用都经过这个队列回到当前线程
+        events = race.calls = queue.Queue()
+
+        def run(attempt: _Attempt):
+            try:
+                stream_processor = attempt if race.target else None
+                msg = attempt.client.send(messages, stream_processor=stream_processor, **kwargs)
+                if race.target is None:
+                    race.claim(attempt)
+                events.put(('result', (attempt, msg, None)))
+            except Exception as e:
+                events.put(('result', (attempt, None, e)))
+            finally:
+                race.settled.set()
+
+        attempts = [_Attempt(race, primary)]
+        threading.Thread(target=run, args=(attempts[0],), daemon=True).start()
+        # 胜出前不会有转交的调用，这里只需等待
+        if not race.settled.wait(delay):
+            self.log.info('Hedge LLM request', client=primary.name, hedge=secondary.name, delay=delay)
+            attempts.append(_Attempt(race, secondary))
+            threading.Thread(target=run, args=(attempts[1],), daemon=True).start()
+
+        error = None
+        pending = len(attempts)
+        while pending:
+            kind, item = events.get()
+            if kind == 'call':
+                self._run_call(*item)
+                continue
+            pending -= 1
+            attempt, msg, e = item
+            if attempt is race.winner:
+                if msg is not None:
+                    if len(attempts) > 1:
+                        self.log.info('Hedged request won', client=attempt.client.name, primary=attempt is attempts[0])
+                    return msg
+                if race.target:
+                    raise _Streamed(e)
+            if e is not None and not isinstance(e, HedgeCancelled):
+                error = e
+            elif msg is not None and race.claim(attempt):
+                return msg
+        raise error or RuntimeError('All hedged requests failed')
+
+    @staticmethod
+    def _run_call(func, args, kwargs, future: Future) -> None:
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            # 让等待的尝试结束，KeyboardInterrupt 等继续向上抛出
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
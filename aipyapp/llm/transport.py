@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""进程内共享的 HTTP 连接池
+
+所有 LLM 客户端通过 get_http_pool() 获取 httpx.Client，同一主机复用长连接，避免每次请求重新握手。
+每个 (主机, tls_verify) 使用一个独立的 httpx.Client，连接数上限即为每个主机的上限。
+异步请求使用 httpx.AsyncClient，连接与事件循环绑定，每个事件循环单独创建。
+"""
+
+import asyncio
+import threading
+import weakref
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+@dataclass
+class PoolConfig:
+    """连接池配置"""
+    max_connections: int = 20             # 每个主机的最大连接数
+    max_keepalive_connections: int = 10   # 每个主机保持的空闲连接数
+    keepalive_expiry: float = 60.0        # 空闲连接的保持时间（秒）
+    http2: bool = True                    # 安装 h2 后使用 HTTP/2
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _host_key(url: Optional[str]) -> str:
+    if not url:
+        return ''
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'.lower()
+
+class HttpPool:
+    """按主机共享 httpx.Client 的连接池"""
+
+    def __init__(self, config: Optional[PoolConfig] = None):
+        self.config = config or PoolConfig()
+        self.log = logger.bind(src='HttpPool')
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, bool], httpx.Client] = {}
+        # 事件循环 -> {(主机, tls_verify): httpx.AsyncClient}
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._requests: Counter = Counter()
+        self._http2 = self.config.http2 and _http2_available()
+
+    def configure(self, **kwargs) -> None:
+        """更新配置，已创建的连接在 close() 之前继续使用"""
+        fields = asdict(self.config)
+        unknown = set(kwargs) - set(fields)
+        if unknown:
+            self.log.warning('Unknown http pool options', options=sorted(unknown))
+        fields.update({k: v for k, v in kwargs.items() if k in fields})
+        self.config = PoolConfig(**fields)
+        self._http2 = self.config.http2 and _http2_available()
+
+    def get_client(self, base_url: Optional[str] = None, verify: bool = True) -> httpx.Client:
+        """
+        获取连接到 base_url 所在主机的共享 httpx.Client
+
+        不同主机使用不同的 httpx.Client，请求仍可以发往任意 URL。
+        超时由调用方在每个请求上设置。
+        """
+        key = (_host_key(base_url), bool(verify))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = self._create_client(key)
+                self._clients[key] = client
+            return client
+
+    def get_async_client(self, base_url: Optional[str] = None, verify: bool = True) -> httpx.AsyncClient:
+        """获取当前事件循环中连接到 base_url 所在主机的共享 httpx.AsyncClient"""
+        loop = asyncio.get_running_loop()
+        key = (_host_key(base_url), bool(verify))
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None or client.is_closed:
+                client = self._create_client(key, asynchronous=True)
+                clients[key] = client
+            return client
+
+    def _limits(self) -> httpx.Limits:
+        config = self.config
+        return httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        )
+
+    def _create_client(self, key: Tuple[str, bool], asynchronous: bool = False):
+        host, verify = key
+
+        def count():
+            with self._lock:
+                self._requests[key] += 1
+
+        def on_request(request: httpx.Request):
+            count()
+
+        async def on_async_request(request: httpx.Request):
+            count()
+
+        self.log.info('Create http client', host=host or '*', verify=verify, http2=self._http2, asynchronous=asynchronous)
+        if asynchronous:
+            return httpx.AsyncClient(verify=verify, limits=self._limits(), http2=self._http2,
+                                     timeout=None, event_hooks={'request': [on_async_request]})
+        return httpx.Client(verify=verify, limits=self._limits(), http2=self._http2,
+                            timeout=None, event_hooks={'request': [on_request]})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各主机的请求数和连接数"""
+        hosts = {}
+        with self._lock:
+            items = list(self._clients.items())
+            for clients in self._async_clients.values():
+                items.extend(clients.items())
+            requests = dict(self._requests)
+        for key, client in items:
+            host, verify = key
+            name = host or '*'
+            if not verify:
+                name = f'{name} (no verify)'
+            connections = self._connections(client)
+            stats = hosts.setdefault(name, {'requests': requests.get(key, 0), 'connections': 0, 'idle': 0, 'http2': 0})
+            stats['connections'] += len(connections)
+            stats['idle'] += sum(1 for conn in connections if conn.is_idle())
+            stats['http2'] += sum(1 for conn in connections if 'HTTP/2' in conn.info())
+        return {
+            'http2': self._http2,
+            'max_connections': self.config.max_connections,
+            'max_keepalive_connections': self.config.max_keepalive_connections,
+            'hosts': hosts,
+        }
+
+    def _connections(self, client) -> list:
+        # httpx 没有公开连接池状态，读取 httpcore 连接池
+        pool = getattr(getattr(client, '_transport', None), '_pool', None)
+        return list(getattr(pool, 'connections', []))
+
+    def close(self) -> None:
+        """关闭所有同步连接，异步连接随事件循环释放"""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的异步连接"""
+        with self._lock:
+            clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+_pool = HttpPool()
+
+def get_http_pool() -> HttpPool:
+    """进程内共享的连接池"""
+    return _pool
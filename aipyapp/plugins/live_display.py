@@ -23,8 +23,8 @@ class LiveDisplay:
         self.live.__exit__(exc_type, exc_val, exc_tb)
         self.live = None
 
-    def update_display(self, lines, reason=False):
-        """更新显示内容"""
+    def update_display(self, lines, reason=False, partial=None):
+        """更新显示内容，partial 为尚未结束的一行"""
         if self.quiet: 
             return
         
@@ -43,5 +43,9 @@ class LiveDisplay:
             self.display_lines.pop(0)
             
         # 更新显示
-        display_content = '\n'.join(self.display_lines)
+        display_lines = self.display_lines
+        if partial:
+            display_lines = display_lines[1:] if len(display_lines) >= self.max_lines else display_lines
+            display_lines = display_lines + [partial]
+        display_content = '\n'.join(display_lines)
         self.live.update(Text(display_content, style="dim color(240)"), refresh=True) 
\ No newline at end of file
@@ -128,7 +128,8 @@ class DisplayAgent(RichDisplayPlugin):
         self._add_message('stream', {
             'llm': event.typed_event.llm,
             'lines': event.typed_event.lines,
-            'reason': event.typed_event.reason
+            'reason': event.typed_event.reason,
+            'partial': event.typed_event.partial
         })
 
     def on_parse_reply_completed(self, event: TypedEvent):
@@ -100,7 +100,7 @@ class DisplayClassic(RichDisplayPlugin):
         lines = event.typed_event.lines
         reason = event.typed_event.reason
         if self.live_display:
-            self.live_display.update_display(lines, reason=reason)
+            self.live_display.update_display(lines, reason=reason, partial=event.typed_event.partial)
 
     @staticmethod
     def convert_front_matter(md_text: str) -> str:
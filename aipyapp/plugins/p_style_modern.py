@@ -90,7 +90,7 @@ class DisplayModern(RichDisplayPlugin):
         reason = event.typed_event.reason
         
         if self.live_display:
-            self.live_display.update_display(lines, reason=reason)
+            self.live_display.update_display(lines, reason=reason, partial=event.typed_event.partial)
         
     def on_response_completed(self, event):
         """LLM 响应完成事件处理"""
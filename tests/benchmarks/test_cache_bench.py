@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+KVCache 性能基准测试
+
+运行: pytest tests/benchmarks -m slow -s
+"""
+
+import time
+
+import pytest
+
+from aipyapp.aipy.cache import KVCache
+
+N = 500
+
+
+def _ops_per_sec(func, n=N) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return n / (time.perf_counter() - start)
+
+
+def _bench(cache: KVCache) -> dict:
+    value = [{'name': f'tool{i}', 'description': 'x' * 200} for i in range(10)]
+    return {
+        'set': _ops_per_sec(lambda i: cache.set(f'key:{i}', value)),
+        'get': _ops_per_sec(lambda i: cache.get(f'key:{i}')),
+        'ttl': _ops_per_sec(lambda i: cache.ttl(f'key:{i}')),
+        'delete': _ops_per_sec(lambda i: cache.delete(f'key:{i}')),
+    }
+
+
+@pytest.mark.slow
+def test_pooled_vs_plain(tmp_path):
+    """对比每次新建连接与常驻连接池的 ops/sec"""
+    plain = _bench(KVCache(str(tmp_path / 'plain.db')))
+    pooled_cache = KVCache(str(tmp_path / 'pooled.db'), pooled=True)
+    pooled = _bench(pooled_cache)
+    pooled_cache.close()
+
+    print()
+    print(f"{'op':<8}{'plain':>12}{'pooled':>12}{'speedup':>10}")
+    for op in plain:
+        print(f"{op:<8}{plain[op]:>12.0f}{pooled[op]:>12.0f}{pooled[op] / plain[op]:>9.1f}x")
+
+    assert pooled['get'] > plain['get']
+
+
+@pytest.mark.slow
+def test_set_many_vs_loop(tmp_path):
+    """对比逐条写入与单事务批量写入（模拟 48 个 MCP 服务器的工具列表）"""
+    value = [{'name': f'tool{i}', 'description': 'x' * 200} for i in range(10)]
+    items = {f'mcp_tool:server{i}': value for i in range(48)}
+
+    loop_cache = KVCache(str(tmp_path / 'loop.db'))
+    start = time.perf_counter()
+    for key, tools in items.items():
+        loop_cache.set(key, tools)
+    loop_time = time.perf_counter() - start
+
+    batch_cache = KVCache(str(tmp_path / 'batch.db'))
+    start = time.perf_counter()
+    batch_cache.set_many(items)
+    batch_time = time.perf_counter() - start
+
+    print()
+    print(f"loop: {loop_time * 1000:.1f}ms  set_many: {batch_time * 1000:.1f}ms")
+    assert batch_cache.get_many(items) == items
+
+
+def _tool_list(n_tools=40):
+    """构造接近真实 MCP 工具列表的数据（嵌套 inputSchema）"""
+    tools = []
+    for i in range(n_tools):
+        properties = {
+            f'param_{j}': {
+                'type': 'object',
+                'title': f'Param {j}',
+                'description': '参数说明 ' * 8,
+                'properties': {
+                    'value': {'type': 'string', 'enum': [f'v{k}' for k in range(6)]},
+                    'limit': {'type': 'integer', 'minimum': 0, 'maximum': 100},
+                },
+                'required': ['value'],
+            }
+            for j in range(8)
+        }
+        tools.append({
+            'name': f'tool_{i}',
+            'id': f'server.tool_{i}',
+            'server': 'server',
+            'description': 'Tool description. ' * 10,
+            'inputSchema': {
+                'type': 'object',
+                'title': f'tool_{i}Arguments',
+                'properties': properties,
+                'required': list(properties)[:3],
+                'additionalProperties': False,
+                '$schema': 'http://json-schema.org/draft-07/schema#',
+            },
+        })
+    return tools
+
+
+@pytest.mark.slow
+def test_codec_micro_benchmark(tmp_path):
+    """对比不同编解码器在工具列表上的编码、解码速度与体积"""
+    from aipyapp.aipy.cache import get_codec
+
+    payload = _tool_list()
+    codecs = ['json', 'json+zlib', 'pickle', 'pickle+zlib']
+    for optional in ('msgpack', 'msgpack+zlib', 'pickle+zstd'):
+        try:
+            get_codec(optional)
+            codecs.append(optional)
+        except ValueError:
+            pass
+
+    n = 200
+    print()
+    print(f"{'codec':<14}{'bytes':>10}{'dumps/s':>10}{'loads/s':>10}{'get/s':>10}")
+    for name in codecs:
+        codec = get_codec(name)
+        data = codec.dumps(payload)
+        dumps = _ops_per_sec(lambda i: codec.dumps(payload), n)
+        loads = _ops_per_sec(lambda i: codec.loads(data), n)
+
+        cache = KVCache(str(tmp_path / f'{name}.db'), pooled=True, codec=name)
+        cache.set('tools', payload)
+        get = _ops_per_sec(lambda i: cache.get('tools'), n)
+        cache.close()
+
+        assert codec.loads(data) == payload
+        print(f"{name:<14}{len(data):>10}{dumps:>10.0f}{loads:>10.0f}{get:>10.0f}")
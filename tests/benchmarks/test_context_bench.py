@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上下文压缩策略性能基准测试
+
+运行: pytest tests/benchmarks -m slow -s
+"""
+
+import time
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import ContextConfig, ContextData, ImportanceFilterStrategy, DefaultTokenEstimator
+
+
+def _context(n: int):
+    storage = MessageStorage()
+    messages, tokens = [], []
+    for i in range(n):
+        cls = UserMessage if i % 2 == 0 else AIMessage
+        messages.append(storage.store(cls(content=f'message {i} ' + 'x' * (i % 500))))
+        tokens.append(10 + i % 125)
+    data = ContextData()
+    data.set_messages(messages, tokens)
+    return storage, data
+
+
+def _legacy_compress(strategy: ImportanceFilterStrategy, data: ContextData):
+    """改造前的实现：排序后用 list.index 恢复原始顺序"""
+    messages = data.messages
+    scored = [(strategy._calculate_importance_score(msg, i, len(messages)), msg, count)
+              for i, (msg, count) in enumerate(zip(messages, data.tokens))]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    preserved, preserved_tokens = [], 0
+    for _, msg, count in scored:
+        if preserved_tokens + count <= strategy.config.max_tokens:
+            preserved.append((msg, count))
+            preserved_tokens += count
+        else:
+            break
+    preserved.sort(key=lambda x: messages.index(x[0]))
+    data.set_messages([msg for msg, _ in preserved], [count for _, count in preserved])
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('n', [1000, 10000])
+def test_importance_filter_scaling(n):
+    """对比 1k/10k 条消息时新旧重要性过滤的耗时"""
+    results = {}
+    for name in ('legacy', 'heap'):
+        storage, data = _context(n)
+        config = ContextConfig(max_tokens=data.total_tokens // 2, compression_ratio=0.0)
+        strategy = ImportanceFilterStrategy(storage, config, DefaultTokenEstimator())
+        start = time.perf_counter()
+        if name == 'legacy':
+            _legacy_compress(strategy, data)
+        else:
+            strategy.compress(data)
+        results[name] = (time.perf_counter() - start, len(data.messages), data.total_tokens)
+
+    print()
+    print(f"{'n':<8}{'impl':<8}{'seconds':>10}{'kept':>8}{'tokens':>10}")
+    for name, (elapsed, kept, tokens) in results.items():
+        print(f"{n:<8}{name:<8}{elapsed:>10.4f}{kept:>8}{tokens:>10}")
+
+    assert results['heap'][2] >= results['legacy'][2]
+    if n >= 10000:
+        assert results['heap'][0] < results['legacy'][0]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+流式行接收性能基准测试
+
+运行: pytest tests/benchmarks -m slow -s
+"""
+
+import time
+
+import pytest
+
+from aipyapp.aipy.client import LineReceiver
+
+
+class LegacyLineReceiver(list):
+    """改造前的实现：字符串累加后查找换行"""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = ""
+
+    def feed(self, data: str):
+        self.buffer += data
+        new_lines = []
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            if line:
+                self.append(line)
+                new_lines.append(line)
+        return new_lines
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('size', [20_000, 100_000])
+def test_long_line(size):
+    """对比单行长文本按 4 个字符分块时新旧实现的耗时"""
+    text = 'x' * size + '\n'
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+    results = {}
+    for name, cls in (('legacy', LegacyLineReceiver), ('parts', LineReceiver)):
+        lr = cls()
+        start = time.perf_counter()
+        for chunk in chunks:
+            lr.feed(chunk)
+        results[name] = time.perf_counter() - start
+        assert lr == ['x' * size]
+    print(f"\n{size} chars: legacy {results['legacy'] * 1000:.1f}ms, parts {results['parts'] * 1000:.1f}ms")
+    assert results['parts'] <= results['legacy'] * 1.5
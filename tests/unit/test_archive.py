@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for task archive
+"""
+
+import json
+import base64
+import zipfile
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import ContextData
+from aipyapp.aipy.archive import write_archive, read_archive, is_archive, BLOB_DIR
+from aipyapp.aipy.task import TaskData
+
+
+def data_url(raw: bytes, mime: str = 'image/png') -> str:
+    return f'data:{mime};base64,{base64.b64encode(raw).decode("ascii")}'
+
+
+class TestTaskArchive:
+    """测试任务归档读写"""
+
+    @pytest.mark.unit
+    def test_round_trip(self, tmp_path):
+        """测试写入后读取的数据不变"""
+        image = data_url(bytes(range(256)) * 32)
+        stdout = 'line\n' * 2000
+        data = {
+            'id': 'test',
+            'short': 'hello',
+            'messages': [
+                {'content': [{'type': 'image_url', 'image_url': {'url': image}}]},
+                {'content': stdout},
+            ],
+            'results': [{'stdout': stdout}],
+        }
+        path = tmp_path / 'task.zip'
+        write_archive(path, data)
+        assert is_archive(path)
+        assert read_archive(path) == data
+
+    @pytest.mark.unit
+    def test_blobs_are_deduplicated(self, tmp_path):
+        """测试相同内容的大字符串只保存一份"""
+        stdout = 'x' * 10000
+        image = data_url(b'\x89PNG' * 4096)
+        path = tmp_path / 'task.zip'
+        write_archive(path, {'a': stdout, 'b': [stdout, image], 'c': image})
+
+        with zipfile.ZipFile(path) as zf:
+            blobs = [name for name in zf.namelist() if name.startswith(BLOB_DIR)]
+            manifest = json.loads(zf.read('manifest.json'))
+            task = json.loads(zf.read('task.json'))
+        assert len(blobs) == 2
+        assert len(manifest['blobs']) == 2
+        # 图片按原始字节保存
+        assert task['c']['$mime'] == 'image/png'
+        assert manifest['blobs'][task['c']['$blob']]['size'] == 4 * 4096
+
+    @pytest.mark.unit
+    def test_corrupted_blob(self, tmp_path):
+        """测试 blob 内容与哈希不一致时报错"""
+        path = tmp_path / 'task.zip'
+        write_archive(path, {'a': 'x' * 10000})
+        with zipfile.ZipFile(path) as zf:
+            entries = {name: zf.read(name) for name in zf.namelist()}
+        with zipfile.ZipFile(path, 'w') as zf:
+            for name, content in entries.items():
+                zf.writestr(name, b'broken' if name.startswith(BLOB_DIR) else content)
+        with pytest.raises(ValueError):
+            read_archive(path)
+
+    @pytest.mark.unit
+    def test_task_data_round_trip(self, tmp_path):
+        """测试 TaskData 经归档保存后可重新加载"""
+        storage = MessageStorage()
+        request = storage.store(UserMessage(content=[
+            {'type': 'text', 'text': 'describe'},
+            {'type': 'image-url', 'image_url': {'url': data_url(b'\x00' * 8192)}},
+        ]))
+        reply = storage.store(AIMessage(content='y' * 8192))
+        data = TaskData(id='test', context=ContextData(messages=[request, reply]), message_storage=storage)
+        expected = data.model_dump(mode='json', exclude_none=True)
+
+        path = tmp_path / 'task.zip'
+        write_archive(path, expected)
+        assert path.stat().st_size < len(json.dumps(expected))
+        loaded = read_archive(path)
+        model_context = {'message_storage': MessageStorage.model_validate(loaded['message_storage'])}
+        task_data = TaskData.model_validate(loaded, context=model_context)
+        assert task_data.model_dump(mode='json', exclude_none=True) == expected
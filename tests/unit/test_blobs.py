@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for BlobStore and blob-backed messages
+"""
+
+import base64
+import hashlib
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage
+from aipyapp.aipy.blobs import BlobStore, BLOB_KEY, BLOB_THRESHOLD, hash_text
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.archive import write_archive, read_archive
+
+
+def legacy_id(message):
+    content_str = f"{message.role}:{message.content}"
+    hash_bytes = hashlib.sha1(content_str.encode('utf-8')).digest()[:8]
+    return base64.urlsafe_b64encode(hash_bytes).decode().rstrip('=')
+
+
+class TestBlobStore:
+    """测试 blob 存储"""
+
+    @pytest.mark.unit
+    def test_put_is_written_on_flush(self, tmp_path):
+        """测试 put 的内容在 flush 时写入磁盘"""
+        store = BlobStore(tmp_path / 'blobs')
+        text = '中文' * 100000
+        digest = store.put(text)
+        assert digest == hashlib.sha256(text.encode('utf-8')).hexdigest()
+        assert not (tmp_path / 'blobs').exists()
+        assert store.get(digest) == text
+
+        store.flush()
+        assert (tmp_path / 'blobs' / digest[:2] / digest).read_bytes() == text.encode('utf-8')
+        assert BlobStore(tmp_path / 'blobs').get(digest) == text
+
+    @pytest.mark.unit
+    def test_source_is_copied_on_flush(self, tmp_path):
+        """测试备用目录中的 blob 在 flush 时复制到当前目录"""
+        old = BlobStore(tmp_path / 'old')
+        digest = old.put('x' * 100)
+        old.flush()
+
+        store = BlobStore(tmp_path / 'new')
+        store.add_source(tmp_path / 'old')
+        assert store.get(digest) == 'x' * 100
+        store.flush()
+        assert (tmp_path / 'new' / digest[:2] / digest).exists()
+
+    @pytest.mark.unit
+    def test_missing_blob(self, tmp_path):
+        """测试读取不存在的 blob"""
+        with pytest.raises(KeyError):
+            BlobStore(tmp_path).get(hash_text('missing'))
+
+
+class TestBlobMessages:
+    """测试大消息保存到 blob"""
+
+    @pytest.mark.unit
+    def test_id_compatible(self):
+        """测试分块计算的消息 ID 与原算法一致"""
+        storage = MessageStorage()
+        messages = [
+            UserMessage(content='hello'),
+            AIMessage(content='世界' * 100000),
+            UserMessage(content=[{'type': 'text', 'text': 'describe'}]),
+        ]
+        for message in messages:
+            assert storage._compute_id(message) == legacy_id(message)
+
+    @pytest.mark.unit
+    def test_large_message_kept_as_reference(self, tmp_path):
+        """测试大消息只在内存中保留引用，访问时从 blob 读取"""
+        store = BlobStore(tmp_path / 'blobs')
+        storage = MessageStorage()
+        storage.set_blob_store(store)
+        content = 'y' * BLOB_THRESHOLD
+        message = storage.store(AIMessage(content=content))
+        small = storage.store(UserMessage(content='small'))
+
+        assert message.message is None
+        assert not storage.is_resident(message.id)
+        assert storage.is_resident(small.id)
+        assert message.role == 'assistant'
+        assert message.content == content
+        assert message.message is None
+        assert storage.store(AIMessage(content=content)).id == message.id
+
+        dumped = storage.model_dump(mode='json', exclude_none=True)
+        ref = dumped['messages'][message.id]['content']
+        assert ref == {BLOB_KEY: hash_text(content)}
+
+        store.flush()
+        loaded = MessageStorage.lazy(dumped['messages'])
+        loaded.set_blob_store(BlobStore(tmp_path / 'blobs'))
+        assert loaded.get(message.id).content == content
+
+    @pytest.mark.unit
+    def test_archive_includes_message_blobs(self, tmp_path):
+        """测试导出归档时包含 blob 内容"""
+        store = BlobStore(tmp_path / 'blobs')
+        storage = MessageStorage()
+        storage.set_blob_store(store)
+        content = 'z' * BLOB_THRESHOLD
+        message = storage.store(UserMessage(content=content))
+
+        path = tmp_path / 'task.zip'
+        write_archive(path, storage.model_dump(mode='json', exclude_none=True), blob_store=store)
+        data = read_archive(path)
+        assert data['messages'][message.id]['content'] == content
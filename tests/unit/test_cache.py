@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for KVCache
+"""
+
+import gc
+import threading
+
+import pytest
+
+from aipyapp.aipy.cache import KVCache
+
+
+@pytest.fixture(params=[False, True], ids=['plain', 'pooled'])
+def kv(request, tmp_path):
+    """创建临时 KVCache 实例（普通模式与连接池模式）"""
+    cache = KVCache(str(tmp_path / 'cache.db'), pooled=request.param)
+    yield cache
+    cache.close()
+
+
+class TestKVCacheBasic:
+    """测试 KVCache 基本操作"""
+
+    @pytest.mark.unit
+    def test_set_get(self, kv):
+        """测试设置与读取"""
+        kv.set('a', {'x': [1, 2, 3]})
+        assert kv.get('a') == {'x': [1, 2, 3]}
+        assert kv.get('missing', 'default') == 'default'
+
+    @pytest.mark.unit
+    def test_delete_and_exists(self, kv):
+        """测试删除与存在性检查"""
+        kv.set('a', 1)
+        assert kv.exists('a')
+        assert kv.delete('a')
+        assert not kv.exists('a')
+        assert not kv.delete('a')
+
+    @pytest.mark.unit
+    def test_expire_and_ttl(self, kv):
+        """测试过期时间"""
+        kv.set('a', 1, ttl=100)
+        assert 0 < kv.ttl('a') <= 100
+        assert kv.expire('a', -1)
+        assert kv.get('a') is None
+        assert kv.ttl('a') == -1
+
+    @pytest.mark.unit
+    def test_keys_size_stats(self, kv):
+        """测试键列表、数量与统计"""
+        kv.set('a', 1)
+        kv.set('b', 2)
+        assert sorted(kv.keys()) == ['a', 'b']
+        assert kv.size() == 2
+        assert kv.stats()['valid'] == 2
+        kv.clear()
+        assert kv.size() == 0
+
+
+class TestKVCachePooled:
+    """测试连接池模式"""
+
+    @pytest.mark.unit
+    def test_wal_mode(self, tmp_path):
+        """测试常驻连接使用 WAL 日志模式"""
+        cache = KVCache(str(tmp_path / 'cache.db'), pooled=True)
+        with cache._connection() as conn:
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+            sync = conn.execute('PRAGMA synchronous').fetchone()[0]
+        assert mode == 'wal'
+        assert sync == 1  # NORMAL
+        cache.close()
+
+    @pytest.mark.unit
+    def test_incremental_vacuum(self, tmp_path):
+        """测试新建的常驻连接数据库使用增量 auto_vacuum，维护后回收全部空闲页"""
+        cache = KVCache(str(tmp_path / 'cache.db'), pooled=True, maintenance_writes=10000)
+        with cache._connection() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        cache.set_many({f'k{i}': 'x' * 1000 for i in range(500)})
+        cache.delete_many([f'k{i}' for i in range(500)])
+        with cache._connection() as conn:
+            assert conn.execute('PRAGMA freelist_count').fetchone()[0] > 1
+        cache.maintain()
+        with cache._connection() as conn:
+            assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        cache.close()
+
+    @pytest.mark.unit
+    def test_connection_per_thread(self, tmp_path):
+        """测试每个线程拥有独立的常驻连接"""
+        cache = KVCache(str(tmp_path / 'cache.db'), pooled=True)
+
+        def worker(i):
+            for j in range(20):
+                cache.set(f'{i}:{j}', j)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert cache.size() == 80
+        # 工作线程结束后连接被关闭，只剩主线程的连接
+        gc.collect()
+        assert len(cache._pool) == 1
+        cache.close()
+        assert not cache._pool
+
+
+class TestKVCacheMemoryTier:
+    """测试内存 LRU 层"""
+
+    @pytest.fixture
+    def tiered(self, tmp_path):
+        cache = KVCache(str(tmp_path / 'cache.db'), memory_entries=2)
+        yield cache
+        cache.close()
+
+    @pytest.mark.unit
+    def test_read_served_from_memory(self, tiered):
+        """测试写入两层后读取命中内存"""
+        tiered.set('a', [1, 2])
+        assert tiered.get('a') == [1, 2]
+        assert tiered.stats()['memory']['hits'] == 1
+
+    @pytest.mark.unit
+    def test_miss_populates_memory(self, tmp_path):
+        """测试磁盘读取后回填内存层"""
+        path = str(tmp_path / 'cache.db')
+        KVCache(path).set('a', 'value')
+        cache = KVCache(path, memory_entries=4)
+        assert cache.get('a') == 'value'
+        assert cache.get('a') == 'value'
+        memory = cache.stats()['memory']
+        assert memory['misses'] == 1
+        assert memory['hits'] == 1
+
+    @pytest.mark.unit
+    def test_lru_eviction_by_entries(self, tiered):
+        """测试按条目数淘汰最久未使用项"""
+        tiered.set('a', 1)
+        tiered.set('b', 2)
+        tiered.get('a')
+        tiered.set('c', 3)
+        memory = tiered.stats()['memory']
+        assert memory['entries'] == 2
+        assert memory['evictions'] == 1
+        # b 被淘汰，但仍可从磁盘读取
+        assert tiered.get('b') == 2
+
+    @pytest.mark.unit
+    def test_eviction_by_bytes(self, tmp_path):
+        """测试按字节数淘汰"""
+        cache = KVCache(str(tmp_path / 'cache.db'), memory_bytes=15)
+        cache.set('a', 'x' * 8)
+        cache.set('b', 'y' * 8)
+        memory = cache.stats()['memory']
+        assert memory['entries'] == 1
+        assert memory['bytes'] <= 15
+
+    @pytest.mark.unit
+    def test_returns_copies(self, tiered):
+        """测试修改读取结果不会改变缓存中的值"""
+        value = {'tools': [1]}
+        tiered.set('a', value)
+        value['tools'].append(2)
+        first = tiered.get('a')
+        first['server'] = 'x'
+        assert tiered.get('a') == {'tools': [1]}
+        assert tiered.get_many(['a']) == {'a': {'tools': [1]}}
+        assert tiered.stats()['memory']['hits'] == 3
+
+    @pytest.mark.unit
+    def test_size_in_bytes(self, tmp_path):
+        """测试非 ASCII 值按 UTF-8 字节数计算大小"""
+        cache = KVCache(str(tmp_path / 'cache.db'), memory_entries=4)
+        cache.set('a', '中文')
+        assert cache.stats()['memory']['bytes'] == len('"中文"'.encode('utf-8'))
+        assert cache.stats()['bytes'] == 8
+        cache.close()
+
+    @pytest.mark.unit
+    def test_memory_honours_expire(self, tiered):
+        """测试内存层遵循过期时间"""
+        tiered.set('a', 1)
+        tiered.expire('a', -1)
+        assert tiered.get('a') is None
+        tiered.set('b', 2)
+        tiered.delete('b')
+        assert tiered.get('b') is None
+
+
+class TestKVCacheEviction:
+    """测试磁盘容量限制与淘汰"""
+
+    @pytest.mark.unit
+    def test_lru_eviction(self, tmp_path):
+        """测试超出条目上限时淘汰最久未访问项"""
+        cache = KVCache(
+            str(tmp_path / 'cache.db'), max_entries=10, maintenance_writes=1000
+        )
+        for i in range(10):
+            cache.set(f'k{i}', i)
+        cache.get('k0')
+        cache.set('k10', 10)
+        result = cache.maintain()
+        assert result['evicted'] == 2
+        assert cache.size() == 9
+        assert cache.get('k0') == 0
+        assert cache.get('k1') is None
+
+    @pytest.mark.unit
+    def test_lfu_eviction(self, tmp_path):
+        """测试 LFU 策略淘汰访问次数最少的项"""
+        cache = KVCache(
+            str(tmp_path / 'cache.db'),
+            max_entries=2,
+            eviction='lfu',
+            maintenance_writes=1000,
+        )
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        for _ in range(3):
+            cache.get('a')
+            cache.get('c')
+        # 淘汰到上限的 90%（1 条）：先淘汰从未访问的 b，再淘汰较早访问的 a
+        assert cache.maintain()['evicted'] == 2
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    @pytest.mark.unit
+    def test_byte_limit_amortised(self, tmp_path):
+        """测试写入次数触发摊销维护并按字节数淘汰"""
+        cache = KVCache(
+            str(tmp_path / 'cache.db'), max_bytes=1000, maintenance_writes=10
+        )
+        for i in range(50):
+            cache.set(f'k{i}', 'x' * 98)
+        cache.wait_maintenance()
+        # 维护在后台执行，最后一次维护之后最多还有 9 次写入尚未触发维护
+        assert cache.stats()['bytes'] <= 1000 + 9 * 100
+        cache.maintain()
+        assert cache.stats()['bytes'] <= 1000
+
+    @pytest.mark.unit
+    def test_maintenance_does_not_block(self, tmp_path):
+        """测试后台维护执行数据库操作时不阻塞其它线程的读写"""
+        cache = KVCache(str(tmp_path / 'cache.db'), pooled=True, max_entries=10)
+        started, release = threading.Event(), threading.Event()
+        vacuum = cache._vacuum
+
+        def slow_vacuum(conn):
+            started.set()
+            release.wait(5)
+            vacuum(conn)
+
+        cache._vacuum = slow_vacuum
+        cache.schedule_maintenance()
+        assert started.wait(5)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        release.set()
+        cache.wait_maintenance()
+        cache.close()
+
+    @pytest.mark.unit
+    def test_migrates_old_schema(self, tmp_path):
+        """测试旧版本数据库自动迁移"""
+        import sqlite3
+
+        path = str(tmp_path / 'cache.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                'CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT, '
+                'expire_time REAL, created_time REAL)'
+            )
+            conn.execute("INSERT INTO cache VALUES ('a', '\"old\"', 9e12, 0)")
+        cache = KVCache(path, max_entries=10)
+        assert cache.get('a') == 'old'
+        assert cache.stats()['bytes'] == 5
+        cache.maintain()
+
+    @pytest.mark.unit
+    def test_invalid_eviction(self, tmp_path):
+        """测试不支持的淘汰策略"""
+        with pytest.raises(ValueError):
+            KVCache(str(tmp_path / 'cache.db'), eviction='fifo')
+
+
+class TestKVCacheBatch:
+    """测试批量与异步接口"""
+
+    @pytest.mark.unit
+    def test_set_get_delete_many(self, kv):
+        """测试批量写入、读取与删除"""
+        kv.set_many({'a': 1, 'b': [2], 'c': {'x': 3}})
+        assert kv.get_many(['a', 'b', 'missing']) == {'a': 1, 'b': [2]}
+        assert kv.get('c') == {'x': 3}
+        assert kv.delete_many(['a', 'b', 'missing']) == 2
+        assert kv.get_many(['a', 'b', 'c']) == {'c': {'x': 3}}
+
+    @pytest.mark.unit
+    def test_get_many_skips_expired(self, kv):
+        """测试批量读取忽略并清理已过期项"""
+        kv.set_many({'a': 1, 'b': 2})
+        kv.expire('a', -1)
+        assert kv.get_many(['a', 'b']) == {'b': 2}
+        assert kv.size() == 1
+
+    @pytest.mark.unit
+    def test_get_many_large_batch(self, kv):
+        """测试超过单条语句参数上限的批量读取"""
+        items = {f'k{i}': i for i in range(1200)}
+        kv.set_many(items)
+        assert kv.get_many(items) == items
+
+    @pytest.mark.unit
+    async def test_async_wrapper(self, tmp_path):
+        """测试 asyncio 封装"""
+        from aipyapp.aipy.cache import AsyncKVCache
+
+        acache = AsyncKVCache(KVCache(str(tmp_path / 'cache.db'), pooled=True))
+        await acache.set_many({'a': 1, 'b': 2})
+        await acache.set('c', 3)
+        assert await acache.get('c') == 3
+        assert await acache.get_many(['a', 'b']) == {'a': 1, 'b': 2}
+        assert await acache.delete_many(['a', 'b']) == 2
+        assert await acache.delete('c')
+        acache.close()
+
+
+class TestKVCacheCodec:
+    """测试编解码器"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('codec', ['json', 'pickle', 'json+zlib', 'pickle+zlib'])
+    def test_roundtrip(self, tmp_path, codec):
+        """测试各编解码器读写一致"""
+        value = {'name': '工具', 'inputSchema': {'properties': {'a': {'type': 'string'}}}}
+        cache = KVCache(str(tmp_path / 'cache.db'), codec=codec)
+        cache.set('a', value)
+        cache.set_many({'b': value})
+        assert cache.get('a') == value
+        assert cache.get_many(['b']) == {'b': value}
+
+    @pytest.mark.unit
+    def test_msgpack_roundtrip(self, tmp_path):
+        """测试 msgpack 编解码器"""
+        pytest.importorskip('msgpack')
+        cache = KVCache(str(tmp_path / 'cache.db'), codec='msgpack+zlib')
+        cache.set('a', {'x': [1, 2, 3]})
+        assert cache.get('a') == {'x': [1, 2, 3]}
+
+    @pytest.mark.unit
+    def test_rows_read_with_recorded_codec(self, tmp_path):
+        """测试按行记录的编解码器读取，旧的 JSON 数据仍可读取"""
+        path = str(tmp_path / 'cache.db')
+        KVCache(path).set('old', {'v': 1})
+        cache = KVCache(path, codec='pickle+zlib')
+        cache.set('new', {'v': 2})
+        assert cache.get('old') == {'v': 1}
+        assert KVCache(path).get('new') == {'v': 2}
+
+    @pytest.mark.unit
+    def test_unknown_codec(self, tmp_path):
+        """测试不支持的编解码器"""
+        with pytest.raises(ValueError):
+            KVCache(str(tmp_path / 'cache.db'), codec='yaml')
+        with pytest.raises(ValueError):
+            KVCache(str(tmp_path / 'cache.db'), codec='json+lz4')
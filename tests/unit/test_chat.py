@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for lazy loading of messages and steps
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.blocks import CodeBlocks
+from aipyapp.aipy.context import ContextData
+from aipyapp.aipy.step import Step, StepData, Round
+from aipyapp.aipy.response import Response
+from aipyapp.aipy.task import TaskData
+
+
+def make_task_data():
+    storage = MessageStorage()
+    request = storage.store(UserMessage(content='question'))
+    reply = storage.store(AIMessage(content='answer'))
+    step = StepData(instruction='question')
+    step.add_round(Round(request=request, response=Response(message=reply)))
+    data = TaskData(id='test', steps=[step], context=ContextData(messages=[request, reply]), message_storage=storage)
+    return data.model_dump(mode='json', exclude_none=True), request, reply
+
+
+class TestLazyMessageStorage:
+    """测试消息延迟加载"""
+
+    @pytest.mark.unit
+    def test_messages_validated_on_access(self):
+        """测试消息在首次访问时才校验"""
+        raw, request, reply = make_task_data()
+        storage = MessageStorage.lazy(raw['message_storage']['messages'])
+        context = ContextData.model_validate(raw['context'], context={'message_storage': storage})
+
+        assert all(isinstance(message, dict) for message in storage.messages.values())
+        assert context.messages[1].content == 'answer'
+        assert isinstance(storage.messages[reply.id], AIMessage)
+        assert isinstance(storage.messages[request.id], dict)
+        assert context.messages[0] == request
+
+    @pytest.mark.unit
+    def test_unloaded_messages_serialized_as_is(self):
+        """测试未访问的消息原样保存"""
+        raw, request, reply = make_task_data()
+        storage = MessageStorage.lazy(raw['message_storage']['messages'])
+        storage.get(reply.id)
+        storage.store(UserMessage(content='more'))
+        dumped = storage.model_dump(mode='json', exclude_none=True)
+        assert list(dumped['messages']) == [request.id, reply.id, storage.store(UserMessage(content='more')).id]
+        assert dumped['messages'][request.id] == raw['message_storage']['messages'][request.id]
+
+    @pytest.mark.unit
+    def test_store_reuses_unloaded_message(self):
+        """测试存储相同消息时复用延迟加载的消息"""
+        raw, request, _ = make_task_data()
+        storage = MessageStorage.lazy(raw['message_storage']['messages'])
+        message = storage.store(UserMessage(content='question'))
+        assert message.id == request.id
+        assert len(storage) == 2
+
+
+class TestLazyStep:
+    """测试步骤延迟加载"""
+
+    @pytest.mark.unit
+    def test_step_validated_on_access(self):
+        """测试步骤在首次访问时才校验，未访问的步骤原样保存"""
+        raw, _, _ = make_task_data()
+        storage = MessageStorage.lazy(raw['message_storage']['messages'])
+        task = SimpleNamespace(message_storage=storage)
+        steps = [Step(task, step) for step in raw['steps'] * 2]
+
+        data = TaskData.model_construct(
+            id='test', steps=[step.raw_data for step in steps],
+            blocks=CodeBlocks(), context=ContextData(), message_storage=storage,
+        )
+        assert data.model_dump(mode='json', exclude_none=True)['steps'] == raw['steps'] * 2
+
+        assert not steps[0].loaded
+        assert steps[0]['instruction'] == 'question'
+        assert steps[0].loaded and not steps[1].loaded
+        assert steps[0].data.rounds[0].response.message.content == 'answer'
+        data.steps = [step.raw_data for step in steps]
+        assert data.model_dump(mode='json', exclude_none=True)['steps'] == raw['steps'] * 2
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for token estimation
+"""
+
+import sys
+
+import pytest
+
+from aipyapp import __respath__
+from aipyapp.llm import UserMessage, AIMessage, SystemMessage
+from aipyapp.llm.models import ModelRegistry
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import (
+    ITokenEstimator, DefaultTokenEstimator, MemoizedTokenEstimator, create_token_estimator,
+    ContextConfig, ContextData, ContextManager, ContextStrategy
+)
+
+
+class CountingEstimator(ITokenEstimator):
+    def __init__(self):
+        self.calls = 0
+
+    def estimate(self, message):
+        self.calls += 1
+        return 1
+
+
+class TestTokenEstimator:
+    """测试 token 估算"""
+
+    @pytest.mark.unit
+    def test_default_estimator_counts_cjk(self):
+        """测试默认估算器按字符类型估算"""
+        storage = MessageStorage()
+        estimator = DefaultTokenEstimator()
+        assert estimator.estimate(storage.store(UserMessage(content='你好世界'))) == 4
+        assert estimator.estimate(storage.store(UserMessage(content='abcdefgh'))) == 2
+        assert estimator.estimate(storage.store(UserMessage(content='中文abc'))) == 3
+        message = storage.store(UserMessage(content=[{'type': 'text', 'text': '你好'}]))
+        assert estimator.estimate(message) == 2
+
+    @pytest.mark.unit
+    def test_memoized_by_message_id(self):
+        """测试每条消息只估算一次"""
+        storage = MessageStorage()
+        counting = CountingEstimator()
+        estimator = MemoizedTokenEstimator(counting)
+        first = storage.store(UserMessage(content='hello'))
+        for _ in range(3):
+            estimator.estimate(first)
+            estimator.estimate(storage.store(UserMessage(content='hello')))
+        estimator.estimate(storage.store(UserMessage(content='world')))
+        assert counting.calls == 2
+
+    @pytest.mark.unit
+    def test_fallback_without_tiktoken(self, monkeypatch):
+        """测试 tiktoken 不可用时使用默认估算器"""
+        monkeypatch.setitem(sys.modules, 'tiktoken', None)
+        estimator = create_token_estimator('o200k_base')
+        assert isinstance(estimator, MemoizedTokenEstimator)
+        assert isinstance(estimator.estimator, DefaultTokenEstimator)
+
+    @pytest.mark.unit
+    def test_tiktoken_estimator(self):
+        """测试 tiktoken 估算器"""
+        pytest.importorskip('tiktoken')
+        from aipyapp.aipy.context import TiktokenEstimator
+        estimator = create_token_estimator('cl100k_base')
+        if not isinstance(estimator.estimator, TiktokenEstimator):
+            pytest.skip('tokenizer vocab not available')
+        message = MessageStorage().store(UserMessage(content='hello world'))
+        assert estimator.estimate(message) == 2
+
+    @pytest.mark.unit
+    def test_registry_tokenizer(self):
+        """测试按模型选择 tokenizer"""
+        registry = ModelRegistry(__respath__ / 'models.yaml')
+        assert registry.get_tokenizer('gpt-4.1') == 'o200k_base'
+        assert registry.get_tokenizer('deepseek-chat') is None
+        assert registry.get_tokenizer('not-exist-model') is None
+
+
+class LengthEstimator(ITokenEstimator):
+    def estimate(self, message):
+        return len(message.content)
+
+
+def make_manager(strategy=ContextStrategy.SLIDING_WINDOW, max_tokens=100, data=None, compression_ratio=0.0):
+    storage = MessageStorage()
+    config = ContextConfig(strategy=strategy, max_tokens=max_tokens, preserve_recent=2, summary_max_length=20,
+                           compression_ratio=compression_ratio)
+    manager = ContextManager(storage, data or ContextData(), config, estimator=LengthEstimator())
+    return storage, manager
+
+
+class TestTokenLedger:
+    """测试上下文 token 账本"""
+
+    @pytest.mark.unit
+    def test_add_and_remove(self):
+        """测试添加和移除消息时累计 token 数"""
+        storage, manager = make_manager()
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        manager.add_message(storage.store(UserMessage(content='u' * 20)))
+        assert manager.total_tokens == 30
+        assert manager.data.tokens == [10, 20]
+
+        manager.remove_message()
+        assert manager.total_tokens == 10
+        assert manager.data.tokens == [10]
+
+    @pytest.mark.unit
+    def test_assistant_uses_output_tokens(self):
+        """测试回复消息按输出 token 计数"""
+        storage, manager = make_manager()
+        reply = AIMessage(content='a' * 50, usage={'input_tokens': 1000, 'output_tokens': 7, 'total_tokens': 1007})
+        manager.add_message(storage.store(reply))
+        assert manager.total_tokens == 7
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('strategy', list(ContextStrategy))
+    def test_compress_keeps_ledger(self, strategy):
+        """测试压缩后账本与消息一致"""
+        storage, manager = make_manager(strategy)
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        for i in range(10):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 20)))
+        assert manager.total_tokens == 210
+
+        manager.compress()
+        data = manager.data
+        assert data.ledger_valid
+        assert data.total_tokens == sum(data.tokens) <= 100
+        assert data.tokens == [LengthEstimator().estimate(msg) for msg in data.messages]
+
+        stats = manager.get_stats()
+        assert stats['total_tokens'] == data.total_tokens
+        assert stats['compressions'] == 1
+        assert stats['compressed_tokens'] == 210 - data.total_tokens
+
+    @pytest.mark.unit
+    def test_legacy_data_rebuilt(self):
+        """测试没有账本的旧数据在首次使用时重建"""
+        storage = MessageStorage()
+        messages = [storage.store(UserMessage(content='x' * n)) for n in (5, 6)]
+        _, manager = make_manager(data=ContextData(messages=messages, total_tokens=6))
+        manager.add_message(storage.store(UserMessage(content='y' * 7)))
+        assert manager.data.tokens == [5, 6, 7]
+        assert manager.total_tokens == 18
+
+    @pytest.mark.unit
+    def test_clear(self):
+        """测试清理上下文时更新账本"""
+        storage, manager = make_manager()
+        manager.add_message(storage.store(SystemMessage(content='s')))
+        for n in range(1, 5):
+            manager.add_message(storage.store(UserMessage(content='u' * (n + 1))))
+        manager.clear()
+        assert manager.data.tokens == [1, 2, 5]
+        assert manager.total_tokens == 8
+
+
+class TestImportanceFilter:
+    """测试重要性过滤策略"""
+
+    @pytest.mark.unit
+    def test_keeps_order_and_fills_budget(self):
+        """测试按原始顺序保留消息，放不下的大消息被跳过"""
+        storage, manager = make_manager(ContextStrategy.IMPORTANCE_FILTER, max_tokens=60)
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        manager.add_message(storage.store(UserMessage(content='a' * 20)))
+        manager.add_message(storage.store(UserMessage(content='b' * 30)))
+        manager.add_message(storage.store(UserMessage(content='c' * 50)))
+        manager.add_message(storage.store(UserMessage(content='d' * 15)))
+
+        manager.compress()
+        contents = [msg.content[0] for msg in manager.messages]
+        # c 分数最高但放不下，继续选择较小的消息
+        assert contents == ['s', 'b', 'd']
+        assert manager.total_tokens == 55
+
+    @pytest.mark.unit
+    def test_duplicate_messages(self):
+        """测试重复消息按各自位置保留"""
+        storage, manager = make_manager(ContextStrategy.IMPORTANCE_FILTER, max_tokens=30)
+        for content in ('x' * 10, 'y' * 25, 'x' * 10):
+            manager.add_message(storage.store(UserMessage(content=content)))
+        manager.compress()
+        assert [msg.content for msg in manager.messages] == ['x' * 10, 'x' * 10]
+        assert manager.data.tokens == [10, 10]
+
+
+class TestStablePrefix:
+    """测试压缩后消息前缀保持稳定"""
+
+    @pytest.mark.unit
+    def test_compress_leaves_headroom(self):
+        """测试压缩时留出余量，之后几轮只追加消息"""
+        storage, manager = make_manager(max_tokens=100, compression_ratio=0.3)
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        for i in range(10):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 10)))
+
+        manager.get_messages()
+        assert manager.total_tokens <= 70
+        prefix = [msg.id for msg in manager.messages]
+
+        for i in range(3):
+            manager.add_message(storage.store(UserMessage(content=f'n{i}' * 5)))
+            messages = manager.get_messages()
+            assert [msg.id for msg in messages[:len(prefix)]] == prefix
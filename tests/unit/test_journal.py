@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for TaskJournal
+"""
+
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage
+from aipyapp.aipy.blocks import CodeBlock, CodeBlocks
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import ContextData
+from aipyapp.aipy.events import StreamStartedEvent
+from aipyapp.aipy.step import StepData, Round
+from aipyapp.aipy.response import Response
+from aipyapp.aipy.journal import TaskJournal, TaskSaver
+from aipyapp.aipy.task import TaskData
+
+
+class FakeTask:
+    """只包含 TaskJournal 所需属性的任务对象"""
+
+    def __init__(self):
+        self.task_id = 'test'
+        self.steps = []
+        self.blocks = CodeBlocks()
+        self.message_storage = MessageStorage()
+        self.context = ContextData()
+
+    def add_step(self, instruction):
+        request = self.message_storage.store(UserMessage(content=instruction))
+        reply = self.message_storage.store(AIMessage(content=f'reply to {instruction}'))
+        self.context.messages.extend([request, reply])
+        data = StepData(instruction=instruction)
+        data.add_round(Round(request=request, response=Response(message=reply)))
+        self.steps.append(SimpleNamespace(data=data, raw_data=data))
+        self.blocks.history.append(CodeBlock(name=instruction, lang='python', code='pass'))
+
+    def get_task_data(self):
+        return TaskData(
+            id=self.task_id,
+            steps=[step.data for step in self.steps],
+            blocks=self.blocks,
+            context=self.context,
+            message_storage=self.message_storage,
+        )
+
+
+def load(path):
+    data = json.loads(path.read_text(encoding='utf-8'))
+    data = TaskJournal.replay(data, path.with_suffix('.jsonl'))
+    return TaskData.model_validate(data).model_dump(exclude_none=True)
+
+
+class TestTaskJournal:
+    """测试快照与增量日志"""
+
+    @pytest.mark.unit
+    def test_first_save_writes_snapshot(self, tmp_path):
+        """测试首次保存写入快照"""
+        task = FakeTask()
+        task.add_step('one')
+        journal = TaskJournal(tmp_path / 'task.json')
+        journal.save(task)
+        assert journal.path.exists()
+        assert not journal.journal_path.exists()
+
+    @pytest.mark.unit
+    def test_append_and_replay(self, tmp_path):
+        """测试追加增量后重放结果与完整数据一致"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        journal.save(task)
+        snapshot = journal.path.read_text(encoding='utf-8')
+
+        task.add_step('two')
+        journal.save(task)
+        task.add_step('three')
+        journal.save(task)
+
+        # 快照不变，增量写入日志
+        assert journal.path.read_text(encoding='utf-8') == snapshot
+        lines = journal.journal_path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 2
+        # 最后一个已保存的步骤和新步骤
+        assert len(json.loads(lines[1])['steps']) == 2
+        assert load(journal.path) == task.get_task_data().model_dump(exclude_none=True)
+
+    @pytest.mark.unit
+    def test_changes_after_save(self, tmp_path):
+        """测试保存后追加到最后一个步骤的事件和代码块依赖在重放时不丢失"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        task.add_step('two')
+        journal.save(task)
+
+        task.steps[-1].data.events.append(StreamStartedEvent(llm='test'))
+        task.blocks.history[0].add_dep('get_state', 'x')
+        journal.save(task)
+        record = json.loads(journal.journal_path.read_text(encoding='utf-8'))
+        assert record['step_offset'] == 1
+        assert record['block_offset'] == 0
+
+        data = load(journal.path)
+        assert data == task.get_task_data().model_dump(exclude_none=True)
+        assert data['steps'][1]['events'][0]['llm'] == 'test'
+        assert data['blocks']['history'][0]['deps'] == {'get_state': {'x'}}
+
+    @pytest.mark.unit
+    def test_replay_is_idempotent(self, tmp_path):
+        """测试快照已包含日志内容时重放结果不变"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        journal.save(task)
+        task.add_step('two')
+        journal.save(task)
+        saved_journal = journal.journal_path.read_text(encoding='utf-8')
+
+        journal.reset()
+        journal.save(task)
+        journal.journal_path.write_text(saved_journal, encoding='utf-8')
+        assert len(load(journal.path)['steps']) == 2
+
+    @pytest.mark.unit
+    def test_compaction(self, tmp_path):
+        """测试达到记录上限时重写快照"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        journal.COMPACT_RECORDS = 2
+        for i in range(4):
+            task.add_step(f'step{i}')
+            journal.save(task)
+        assert not journal.journal_path.exists()
+        assert len(load(journal.path)['steps']) == 4
+
+    @pytest.mark.unit
+    def test_deleted_step_triggers_snapshot(self, tmp_path):
+        """测试删除已保存的步骤后重写快照"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        task.add_step('two')
+        journal.save(task)
+        task.steps.pop()
+        journal.save(task)
+        assert not journal.journal_path.exists()
+        assert len(load(journal.path)['steps']) == 1
+
+    @pytest.mark.unit
+    def test_broken_tail_is_ignored(self, tmp_path):
+        """测试忽略中断写入的最后一行"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        journal.save(task)
+        task.add_step('two')
+        journal.save(task)
+        with open(journal.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"steps": [')
+        assert len(load(journal.path)['steps']) == 2
+
+
+class SlowDisplay:
+    """第一次 save 阻塞到 release 被设置的显示插件"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def save(self, path, clear=False, code_format=None):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'<html>{self.calls}</html>')
+
+
+class TestTaskSaver:
+    """测试后台保存线程"""
+
+    @pytest.mark.unit
+    def test_request_coalesces_pending_saves(self, tmp_path):
+        """测试写入期间的多次保存请求合并为一次写入"""
+        task = FakeTask()
+        display = SlowDisplay()
+        saver = TaskSaver(TaskJournal(tmp_path / 'task.json'), display, tmp_path / 'console.html')
+
+        task.add_step('one')
+        saver.request(task)
+        assert display.started.wait(5)
+        for i in range(3):
+            task.add_step(f'step{i}')
+            saver.request(task)
+        display.release.set()
+
+        assert saver.flush(stop=True) == []
+        assert display.calls == 2
+        assert (tmp_path / 'console.html').read_text(encoding='utf-8') == '<html>2</html>'
+        assert not (tmp_path / '.console.html.tmp').exists()
+        # 三次请求的增量一次性追加
+        lines = saver.journal.journal_path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 3
+        assert load(saver.journal.path) == task.get_task_data().model_dump(exclude_none=True)
+
+    @pytest.mark.unit
+    def test_collect_copies_mutable_data(self, tmp_path):
+        """测试收集后任务线程继续修改事件和依赖不影响待写入的数据"""
+        task = FakeTask()
+        journal = TaskJournal(tmp_path / 'task.json')
+        task.add_step('one')
+        snapshot = journal.collect(task)
+        task.add_step('two')
+        record = journal.collect(task)
+
+        task.steps[-1].data.events.append(StreamStartedEvent(llm='test'))
+        task.blocks.history[-1].add_dep('set_state', 'x')
+        assert snapshot.blocks.history[0].deps == {}
+        assert record.steps[-1].events == []
+        assert record.blocks[-1].deps == {}
+
+        journal.write([snapshot, record])
+        data = load(journal.path)
+        assert data['steps'][1]['events'] == []
+        assert data['blocks']['history'][1]['deps'] == {}
+
+    @pytest.mark.unit
+    def test_flush_returns_errors(self, tmp_path):
+        """测试后台写入失败时 flush 返回异常并在下次保存时重写快照"""
+        task = FakeTask()
+        task.add_step('one')
+        path = tmp_path / 'task.json'
+        path.mkdir()
+        saver = TaskSaver(TaskJournal(path))
+        saver.request(task)
+        errors = saver.flush()
+        assert len(errors) == 1
+        assert saver.flush() == []
+
+        path.rmdir()
+        task.add_step('two')
+        saver.request(task)
+        assert saver.flush(stop=True) == []
+        assert len(load(path)['steps']) == 2
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LLM clients
+"""
+
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from aipyapp.llm.base import BaseClient, CACHE_CONTROL, TextItem, ImageItem, ImageUrl, add_cache_control
+from aipyapp.llm.base_openai import OpenAIBaseClient
+from aipyapp.llm.client_claude import ClaudeClient
+from aipyapp.llm.client_ollama import OllamaClient
+from aipyapp.llm.transport import HttpPool, PoolConfig
+
+
+def make_messages():
+    return [
+        {'role': 'system', 'content': 'system prompt'},
+        {'role': 'user', 'content': 'hello'},
+        {'role': 'assistant', 'content': 'hi'},
+        {'role': 'user', 'content': [{'type': 'text', 'text': 'next'}]},
+    ]
+
+
+class TestPromptCache:
+    """测试提示词缓存"""
+
+    @pytest.mark.unit
+    def test_claude_marks_prefix(self):
+        """测试 Claude 在系统提示词和最后一条消息上设置断点"""
+        client = ClaudeClient({'name': 'claude', 'api_key': 'key'})
+        original = make_messages()
+        request = client._get_request(client._prepare_messages(original))
+        messages = request['messages']
+
+        assert request['system'] == [{'type': 'text', 'text': 'system prompt', 'cache_control': CACHE_CONTROL}]
+        assert messages[:2] == original[1:3]
+        assert messages[-1]['content'] == [{'type': 'text', 'text': 'next', 'cache_control': CACHE_CONTROL}]
+        # 不修改传入的消息
+        assert original == make_messages()
+
+    @pytest.mark.unit
+    def test_disabled(self):
+        """测试关闭 cache_prompt 时不修改消息"""
+        client = ClaudeClient({'name': 'claude', 'api_key': 'key', 'cache_prompt': False})
+        request = client._get_request(client._prepare_messages(make_messages()))
+        assert request['system'] == 'system prompt'
+        assert request['messages'] == make_messages()[1:]
+
+        client = OpenAIBaseClient({'name': 'openai', 'api_key': 'key'})
+        assert client._prepare_messages(make_messages()) == make_messages()
+
+    @pytest.mark.unit
+    def test_openai_compatible_marks_prefix(self):
+        """测试兼容服务开启 cache_prompt 后设置断点"""
+        client = OpenAIBaseClient({'name': 'openrouter', 'api_key': 'key', 'cache_prompt': True})
+        messages = client._prepare_messages(make_messages())
+        assert messages[0]['content'] == [{'type': 'text', 'text': 'system prompt', 'cache_control': CACHE_CONTROL}]
+        assert messages[1:3] == make_messages()[1:3]
+        assert messages[-1]['content'][-1]['cache_control'] == CACHE_CONTROL
+
+    @pytest.mark.unit
+    def test_list_content_items(self):
+        """测试 pydantic 内容块组成的列表内容"""
+        content = [ImageItem(image_url=ImageUrl(url='a.png')), TextItem(text='next')]
+        message = add_cache_control({'role': 'user', 'content': content})
+        assert message['content'][0] is content[0]
+        assert message['content'][-1] == {'type': 'text', 'text': 'next', 'cache_control': CACHE_CONTROL}
+        assert content[-1] == TextItem(text='next')
+
+    @pytest.mark.unit
+    def test_claude_usage(self):
+        """测试 Claude 缓存 token 计入用量"""
+        client = ClaudeClient({'name': 'claude', 'api_key': 'key'})
+        usage = SimpleNamespace(input_tokens=10, output_tokens=5,
+                                cache_read_input_tokens=1000, cache_creation_input_tokens=200)
+        ret = client._parse_usage(SimpleNamespace(usage=usage))
+        assert ret == {'input_tokens': 1210, 'output_tokens': 5, 'total_tokens': 1215,
+                       'cached_tokens': 1000, 'cache_write_tokens': 200}
+
+    @pytest.mark.unit
+    def test_claude_stream_usage(self):
+        """测试 Claude 流式响应的缓存用量"""
+        client = ClaudeClient({'name': 'claude', 'api_key': 'key'})
+        start = SimpleNamespace(message=SimpleNamespace(usage=SimpleNamespace(
+            input_tokens=10, output_tokens=1, cache_read_input_tokens=1000, cache_creation_input_tokens=0)))
+        text = SimpleNamespace(delta=SimpleNamespace(text='ok'))
+        delta = SimpleNamespace(usage=SimpleNamespace(
+            input_tokens=None, output_tokens=4, cache_read_input_tokens=1000, cache_creation_input_tokens=None))
+
+        class Processor:
+            content = ''
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def process_chunk(self, content, reason=False):
+                self.content += content
+
+        msg = client._parse_stream_response([start, text, delta], Processor())
+        assert msg.content == 'ok'
+        assert msg.usage['cached_tokens'] == 1000
+        assert msg.usage['input_tokens'] == 1010
+        assert msg.usage['total_tokens'] == 1015
+
+    @pytest.mark.unit
+    def test_openai_usage(self):
+        """测试 OpenAI 兼容服务的缓存用量"""
+        client = OpenAIBaseClient({'name': 'openai', 'api_key': 'key'})
+        usage = SimpleNamespace(total_tokens=1100, prompt_tokens=1000, completion_tokens=100,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=768))
+        assert client._parse_usage(usage)['cached_tokens'] == 768
+
+        usage = SimpleNamespace(total_tokens=1100, prompt_tokens=1000, completion_tokens=100,
+                                prompt_cache_hit_tokens=512)
+        assert client._parse_usage(usage)['cached_tokens'] == 512
+
+        usage = SimpleNamespace(total_tokens=1100, prompt_tokens=1000, completion_tokens=100)
+        assert 'cached_tokens' not in client._parse_usage(usage)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        lines = [
+            {'message': {'content': 'hel'}, 'done': False},
+            {'message': {'content': 'lo'}, 'done': False},
+            {'done': True, 'prompt_eval_count': 3, 'eval_count': 2},
+        ]
+        if not body['stream']:
+            lines = [{'message': {'role': 'assistant', 'content': 'hello'}, 'prompt_eval_count': 3, 'eval_count': 2}]
+        data = '\n'.join(json.dumps(line) for line in lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class Collector:
+    def __init__(self):
+        self.content = ''
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        pass
+    def process_chunk(self, content, reason=False):
+        self.content += content
+
+
+class TestHttpPool:
+    """测试共享连接池"""
+
+    @pytest.mark.unit
+    def test_shared_per_host(self):
+        """测试同一主机共用 httpx.Client"""
+        pool = HttpPool()
+        client = pool.get_client('https://api.example.com/v1')
+        assert pool.get_client('https://API.example.com/v2') is client
+        assert pool.get_client('https://api.example.com', verify=False) is not client
+        assert pool.get_client('https://other.example.com') is not client
+
+        pool.close()
+        assert client.is_closed
+        assert pool.get_client('https://api.example.com') is not client
+
+    @pytest.mark.unit
+    def test_configure(self):
+        """测试连接池配置"""
+        pool = HttpPool()
+        pool.configure(max_connections=4, keepalive_expiry=5, unknown=1)
+        assert pool.config == PoolConfig(max_connections=4, max_keepalive_connections=10,
+                                         keepalive_expiry=5, http2=True)
+        stats = pool.get_stats()
+        assert stats['max_connections'] == 4
+        assert stats['hosts'] == {}
+
+    @pytest.mark.unit
+    def test_ollama_reuses_connection(self, server, monkeypatch):
+        """测试 Ollama 客户端通过连接池复用连接"""
+        pool = HttpPool()
+        monkeypatch.setattr('aipyapp.llm.base.get_http_pool', lambda: pool)
+        client = OllamaClient({'name': 'ollama', 'model': 'qwen', 'base_url': server})
+
+        for _ in range(3):
+            msg = client([{'role': 'user', 'content': 'hi'}], stream_processor=Collector())
+            assert msg.content == 'hello'
+            assert msg.usage['total_tokens'] == 5
+
+        client._stream = False
+        assert client([{'role': 'user', 'content': 'hi'}]).content == 'hello'
+
+        stats = pool.get_stats()['hosts'][server]
+        assert stats['requests'] == 4
+        assert stats['connections'] == 1
+        pool.close()
+
+
+async def aiter(items):
+    for item in items:
+        yield item
+
+
+class TestAsyncClient:
+    """测试异步调用"""
+
+    @pytest.mark.unit
+    async def test_ollama_concurrent(self, server, monkeypatch):
+        """测试多个异步请求在同一个事件循环中并发"""
+        pool = HttpPool()
+        monkeypatch.setattr('aipyapp.llm.base.get_http_pool', lambda: pool)
+        client = OllamaClient({'name': 'ollama', 'model': 'qwen', 'base_url': server})
+        assert client.supports_async
+
+        messages = [{'role': 'user', 'content': 'hi'}]
+        results = await asyncio.gather(*(client.acall(messages, stream_processor=Collector()) for _ in range(8)))
+        assert [msg.content for msg in results] == ['hello'] * 8
+        assert all(msg.usage['total_tokens'] == 5 for msg in results)
+
+        client._stream = False
+        assert (await client.acall(messages)).content == 'hello'
+
+        stats = pool.get_stats()['hosts'][server]
+        assert stats['requests'] == 9
+        assert 1 <= stats['connections'] <= 8
+        await pool.aclose()
+
+    @pytest.mark.unit
+    async def test_error_message(self, monkeypatch):
+        """测试异步请求失败时返回 ErrorMessage"""
+        client = OllamaClient({'name': 'ollama', 'model': 'qwen', 'base_url': 'http://127.0.0.1:1'})
+        msg = await client.acall([{'role': 'user', 'content': 'hi'}], stream_processor=Collector())
+        assert msg.role == 'error'
+
+    @pytest.mark.unit
+    async def test_openai_stream(self):
+        """测试 OpenAI 兼容服务的异步流式解析"""
+        client = OpenAIBaseClient({'name': 'openai', 'api_key': 'key'})
+
+        def chunk(**delta):
+            return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(**delta))])
+
+        usage = SimpleNamespace(total_tokens=5, prompt_tokens=3, completion_tokens=2)
+        chunks = [chunk(content=None, reasoning_content='think'), chunk(content='hel'), chunk(content='lo'),
+                  SimpleNamespace(usage=usage, choices=[])]
+
+        class Processor(Collector):
+            reason = ''
+            def process_chunk(self, content, reason=False):
+                if reason:
+                    self.reason += content
+                else:
+                    self.content += content
+
+        msg = await client._aparse_stream_response(aiter(chunks), Processor())
+        assert msg.content == 'hello'
+        assert msg.reason == 'think'
+        assert msg.usage['total_tokens'] == 5
+
+    @pytest.mark.unit
+    async def test_async_client_per_loop(self):
+        """测试异步 SDK 客户端按事件循环缓存"""
+        client = OpenAIBaseClient({'name': 'openai', 'api_key': 'key'})
+        first = client._get_async_client()
+        assert client._get_async_client() is first
+
+        async def get_client():
+            return client._get_async_client()
+
+        # 其它线程中的事件循环使用单独的客户端
+        assert await asyncio.to_thread(asyncio.run, get_client()) is not first
+
+    @pytest.mark.unit
+    async def test_fallback_to_thread(self):
+        """测试未实现异步请求的客户端在线程中执行"""
+        class SyncClient(OllamaClient):
+            aget_completion = BaseClient.aget_completion
+
+            def __call__(self, messages, stream_processor=None, **kwargs):
+                return threading.current_thread()
+
+        client = SyncClient({'name': 'sync', 'model': 'qwen', 'base_url': 'http://localhost'})
+        assert not client.supports_async
+        assert await client.acall([]) is not threading.current_thread()
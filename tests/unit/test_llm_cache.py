@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LLM response cache
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from aipyapp.llm import AIMessage
+from aipyapp.aipy.cache import KVCache
+from aipyapp.aipy.client import StreamProcessor
+from aipyapp.aipy.llm_cache import ResponseCache
+
+
+class FakeTask:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, name, **kwargs):
+        self.events.append((name, kwargs))
+
+
+def make_client(**kwargs):
+    config = dict(kind='openai', model='gpt-4o', _params={'top_p': 1}, _temperature=0.5, max_tokens=1024, name='openai')
+    config.update(kwargs)
+    return SimpleNamespace(**config)
+
+
+MESSAGES = [{'role': 'system', 'content': 'system'}, {'role': 'user', 'content': 'hello'}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    kv = KVCache(str(tmp_path / 'llm_cache.db'))
+    yield ResponseCache(kv, ttl=3600)
+    kv.close()
+
+
+class TestResponseCache:
+    """测试 LLM 响应缓存"""
+
+    @pytest.mark.unit
+    def test_disabled_by_default(self):
+        """测试默认不开启"""
+        assert ResponseCache.create(None) is None
+        assert ResponseCache.create({'enable': False}) is None
+
+    @pytest.mark.unit
+    def test_key(self, cache):
+        """测试缓存键区分客户端类型、模型、参数和消息"""
+        client = make_client()
+        key = cache.make_key(client, MESSAGES)
+        assert cache.make_key(make_client(name='other'), MESSAGES) == key
+        assert cache.make_key(make_client(model='gpt-4.1'), MESSAGES) != key
+        assert cache.make_key(make_client(kind='azure'), MESSAGES) != key
+        assert cache.make_key(make_client(_params={'top_p': 0.5}), MESSAGES) != key
+        assert cache.make_key(client, MESSAGES + [{'role': 'user', 'content': 'more'}]) != key
+
+    @pytest.mark.unit
+    def test_hit_replays_stream(self, cache):
+        """测试命中时通过 StreamProcessor 回放，不消耗 token"""
+        client = make_client()
+        assert cache.get(client, MESSAGES) is None
+        content = 'line 1\n\n```python\nprint(1)\n```'
+        cache.put(client, MESSAGES, AIMessage(content=content, reason='think'))
+
+        task = FakeTask()
+        msg = cache.get(client, MESSAGES, StreamProcessor(task, client.name))
+        assert msg.content == content
+        assert msg.reason == 'think'
+        assert msg.usage['total_tokens'] == 0
+        assert msg.usage['cached_responses'] == 1
+
+        names = [name for name, _ in task.events]
+        assert names[0] == 'stream_started' and names[-1] == 'stream_completed'
+        lines = [line for name, kwargs in task.events if name == 'stream' and not kwargs['reason'] for line in kwargs['lines']]
+        assert lines == ['line 1', '```python', 'print(1)', '```']
+        assert dict(cache.stats) == {'misses': 1, 'hits': 1}
+
+    @pytest.mark.unit
+    def test_skip_empty(self, cache):
+        """测试不缓存空响应"""
+        client = make_client()
+        cache.put(client, MESSAGES, AIMessage(content=''))
+        assert cache.get(client, MESSAGES) is None
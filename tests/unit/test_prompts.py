@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for system prompt caching
+"""
+
+import os
+
+import pytest
+
+from aipyapp.aipy.prompts import Prompts, SYSTEM_PROMPT_CACHE_SIZE
+from aipyapp.aipy.role import Role
+from aipyapp.aipy.mcp_tool import MCPToolManager
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    (tmp_path / 'default.j2').write_text('role={{ role }} tools={{ mcp_tools }}', encoding='utf-8')
+    return Prompts(tmp_path)
+
+
+class TestSystemPromptCache:
+    """测试系统提示词缓存"""
+
+    @pytest.mark.unit
+    def test_reuse_rendered_prompt(self, prompts):
+        """测试相同 key 只渲染一次，并共用 token 数"""
+        calls = []
+
+        def get_params():
+            calls.append(1)
+            return {'role': 'coder', 'mcp_tools': 'none'}
+
+        first = prompts.get_system_prompt(('coder',), get_params)
+        first.tokens['o200k_base'] = 42
+        second = prompts.get_system_prompt(('coder',), get_params)
+        assert second is first
+        assert second.content == 'role=coder tools=none'
+        assert second.tokens == {'o200k_base': 42}
+        assert len(calls) == 1
+
+        prompts.get_system_prompt(('writer',), lambda: {'role': 'writer', 'mcp_tools': 'none'})
+        assert len(calls) == 1
+
+    @pytest.mark.unit
+    def test_template_change(self, prompts, tmp_path):
+        """测试模板修改后重新渲染"""
+        def params():
+            return {'role': 'coder', 'mcp_tools': 'none'}
+
+        assert prompts.get_system_prompt('k', params).content == 'role=coder tools=none'
+
+        path = tmp_path / 'default.j2'
+        path.write_text('v2 {{ role }}', encoding='utf-8')
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+        assert prompts.get_system_prompt('k', params).content == 'v2 coder'
+
+    @pytest.mark.unit
+    def test_bounded(self, prompts):
+        """测试缓存条目数有上限"""
+        for i in range(SYSTEM_PROMPT_CACHE_SIZE + 5):
+            prompts.get_system_prompt(i, lambda: {'role': 'r', 'mcp_tools': ''})
+        assert len(prompts._system_prompts) == SYSTEM_PROMPT_CACHE_SIZE
+
+    @pytest.mark.unit
+    def test_role_fingerprint(self):
+        """测试角色内容变化时指纹改变"""
+        role = Role()
+        role.name = 'coder'
+        role.add_package('python', ['pandas', 'numpy'])
+        fingerprint = role.fingerprint()
+
+        other = Role()
+        other.name = 'coder'
+        other.add_package('python', ['numpy', 'pandas'])
+        assert other.fingerprint() == fingerprint
+
+        role.add_tip('plot', 'short', 'detail')
+        assert role.fingerprint() != fingerprint
+
+
+def make_mcp(tools):
+    mcp = MCPToolManager.__new__(MCPToolManager)
+    mcp.user_mcp = {'srv': {}}
+    mcp._tools_dict = {'srv': tools}
+    mcp._tools_version = 1
+    mcp._tools_prompt = None
+    mcp._server_status = {'srv': True}
+    mcp._user_mcp_enabled = True
+    mcp._inited = True
+    return mcp
+
+
+class TestMCPToolsPrompt:
+    """测试 MCP 工具提示缓存"""
+
+    @pytest.mark.unit
+    def test_cached_by_fingerprint(self):
+        """测试工具未变化时复用工具提示"""
+        tools = [{'id': 'srv__echo', 'description': 'echo', 'inputSchema': {'type': 'object'}}]
+        mcp = make_mcp(tools)
+        prompt = mcp.get_tools_prompt()
+        assert 'srv__echo' in prompt
+        fingerprint = mcp.get_tools_fingerprint()
+
+        tools[0]['description'] = 'changed'
+        assert mcp.get_tools_prompt() is prompt
+
+        mcp._tools_version += 1
+        assert mcp.get_tools_fingerprint() != fingerprint
+        assert 'changed' in mcp.get_tools_prompt()
+
+        mcp._server_status['srv'] = False
+        assert mcp.get_tools_prompt() == ''
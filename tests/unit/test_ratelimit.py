@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LLM rate limiting
+"""
+
+import httpx
+import openai
+import pytest
+
+from aipyapp.llm import ClientManager
+from aipyapp.llm.client_ollama import OllamaClient
+from aipyapp.llm.ratelimit import (
+    RateLimitConfig, RateLimiter, TokenBucket, billable_tokens, estimate_tokens, get_retry_after, is_rate_limited
+)
+
+
+def make_error(status, headers=None):
+    request = httpx.Request('POST', 'http://localhost/api/chat')
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError('error', request=request, response=response)
+
+
+class TestTokenBucket:
+    """测试令牌桶"""
+
+    @pytest.mark.unit
+    def test_reserve(self):
+        """测试令牌用完后按速率排队"""
+        bucket = TokenBucket(60, now=0.0)
+        assert bucket.reserve(60, 0.0) == 0.0
+        assert bucket.reserve(1, 0.0) == pytest.approx(1.0)
+        assert bucket.reserve(1, 0.0) == pytest.approx(2.0)
+        # 两秒后补充的令牌抵消透支
+        assert bucket.reserve(1, 2.0) == pytest.approx(1.0)
+
+    @pytest.mark.unit
+    def test_oversized_and_refund(self):
+        """测试超过容量的请求和用量修正"""
+        bucket = TokenBucket(60, now=0.0)
+        assert bucket.reserve(1000, 0.0) == 0.0
+        bucket.refund(-30, 0.0)
+        assert bucket.reserve(1, 0.0) == pytest.approx(31.0)
+
+    @pytest.mark.unit
+    def test_estimate_tokens(self):
+        """测试按字符数估算 token"""
+        messages = [{'role': 'user', 'content': 'a' * 40},
+                    {'role': 'user', 'content': [{'type': 'text', 'text': 'b' * 40}]}]
+        assert estimate_tokens(messages) == 21
+
+
+class TestRetryAfter:
+    """测试 429 响应的处理"""
+
+    @pytest.mark.unit
+    def test_headers(self):
+        """测试读取 Retry-After 响应头"""
+        assert get_retry_after(make_error(429, {'retry-after': '2'})) == 2.0
+        assert get_retry_after(make_error(429, {'retry-after-ms': '1500'})) == 1.5
+        assert get_retry_after(make_error(429)) is None
+        assert get_retry_after(ValueError()) is None
+
+        response = httpx.Response(429, headers={'retry-after': '3'},
+                                  request=httpx.Request('POST', 'https://api.openai.com'))
+        error = openai.RateLimitError('rate limited', response=response, body=None)
+        assert is_rate_limited(error)
+        assert get_retry_after(error) == 3.0
+        assert not is_rate_limited(make_error(500))
+
+    @pytest.mark.unit
+    def test_backoff(self):
+        """测试退避时间和重试次数"""
+        limiter = RateLimiter(RateLimitConfig(rpm=60, max_retries=2, backoff=1.0, max_backoff=1.5))
+        assert limiter.backoff(make_error(429, {'retry-after': '0.2'}), 0) == pytest.approx(0.2)
+        assert 0.5 <= limiter.backoff(make_error(429), 0) <= 1.0
+        assert limiter.backoff(make_error(429, {'retry-after': '30'}), 1) == 1.5
+        assert limiter.backoff(make_error(429), 2) is None
+        assert limiter.backoff(make_error(500), 0) is None
+        assert limiter.stats['rate_limited'] == 3
+        # 暂停期间新请求需要等待
+        assert limiter.reserve(1) > 1.0
+
+
+class TestClientRateLimit:
+    """测试客户端按速率限制重试"""
+
+    def make_client(self, responses):
+        client = OllamaClient({'name': 'ollama', 'model': 'qwen', 'base_url': 'http://localhost', 'stream': False})
+        calls = []
+
+        def get_completion(messages, **kwargs):
+            calls.append(messages)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        client.get_completion = get_completion
+        return client, calls
+
+    @pytest.mark.unit
+    def test_retry_on_429(self):
+        """测试 429 后等待 Retry-After 重试，错误不返回给任务"""
+        ok = httpx.Response(200, json={'message': {'role': 'assistant', 'content': 'ok'},
+                                       'prompt_eval_count': 3, 'eval_count': 2})
+        client, calls = self.make_client([make_error(429, {'retry-after': '0.01'}), ok])
+        client.set_rate_limit(RateLimitConfig(rpm=600, tpm=10000))
+
+        msg = client([{'role': 'user', 'content': 'hi'}])
+        assert msg.content == 'ok'
+        assert len(calls) == 2
+        assert client.rate_limiter.stats['rate_limited'] == 1
+
+    @pytest.mark.unit
+    def test_no_retry(self):
+        """测试其它错误和未启用限流时直接返回错误"""
+        client, calls = self.make_client([make_error(500)])
+        client.set_rate_limit(RateLimitConfig(rpm=600))
+        assert client([{'role': 'user', 'content': 'hi'}]).role == 'error'
+        assert len(calls) == 1
+
+        client, calls = self.make_client([make_error(429)])
+        client.set_rate_limit(RateLimitConfig())
+        assert client.rate_limiter is None
+        assert client([{'role': 'user', 'content': 'hi'}]).role == 'error'
+        assert len(calls) == 1
+
+    @pytest.mark.unit
+    def test_opt_in(self):
+        """测试只有客户端配置了 rpm/tpm 才限流"""
+        manager = ClientManager({
+            'claude': {'type': 'claude', 'api_key': 'key'},
+            'custom': {'type': 'claude', 'api_key': 'key', 'rpm': 5, 'tpm': 0},
+            'deepseek': {'type': 'deepseek', 'api_key': 'key'},
+        })
+        assert manager.get_client('claude').rate_limiter is None
+        assert manager.get_client('custom').rate_limiter.config == RateLimitConfig(rpm=5, tpm=0)
+        assert manager.get_client('deepseek').rate_limiter is None
+        assert set(manager.get_rate_limit_stats()) == {'custom'}
+
+    @pytest.mark.unit
+    def test_billable_tokens(self):
+        """测试缓存读取的输入 token 不计入 TPM"""
+        usage = {'input_tokens': 10000, 'cached_tokens': 9000, 'output_tokens': 200, 'total_tokens': 10200}
+        assert billable_tokens(usage) == 1200
+        assert billable_tokens({'input_tokens': 30, 'output_tokens': 5}) == 35
+        assert billable_tokens({}) == 0
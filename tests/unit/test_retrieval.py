@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for retrieval context strategy
+"""
+
+import sys
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage, SystemMessage
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import (
+    ITokenEstimator, ContextConfig, ContextData, ContextManager, ContextStrategy,
+    ContextStrategyFactory, RetrievalStrategy
+)
+from aipyapp.aipy.retrieval import (
+    HashingEmbedder, VectorIndex, create_embedder, similarity, split_code_blocks
+)
+
+
+class LengthEstimator(ITokenEstimator):
+    def estimate(self, message):
+        return len(message.content)
+
+
+class TestVectorIndex:
+    """测试本地向量索引"""
+
+    @pytest.mark.unit
+    def test_hashing_similarity(self):
+        """测试哈希词袋向量的相似度"""
+        embedder = HashingEmbedder()
+        a = embedder.embed('读取 sales.csv 并统计每月销售额')
+        b = embedder.embed('按月统计销售额')
+        c = embedder.embed('画一张天气温度折线图')
+        assert similarity(a, a) == pytest.approx(1.0)
+        assert similarity(a, b) > similarity(a, c)
+        assert embedder.embed('') == {}
+
+    @pytest.mark.unit
+    def test_code_blocks_indexed(self):
+        """测试代码块单独索引，相似度取最大值"""
+        text = '先看说明文字。\n```python\ndf = pd.read_csv("sales.csv")\n```\n后面还有很多无关的叙述内容。'
+        assert split_code_blocks(text) == ['df = pd.read_csv("sales.csv")\n']
+
+        index = VectorIndex()
+        index.add('m1', text)
+        index.add('m2', '完全无关的内容')
+        query = index.embed('pd.read_csv sales.csv')
+        assert index.score('m1', query) > similarity(query, index.embed(text))
+        assert index.search(query, ['m1', 'm2'], 1) == [(index.score('m1', query), 'm1')]
+
+    @pytest.mark.unit
+    def test_fallback_without_model(self, monkeypatch):
+        """测试没有 sentence-transformers 时使用哈希向量"""
+        monkeypatch.setitem(sys.modules, 'sentence_transformers', None)
+        assert isinstance(create_embedder('some-model'), HashingEmbedder)
+        assert isinstance(create_embedder(), HashingEmbedder)
+
+
+def make_manager(max_tokens=120, top_k=1):
+    storage = MessageStorage()
+    config = ContextConfig(strategy=ContextStrategy.RETRIEVAL, max_tokens=max_tokens, compression_ratio=0.0,
+                           preserve_recent=1, retrieval_top_k=top_k)
+    manager = ContextManager(storage, ContextData(), config, estimator=LengthEstimator())
+    return storage, manager
+
+
+class TestRetrievalStrategy:
+    """测试检索压缩策略"""
+
+    @pytest.mark.unit
+    def test_registered(self):
+        """测试通过策略工厂创建"""
+        strategy = ContextStrategyFactory.create(
+            ContextStrategy.RETRIEVAL, MessageStorage(), ContextConfig(), LengthEstimator()
+        )
+        assert isinstance(strategy, RetrievalStrategy)
+
+    @pytest.mark.unit
+    def test_keeps_relevant_history(self):
+        """测试保留与最近对话相关的历史消息"""
+        storage, manager = make_manager()
+        manager.add_message(storage.store(SystemMessage(content='system')))
+        manager.add_message(storage.store(UserMessage(content='load sales csv with pandas')))
+        manager.add_message(storage.store(AIMessage(content='```python\ndf = read_csv("sales.csv")\n```')))
+        manager.add_message(storage.store(UserMessage(content='draw weather chart')))
+        manager.add_message(storage.store(AIMessage(content='plotted the weather chart')))
+        manager.add_message(storage.store(UserMessage(content='group sales by month')))
+        manager.add_message(storage.store(AIMessage(content='done')))
+
+        manager.compress()
+        contents = [msg.content for msg in manager.messages]
+        assert contents == ['system', 'load sales csv with pandas', 'group sales by month', 'done']
+        assert manager.data.tokens == [len(content) for content in contents]
+
+    @pytest.mark.unit
+    def test_dropped_message_comes_back(self):
+        """测试已移出上下文的消息在相关时重新加入"""
+        storage, manager = make_manager(max_tokens=60)
+        manager.add_message(storage.store(UserMessage(content='the api key is in config.toml')))
+        manager.add_message(storage.store(AIMessage(content='ok')))
+        manager.add_message(storage.store(UserMessage(content='draw a weather chart for beijing')))
+        manager.add_message(storage.store(AIMessage(content='chart saved')))
+        manager.compress()
+        assert 'the api key is in config.toml' not in [msg.content for msg in manager.messages]
+
+        manager.add_message(storage.store(UserMessage(content='where is the api key')))
+        manager.add_message(storage.store(AIMessage(content='checking')))
+        manager.compress()
+        contents = [msg.content for msg in manager.messages]
+        assert contents == ['the api key is in config.toml', 'where is the api key', 'checking']
+
+    @pytest.mark.unit
+    def test_resume_rebuilds_index(self):
+        """测试任务恢复后，恢复前已移出上下文的消息仍可检索"""
+        storage, manager = make_manager(max_tokens=60)
+        manager.add_message(storage.store(UserMessage(content='the api key is in config.toml')))
+        manager.add_message(storage.store(AIMessage(content='ok')))
+        manager.add_message(storage.store(UserMessage(content='draw a weather chart for beijing')))
+        manager.add_message(storage.store(AIMessage(content='chart saved')))
+        manager.compress()
+        assert len(manager.messages) == 2
+
+        # 按保存的任务数据延迟加载
+        storage = MessageStorage.lazy(storage.model_dump()['messages'])
+        data = ContextData.model_validate(manager.data.model_dump(), context={'message_storage': storage})
+        manager = ContextManager(storage, data, manager.config, estimator=LengthEstimator())
+        manager.add_message(storage.store(UserMessage(content='where is the api key')))
+        manager.add_message(storage.store(AIMessage(content='checking')))
+        manager.compress()
+        contents = [msg.content for msg in manager.messages]
+        assert contents == ['the api key is in config.toml', 'where is the api key', 'checking']
+        assert manager.data.tokens == [len(content) for content in contents]
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for LLM request routing
+"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from aipyapp.llm import AIMessage
+from aipyapp.llm.base import BaseClient
+from aipyapp.llm.router import LLMRouter, RouterConfig, is_retryable
+
+
+def make_error(status):
+    request = httpx.Request('POST', 'http://localhost')
+    return httpx.HTTPStatusError('error', request=request, response=httpx.Response(status, request=request))
+
+
+class FakeClient(BaseClient):
+    """按脚本返回结果的客户端，每项为异常或 (首 token 延迟, 数据块列表)"""
+
+    def __init__(self, name, script, **config):
+        super().__init__({'name': name, 'model': 'fake', **config})
+        self.script = list(script)
+        self.calls = 0
+
+    def get_completion(self, messages, **kwargs):
+        self.calls += 1
+        item = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def _parse_usage(self, response):
+        return {}
+
+    def _parse_stream_response(self, response, stream_processor):
+        delay, chunks = response
+        time.sleep(delay)
+        with stream_processor as lm:
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                lm.process_chunk(chunk)
+                time.sleep(0.01)
+        return AIMessage(content=lm.content)
+
+    def _parse_response(self, response):
+        return AIMessage(content=''.join(response[1]))
+
+
+class Recorder:
+    def __init__(self):
+        self.content = ''
+        self.reason = ''
+        self.events = []
+    def __enter__(self):
+        self.events.append('enter')
+        return self
+    def __exit__(self, *args):
+        self.events.append('exit')
+    def process_chunk(self, content, *, reason=False):
+        self.content += content
+
+
+def make_router(*clients, **config):
+    return LLMRouter({client.name: client for client in clients}, RouterConfig(backoff=0.01, **config))
+
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+class TestRetry:
+    """测试重试和故障转移"""
+
+    @pytest.mark.unit
+    def test_retryable(self):
+        """测试可重试的错误"""
+        assert is_retryable(httpx.ConnectError('failed'))
+        assert is_retryable(make_error(503))
+        assert is_retryable(make_error(429))
+        assert not is_retryable(make_error(400))
+        assert not is_retryable(make_error(401))
+        assert is_retryable(openai.APITimeoutError(request=httpx.Request('POST', 'http://localhost')))
+        assert is_retryable(TimeoutError())
+        assert not is_retryable(ValueError('bad message'))
+        assert not is_retryable(KeyError('api_key'))
+
+    @pytest.mark.unit
+    def test_retry_then_success(self):
+        """测试临时错误重试后成功"""
+        client = FakeClient('main', [make_error(503), httpx.ReadTimeout('timeout'), (0, ['ok'])])
+        recorder = Recorder()
+        msg = make_router(client)(client, MESSAGES, stream_processor=recorder)
+        assert msg.content == 'ok'
+        assert client.calls == 3
+        # 失败的尝试不向原来的处理器发送事件
+        assert recorder.events == ['enter', 'exit']
+
+    @pytest.mark.unit
+    def test_no_retry_without_status(self):
+        """测试没有 HTTP 状态码的普通异常不重试也不转移"""
+        backup = FakeClient('backup', [(0, ['from backup'])])
+        client = FakeClient('main', [ValueError('bad message')], backup='backup')
+        msg = make_router(client, backup)(client, MESSAGES, stream_processor=Recorder())
+        assert msg.role == 'error'
+        assert client.calls == 1
+        assert backup.calls == 0
+
+    @pytest.mark.unit
+    def test_failover(self):
+        """测试不可重试的错误直接转移到备用客户端"""
+        backup = FakeClient('backup', [(0, ['from backup'])])
+        client = FakeClient('main', [make_error(401)], backup='backup')
+        msg = make_router(client, backup)(client, MESSAGES, stream_processor=Recorder())
+        assert msg.content == 'from backup'
+        assert client.calls == 1
+
+    @pytest.mark.unit
+    def test_all_failed(self):
+        """测试全部失败时返回 ErrorMessage"""
+        backup = FakeClient('backup', [make_error(500)])
+        client = FakeClient('main', [make_error(500)], backup='backup')
+        msg = make_router(client, backup, max_retries=1)(client, MESSAGES, stream_processor=Recorder())
+        assert msg.role == 'error'
+        assert client.calls == 2
+        assert backup.calls == 2
+
+    @pytest.mark.unit
+    def test_no_retry_after_streaming(self):
+        """测试已经输出内容后出错不重试"""
+        client = FakeClient('main', [(0, ['partial', httpx.ReadError('reset')]), (0, ['ok'])])
+        recorder = Recorder()
+        msg = make_router(client)(client, MESSAGES, stream_processor=recorder)
+        assert msg.role == 'error'
+        assert client.calls == 1
+        assert recorder.events == ['enter', 'exit']
+
+
+class TestHedge:
+    """测试对冲请求"""
+
+    @pytest.mark.unit
+    def test_slow_primary(self):
+        """测试首 token 超时后备用客户端先返回"""
+        backup = FakeClient('backup', [(0, ['fast'])])
+        client = FakeClient('main', [(1.0, ['slow'])], backup='backup', hedge_ms=50)
+        recorder = Recorder()
+        start = time.time()
+        msg = make_router(client, backup)(client, MESSAGES, stream_processor=recorder)
+        assert time.time() - start < 0.8
+        assert msg.content == 'fast'
+        assert recorder.content == 'fast'
+        assert recorder.events == ['enter', 'exit']
+        assert backup.calls == 1
+
+    @pytest.mark.unit
+    def test_fast_primary(self):
+        """测试主客户端及时返回时不发送对冲请求"""
+        backup = FakeClient('backup', [(0, ['fast'])])
+        client = FakeClient('main', [(0, ['a', 'b'])], backup='backup', hedge_ms=200)
+        msg = make_router(client, backup)(client, MESSAGES, stream_processor=Recorder())
+        assert msg.content == 'ab'
+        assert backup.calls == 0
+
+    @pytest.mark.unit
+    def test_same_client(self):
+        """测试没有备用客户端时向同一客户端对冲"""
+        client = FakeClient('main', [(1.0, ['slow']), (0, ['fast'])], hedge_ms=50)
+        msg = make_router(client)(client, MESSAGES, stream_processor=Recorder())
+        assert msg.content == 'fast'
+        assert client.calls == 2
+
+
+    @pytest.mark.unit
+    def test_stream_on_calling_thread(self):
+        """测试对冲时胜出一方的输出在发起请求的线程上处理"""
+        backup = FakeClient('backup', [(0, ['a', 'b', 'c'])])
+        client = FakeClient('main', [(1.0, ['slow'])], backup='backup', hedge_ms=50)
+        threads = set()
+
+        class ThreadRecorder(Recorder):
+            def __enter__(self):
+                threads.add(threading.current_thread())
+                return super().__enter__()
+
+            def __exit__(self, *args):
+                threads.add(threading.current_thread())
+                super().__exit__(*args)
+
+            def process_chunk(self, content, *, reason=False):
+                threads.add(threading.current_thread())
+                super().process_chunk(content, reason=reason)
+
+        recorder = ThreadRecorder()
+        msg = make_router(client, backup)(client, MESSAGES, stream_processor=recorder)
+        assert msg.content == 'abc'
+        assert recorder.content == 'abc'
+        assert threads == {threading.current_thread()}
+
+
+class AsyncFakeClient(FakeClient):
+    """原生异步的 FakeClient"""
+
+    async def aget_completion(self, messages, **kwargs):
+        return self.get_completion(messages, **kwargs)
+
+    async def _aparse_stream_response(self, response, stream_processor):
+        delay, chunks = response
+        await asyncio.sleep(delay)
+        with stream_processor as lm:
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                lm.process_chunk(chunk)
+        return AIMessage(content=lm.content)
+
+
+class TestAsyncRoute:
+    """测试异步请求经过相同的路由"""
+
+    @pytest.mark.unit
+    async def test_retry_and_failover(self):
+        """测试异步请求的重试和故障转移"""
+        backup = AsyncFakeClient('backup', [(0, ['from backup'])])
+        client = AsyncFakeClient('main', [make_error(503), make_error(500)], backup='backup')
+        recorder = Recorder()
+        msg = await make_router(client, backup, max_retries=1).acall(client, MESSAGES, stream_processor=recorder)
+        assert msg.content == 'from backup'
+        assert client.calls == 2
+        assert recorder.events == ['enter', 'exit']
+
+    @pytest.mark.unit
+    async def test_no_retry_after_streaming(self):
+        """测试异步请求输出内容后出错不重试，普通异常不重试"""
+        client = AsyncFakeClient('main', [(0, ['partial', httpx.ReadError('reset')]), (0, ['ok'])])
+        msg = await make_router(client).acall(client, MESSAGES, stream_processor=Recorder())
+        assert msg.role == 'error'
+        assert client.calls == 1
+
+        client = AsyncFakeClient('main', [ValueError('bad message')])
+        assert (await make_router(client).acall(client, MESSAGES, stream_processor=Recorder())).role == 'error'
+        assert client.calls == 1
+
+    @pytest.mark.unit
+    async def test_sync_client_in_thread(self):
+        """测试没有原生异步实现的客户端在线程中经过同步路由"""
+        client = FakeClient('main', [httpx.ConnectError('failed'), (0, ['ok'])])
+        msg = await make_router(client).acall(client, MESSAGES, stream_processor=Recorder())
+        assert msg.content == 'ok'
+        assert client.calls == 2
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for speculative tool call execution
+"""
+
+import shutil
+import threading
+import time
+
+import pytest
+
+from aipyapp.llm import AIMessage
+from aipyapp.exec import BlockExecutor
+from aipyapp.aipy.blocks import CodeBlocks
+from aipyapp.aipy.chat import ChatMessage
+from aipyapp.aipy.client import StreamProcessor
+from aipyapp.aipy.events import TypedEventBus
+from aipyapp.aipy.response import StreamingParser
+from aipyapp.aipy.toolcalls import ToolCallProcessor, ToolName
+
+pytestmark = pytest.mark.skipif(not shutil.which('bash'), reason='bash not available')
+
+
+class Runner(BlockExecutor):
+    """记录每次执行的代码，以及执行时流式输出是否已经结束"""
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.runs = []
+
+    def __call__(self, block):
+        self.runs.append((block.code, self.task.stream_done.is_set()))
+        return super().__call__(block)
+
+
+class FakeTask:
+    def __init__(self, processor):
+        self.blocks = CodeBlocks()
+        self.event_bus = TypedEventBus()
+        self.event_bus.add_listener(processor)
+        self.runner = Runner(self)
+        self.stream_done = threading.Event()
+        self.events = []
+
+    def emit(self, name, **kwargs):
+        self.events.append((name, threading.current_thread()))
+        return self.event_bus.emit(name, **kwargs)
+
+
+def block(name, code, path=None, lang='bash'):
+    start = {'name': name, 'path': str(path)} if path else {'name': name}
+    start = str(start).replace("'", '"')
+    return f'<!-- Block-Start: {start} -->\n```{lang}\n{code}\n```\n<!-- Block-End: {{"name": "{name}"}} -->\n'
+
+
+def exec_call(name):
+    return f'<!-- ToolCall: {{"name": "Exec", "arguments": {{"name": "{name}"}}}} -->\n'
+
+
+EDIT = '<!-- ToolCall: {"name": "Edit", "arguments": {"name": "a", "old": "1", "new": "2"}} -->\n'
+
+
+def stream(processor, task, text, delay=0):
+    parser = StreamingParser(task.emit)
+    with StreamProcessor(task, 'llm', parser=parser) as lm:
+        for line in text.splitlines(keepends=True):
+            lm.process_chunk(line)
+            time.sleep(delay)
+        if processor.speculation:
+            processor.speculation.wait()
+    task.stream_done.set()
+    return parser, lm.content
+
+
+def run_round(processor, task, text, final=None, delay=0):
+    """模拟一轮请求：流式输出 text，最终解析 final（默认与 text 相同）"""
+    processor.begin_round(task)
+    parser, content = stream(processor, task, text, delay)
+    msg = ChatMessage(id='1', message=AIMessage(content=final or content))
+    response = parser.finish(msg)
+    try:
+        if response.code_blocks:
+            processor.wait_speculation()
+            task.blocks.add_blocks(response.code_blocks)
+        return processor.process(task, response.tool_calls)
+    finally:
+        processor.end_round()
+
+
+class TestSpeculation:
+    """测试提前执行 Exec 工具调用"""
+
+    @pytest.mark.unit
+    def test_exec_during_stream(self, tmp_path):
+        """测试 Exec 在输出结束前执行，结果和事件在本轮结束时在主线程发送"""
+        processor = ToolCallProcessor(speculative=True)
+        task = FakeTask(processor)
+        text = block('a', 'echo 1', tmp_path / 'a.sh') + exec_call('a') + \
+            block('b', 'echo 2', tmp_path / 'b.sh') + exec_call('b') + '说明\n' * 10
+        results = run_round(processor, task, text)
+        assert task.runner.runs == [('echo 1', False), ('echo 2', False)]
+        assert [result.result.block_name for result in results] == ['a', 'b']
+        assert [result.result.result.stdout for result in results] == ['1', '2']
+        assert processor.speculation is None
+
+        names = [name for name, _ in task.events]
+        assert names.index('stream_completed') < names.index('tool_call_started')
+        assert names.count('tool_call_completed') == 2
+        assert all(thread is threading.main_thread() for _, thread in task.events)
+
+    @pytest.mark.unit
+    def test_stream_while_exec_prints(self, tmp_path, capsys):
+        """测试提前执行的输出不会截获同时进行的流式显示"""
+        processor = ToolCallProcessor(speculative=True)
+        task = FakeTask(processor)
+        task.event_bus.on_event('stream', lambda event: print(*event.lines, sep='\n'))
+        code = 'echo start\nsleep 0.3\necho end'
+        text = block('a', code, tmp_path / 'a.sh') + exec_call('a') + ''.join(f'line {i}\n' for i in range(10))
+        results = run_round(processor, task, text, delay=0.05)
+        assert task.runner.runs == [(code, False)]
+        assert results[0].result.result.stdout == 'start\nend'
+        out = capsys.readouterr().out
+        assert all(f'line {i}' in out for i in range(10))
+
+    @pytest.mark.unit
+    def test_python_not_speculated(self, tmp_path):
+        """测试 Python 代码块不提前执行"""
+        processor = ToolCallProcessor(speculative=True)
+        task = FakeTask(processor)
+        text = block('a', 'echo 1', tmp_path / 'a.py', lang='python') + exec_call('a') + \
+            block('b', 'echo 2', tmp_path / 'b.sh') + exec_call('b')
+        processor.begin_round(task)
+        stream(processor, task, text)
+        assert not processor.speculation.pending
+        processor.end_round()
+        assert task.runner.runs == []
+
+    @pytest.mark.unit
+    def test_disabled(self):
+        """测试默认不提前执行"""
+        processor = ToolCallProcessor()
+        task = FakeTask(processor)
+        processor.begin_round(task)
+        assert processor.speculation is None
+        processor.on_block_ready(None)
+
+    @pytest.mark.unit
+    def test_discard_on_mismatch(self, tmp_path):
+        """测试最终解析的代码块不同时丢弃结果并重新执行"""
+        processor = ToolCallProcessor(speculative=True)
+        task = FakeTask(processor)
+        path = tmp_path / 'a.sh'
+        text = block('a', 'echo 1', path) + exec_call('a')
+        final = block('a', 'echo 3', path) + exec_call('a')
+        results = run_round(processor, task, text, final)
+        assert task.runner.runs == [('echo 1', False), ('echo 3', True)]
+        assert results[0].result.result.stdout == '3'
+        assert [name for name, _ in task.events].count('tool_call_started') == 1
+
+    @pytest.mark.unit
+    def test_stop_after_other_tool(self, tmp_path):
+        """测试遇到其它工具调用或没有 path 的代码块后不再提前执行"""
+        processor = ToolCallProcessor(speculative=True)
+        task = FakeTask(processor)
+        text = block('a', 'echo 1', tmp_path / 'a.sh') + EDIT + exec_call('a')
+        results = run_round(processor, task, text)
+        assert [result.tool_name for result in results] == [ToolName.EDIT, ToolName.EXEC]
+        assert task.runner.runs == [('echo 2', True)]
+
+        task = FakeTask(processor)
+        text = block('c', 'echo 1') + exec_call('c')
+        processor.begin_round(task)
+        stream(processor, task, text)
+        assert not processor.speculation.pending
+        processor.end_round()
+        assert task.runner.runs == []
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for streaming response processing
+"""
+
+import random
+
+import pytest
+
+from aipyapp.llm import AIMessage
+from aipyapp.aipy.chat import ChatMessage
+from aipyapp.aipy.client import LineReceiver, StreamProcessor
+from aipyapp.aipy.response import Response, StreamingParser
+from aipyapp.aipy.toolcalls import ToolName
+
+
+class FakeTask:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, name, **kwargs):
+        self.events.append((name, kwargs))
+
+    def streams(self):
+        return [kwargs for name, kwargs in self.events if name == 'stream']
+
+
+TEXT = 'first line\n\n<!-- Block-Start: {"name": "main"} -->\n```python\nprint("hello")\n```\n<!-- Block-End: {"name": "main"} -->\nlast'
+
+
+def chunks(text, seed=0):
+    rng = random.Random(seed)
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 7)
+        yield text[i:i + n]
+        i += n
+
+
+class TestLineReceiver:
+    """测试按行接收"""
+
+    @pytest.mark.unit
+    def test_split_lines(self):
+        """测试任意分块得到相同的行，空行被忽略"""
+        for seed in range(5):
+            lr = LineReceiver()
+            lines = []
+            for chunk in chunks(TEXT, seed):
+                lines.extend(lr.feed(chunk))
+            assert lr.buffer == 'last'
+            assert lr.done() == 'last'
+            assert lines + ['last'] == [line for line in TEXT.split('\n') if line]
+            assert lr.content == '\n'.join(lines + ['last'])
+
+    @pytest.mark.unit
+    def test_empty(self):
+        """测试 empty 和 done"""
+        lr = LineReceiver()
+        assert lr.empty()
+        lr.feed('abc')
+        assert not lr.empty()
+        assert lr.feed('def') == []
+        assert lr.buffer == 'abcdef'
+        assert lr.feed('\n') == ['abcdef']
+        assert lr.done() == ''
+
+
+class TestStreamProcessor:
+    """测试流式事件"""
+
+    def run(self, processor, text, reason=None):
+        with processor:
+            if reason:
+                processor.process_chunk(reason, reason=True)
+            for chunk in chunks(text):
+                processor.process_chunk(chunk)
+        return processor
+
+    @pytest.mark.unit
+    def test_line_mode(self):
+        """测试默认按行发送事件并过滤标记行"""
+        task = FakeTask()
+        processor = self.run(StreamProcessor(task, 'llm'), TEXT)
+        lines = [line for event in task.streams() for line in event['lines']]
+        assert lines == ['first line', '```python', 'print("hello")', '```', 'last']
+        assert all('partial' not in event for event in task.streams())
+        assert processor.content == '\n'.join(line for line in TEXT.split('\n') if line)
+
+    @pytest.mark.unit
+    def test_chunk_mode(self):
+        """测试按数据块发送事件，未结束的一行通过 partial 发送"""
+        task = FakeTask()
+        processor = self.run(StreamProcessor(task, 'llm', mode='chunk'), TEXT, reason='thinking\n')
+        events = task.streams()
+        assert len(events) > len(TEXT.split('\n'))
+        content_events = [event for event in events if not event['reason']]
+        lines = [line for event in content_events for line in event['lines']]
+        assert lines == ['first line', '```python', 'print("hello")', '```', 'last']
+        # 第一个完整的行到达之前已经显示
+        assert content_events[0]['lines'] == [] and content_events[0]['partial']
+        assert not any(event.get('partial', '').startswith('<!--') for event in events)
+        assert [line for event in events if event['reason'] for line in event['lines']] == ['thinking']
+        assert processor.content == '\n'.join(line for line in TEXT.split('\n') if line)
+        assert processor.reason == 'thinking'
+        names = [name for name, _ in task.events]
+        assert names[0] == 'stream_started' and names[-1] == 'stream_completed'
+
+    @pytest.mark.unit
+    def test_chunk_interval(self):
+        """测试 interval 内的数据块合并为一个事件"""
+        task = FakeTask()
+        processor = StreamProcessor(task, 'llm', mode='chunk', interval=60000)
+        with processor:
+            for chunk in chunks(TEXT):
+                processor.process_chunk(chunk)
+        events = task.streams()
+        # 第一个数据块立即发送，其余在结束时一起发送
+        assert len(events) == 2
+        lines = [line for event in events for line in event['lines']]
+        assert lines == ['first line', '```python', 'print("hello")', '```', 'last']
+
+
+REPLY = '''分析如下：
+
+<!-- Block-Start: {"name": "main", "path": "main.py"} -->
+```python
+print("hello")
+
+print("world")
+```
+<!-- Block-End: {"name": "main"} -->
+
+<!-- ToolCall: {"name": "Exec", "arguments": {"name": "main"}} -->
+
+<!-- Block-Start: {"name": "bad"} -->
+```bash
+ls
+```
+<!-- Block-End: {"name": "other"} -->
+<!-- ToolCall: {"name": "Edit", "arguments": {"name": "main", "old": "hello", "new": "hi"}} -->
+结束'''
+
+
+class TestStreamingParser:
+    """测试流式增量解析"""
+
+    def run(self, text, seed=0):
+        task = FakeTask()
+        parser = StreamingParser(task.emit)
+        processor = StreamProcessor(task, 'llm', parser=parser)
+        with processor:
+            for chunk in chunks(text, seed):
+                processor.process_chunk(chunk)
+        return task, parser, processor
+
+    @pytest.mark.unit
+    def test_events_before_end(self):
+        """测试代码块和工具调用完整时立即发出事件"""
+        task = FakeTask()
+        parser = StreamingParser(task.emit)
+        processor = StreamProcessor(task, 'llm', parser=parser)
+        with processor:
+            end = REPLY.index('<!-- Block-Start: {"name": "bad"}')
+            processor.process_chunk(REPLY[:end])
+            names = [name for name, _ in task.events]
+            assert names.count('block_ready') == 1
+            assert names.index('block_ready') < names.index('toolcall_ready')
+            processor.process_chunk(REPLY[end:])
+        names = [name for name, _ in task.events]
+        assert names.count('block_ready') == 1
+        assert names.count('toolcall_ready') == 2
+        assert names.index('toolcall_ready') < names.index('stream_completed')
+
+        block = next(kwargs['block'] for name, kwargs in task.events if name == 'block_ready')
+        assert block.name == 'main' and block.path == 'main.py'
+        tool_calls = [kwargs['tool_call'] for name, kwargs in task.events if name == 'toolcall_ready']
+        assert [tool_call.name for tool_call in tool_calls] == [ToolName.EXEC, ToolName.EDIT]
+        assert tool_calls[0].arguments.name == 'main'
+
+    @pytest.mark.unit
+    def test_same_as_final(self):
+        """测试任意分块时增量结果与最终解析一致"""
+        for seed in range(10):
+            task, parser, processor = self.run(REPLY, seed)
+            msg = ChatMessage(id='1', message=AIMessage(content=processor.content))
+            response = parser.finish(msg)
+            assert response.model_dump() == Response.from_message(msg).model_dump()
+            assert parser.code_blocks == response.code_blocks
+            assert parser.tool_calls == response.tool_calls
+            assert len(response.errors) == 1
+
+    @pytest.mark.unit
+    def test_feed_split_marker(self):
+        """测试直接喂入时标记结尾跨数据块"""
+        events = []
+        parser = StreamingParser(lambda name, **kwargs: events.append(name))
+        text = '<!-- ToolCall: {"name": "Exec", "arguments": {"name": "main"}} -->'
+        parser.feed(text[:-2])
+        assert events == []
+        parser.feed(text[-2:])
+        assert events == ['toolcall_ready']
+        parser.feed('\n')
+        assert events == ['toolcall_ready']
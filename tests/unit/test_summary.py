@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for rolling summaries
+"""
+
+import threading
+
+import pytest
+
+from aipyapp.llm import UserMessage, AIMessage, SystemMessage, ErrorMessage
+from aipyapp.aipy.chat import MessageStorage
+from aipyapp.aipy.context import ITokenEstimator, ContextConfig, ContextData, ContextManager, ContextStrategy
+from aipyapp.aipy.summary import RollingSummarizer
+
+
+class FakeClient:
+    """记录请求并返回固定格式摘要的 LLM 客户端"""
+
+    def __init__(self, fail=False):
+        self.requests = []
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, messages, stream_processor=None, **kwargs):
+        self.gate.wait(5)
+        self.requests.append(messages)
+        if self.fail:
+            return ErrorMessage(content='boom')
+        with stream_processor as lm:
+            lm.process_chunk(f'S{len(self.requests)}')
+        return AIMessage(content=lm.content)
+
+
+class LengthEstimator(ITokenEstimator):
+    def estimate(self, message):
+        return len(message.content)
+
+
+def make_manager(client, strategy=ContextStrategy.SUMMARY_COMPRESSION):
+    storage = MessageStorage()
+    config = ContextConfig(strategy=strategy, max_tokens=100, preserve_recent=1, compression_ratio=0.0)
+    summarizer = RollingSummarizer(client, config.summary_max_length)
+    manager = ContextManager(storage, ContextData(), config, estimator=LengthEstimator(), summarizer=summarizer)
+    return storage, manager, summarizer
+
+
+class TestRollingSummarizer:
+    """测试滚动摘要"""
+
+    @pytest.mark.unit
+    def test_precomputed_when_messages_age_out(self):
+        """测试消息移出最近窗口后在后台生成摘要"""
+        client = FakeClient()
+        storage, manager, summarizer = make_manager(client)
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        for i in range(4):
+            manager.add_message(storage.store(UserMessage(content=f'q{i}' * 10)))
+        assert summarizer.wait(5)
+
+        # 前两条消息移出窗口，生成一次摘要
+        assert len(client.requests) == 1
+        assert 'q0q0' in client.requests[0][1]['content']
+        summary, covered = summarizer.lookup(manager.messages[1:3])
+        assert (summary, covered) == ('S1', 2)
+
+    @pytest.mark.unit
+    def test_compress_uses_cache(self):
+        """测试压缩时直接使用缓存的摘要，不调用 LLM"""
+        client = FakeClient()
+        storage, manager, summarizer = make_manager(client)
+        manager.add_message(storage.store(SystemMessage(content='s' * 10)))
+        for i in range(4):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 40)))
+        assert summarizer.wait(5)
+        calls = len(client.requests)
+
+        client.gate.clear()
+        manager.compress()
+        client.gate.set()
+        assert len(client.requests) == calls
+        contents = [msg.content for msg in manager.messages]
+        assert contents[1] == '对话历史摘要：S1'
+        assert contents[2:] == ['2' * 40, '3' * 40]
+
+    @pytest.mark.unit
+    def test_rolling_on_previous_summary(self):
+        """测试新摘要在上一次摘要的基础上生成"""
+        client = FakeClient()
+        storage, manager, summarizer = make_manager(client)
+        for i in range(4):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 40)))
+        assert summarizer.wait(5)
+        manager.compress()
+
+        for i in range(4, 6):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 40)))
+        assert summarizer.wait(5)
+        assert '## 已有摘要\nS1' in client.requests[-1][1]['content']
+        assert '4' * 40 not in client.requests[-1][1]['content']
+
+        manager.compress()
+        assert manager.messages[0].content == f'对话历史摘要：S{len(client.requests)}'
+
+    @pytest.mark.unit
+    def test_fallback_when_not_ready(self):
+        """测试摘要未完成时截取消息开头"""
+        client = FakeClient()
+        client.gate.clear()
+        storage, manager, summarizer = make_manager(client)
+        for i in range(4):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 40)))
+        manager.compress()
+        client.gate.set()
+        assert summarizer.wait(5)
+        content = manager.messages[0].content
+        assert content.startswith('对话历史摘要：') and '0' * 40 in content
+
+    @pytest.mark.unit
+    def test_llm_error(self):
+        """测试 LLM 调用失败时不缓存摘要"""
+        client = FakeClient(fail=True)
+        storage, manager, summarizer = make_manager(client)
+        for i in range(4):
+            manager.add_message(storage.store(UserMessage(content=f'{i}' * 40)))
+        assert summarizer.wait(5)
+        assert summarizer.lookup(manager.messages) == (None, 0)